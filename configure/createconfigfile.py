@@ -49,6 +49,14 @@ config.set('General', 'Boltzmannconstant', '4e-23') # W/Hz
 config.set('General', 'p0', '200') # Idle power consumption of BS
 config.set('General', 'm', '3.75') # Load factor of BS
 config.set('General', 'pS', '90') # Sleep power consumption of BS 
+config.set('General', 'freeze_fading', False) # keep the fading of the first iteration for all iterations
+config.set('General', 'interferer_margin', 'none') # dB below noise plus strongest interferer from which on cells are background interference
+config.set('General', 'lazy_fading', True) # generate each iteration's fading on demand instead of storing all iterations
+config.set('General', 'optim_solver', 'auto') # 'ipopt', 'native' (dual decomposition) or 'auto'
+config.set('General', 'scheduling_processes', 1) # processes that schedule the cells of an iteration. 0 uses all cores
+config.set('General', 'world_cache', 'none') # directory of cached worlds, e.g. out/worldcache
+config.set('General', 'world_cache_size', 10) # GB
+config.set('General', 'world_seed', 0) # seed of the cached worlds
 
 # Writing our configuration file to 'settings.cfg'
 with open('configure/settings.cfg', 'wb') as configfile:
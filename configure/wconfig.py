@@ -76,3 +76,38 @@ class Wconfig():
         # same target rate for all users
         self.user_rate = config.getfloat('General', 'user_rate') 
 
+        # optional: keep the fading of the first iteration. Then only cells that change their power need an interference update.
+        self.freeze_fading = False
+        if config.has_option('General', 'freeze_fading'):
+            self.freeze_fading = config.getboolean('General', 'freeze_fading')
+
+        # optional: only cells within this margin (dB) of noise plus the strongest interferer are treated as individual interferers. The rest is background power. 'none' disables this.
+        self.interferer_margin = None
+        if config.has_option('General', 'interferer_margin') and config.get('General', 'interferer_margin') != 'none':
+            self.interferer_margin = config.getfloat('General', 'interferer_margin')
+
+        # optional: generate the fading of each iteration on demand from the random state of each link instead of keeping the fading of all iterations in memory. Results are identical.
+        self.lazy_fading = True
+        if config.has_option('General', 'lazy_fading'):
+            self.lazy_fading = config.getboolean('General', 'lazy_fading')
+
+        # optional: solver of the power minimization. 'ipopt', 'native' or 'auto' (IPOPT if pyipopt is installed)
+        self.optim_solver = None
+        if config.has_option('General', 'optim_solver') and config.get('General', 'optim_solver') != 'auto':
+            self.optim_solver = config.get('General', 'optim_solver')
+
+        # optional: number of processes that schedule the cells of an iteration in parallel. 0 uses all cores.
+        self.scheduling_processes = 1
+        if config.has_option('General', 'scheduling_processes'):
+            self.scheduling_processes = config.getint('General', 'scheduling_processes')
+
+        # optional: directory of a cache of generated worlds (see world/worldcache.py). The size limit is in GB. Worlds are generated with world_seed (plus the repetition). 'none' disables this.
+        self.world_cache = None
+        if config.has_option('General', 'world_cache') and config.get('General', 'world_cache') != 'none':
+            self.world_cache = config.get('General', 'world_cache')
+        self.world_cache_size = 10.
+        if config.has_option('General', 'world_cache_size'):
+            self.world_cache_size = config.getfloat('General', 'world_cache_size')
+        self.world_seed = 0
+        if config.has_option('General', 'world_seed'):
+            self.world_seed = config.getint('General', 'world_seed')
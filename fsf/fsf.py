@@ -37,33 +37,32 @@ from numpy import *
 import numpy as np
 from utils import utils
 
-def fsf(N, T, centerFrequency, totalTime, bandwidth, relativeVelocity):
-    """Returns frequency selective fading over a number of subcarriers and time slots."""
-    delay_taps = 1e-05 * array([0,
-    0.0060,
-    0.0075,
-    0.0145,
-    0.0150, 
-    0.0155, 
-    0.0190, 
-    0.0220, 
-    0.0225, 
-    0.0230, 
-    0.0335, 
-    0.0370, 
-    0.0430, 
-    0.0510, 
-    0.0685, 
-    0.0725, 
-    0.0735, 
-    0.0800, 
-    0.0960, 
-    0.1020, 
-    0.1100, 
-    0.1210, 
-    0.1845])
-    delay_taps.shape = (23,1) # promote
-    tapGains_dB = array([-6.4000, 
+# WINNER model taps
+delay_taps = 1e-05 * array([0,
+0.0060,
+0.0075,
+0.0145,
+0.0150, 
+0.0155, 
+0.0190, 
+0.0220, 
+0.0225, 
+0.0230, 
+0.0335, 
+0.0370, 
+0.0430, 
+0.0510, 
+0.0685, 
+0.0725, 
+0.0735, 
+0.0800, 
+0.0960, 
+0.1020, 
+0.1100, 
+0.1210, 
+0.1845])
+delay_taps.shape = (23,1) # promote
+tapGains_dB = array([-6.4000, 
    -3.4000,
    -2.0000,
    -3.0000,
@@ -86,38 +85,75 @@ def fsf(N, T, centerFrequency, totalTime, bandwidth, relativeVelocity):
   -11.7000,
   -17.2000,
   -16.7000])
-    tapGains_dB.shape = (23,1) # promote
+tapGains_dB.shape = (23,1) # promote
+N_harmonics = 5 # magic number from model
+speedOfLight = 3e8
 
+def fsf(N, T, centerFrequency, totalTime, bandwidth, relativeVelocity):
+    """Returns frequency selective fading over a number of subcarriers and time slots."""
+    H, chunkCenters, timeStamp = fsfBatch(1, N, T, centerFrequency, totalTime, bandwidth, relativeVelocity)
+    return H[0], chunkCenters, timeStamp 
+
+def fsfBatch(links, N, T, centerFrequency, totalTime, bandwidth, relativeVelocity):
+    """Frequency selective fading of a number of independent links at once. Same model and normalization as fsf(). 
+    The random numbers are drawn in the same order as by consecutive calls of fsf(), so a batch reproduces the sequential results.
+    Returns: (H array([links, N, T]), chunkCenters, timeStamp)"""
+    return fsfWindow(fadingState(links), N, T, centerFrequency, totalTime, bandwidth, relativeVelocity)
+
+def fadingState(links):
+    """Random state of independent links, i.e. path_rand and phase_rand of the model. Drawn in the order of consecutive fsf() calls. 
+    Returns: array([links, 2, taps, harmonics])"""
+    return random.rand(links, 2, delay_taps.size, N_harmonics)
+
+def fsfWindow(state, N, T, centerFrequency, totalTime, bandwidth, relativeVelocity, start=0, stop=None):
+    """Fading of links with given random state on the time stamps start:stop out of T.
+    The response factors into a delay part exp(-j 2 pi f tau_k) per chunk and a Doppler part sum_h exp(j (w_kh t + phi_kh)) per time stamp. 
+    Each time stamp is computed and normalized on its own with a fixed summation order, so a window is bit-identical to the same slice of the full response.
+    Returns: (H array([links, N, stop-start]), chunkCenters, timeStamp[start:stop])"""
+    doppler, delay, chunkCenters, timeStamp = modelTerms(state, N, T, centerFrequency, totalTime, bandwidth, relativeVelocity, start, stop)
+    H = zeros([state.shape[0], timeStamp.size, chunkCenters.size], dtype=complex) # frequency is the contiguous axis
+    for k in range(delay_taps.size):
+        H += doppler[:,k,:,None] * delay[k]
+    H /= N_harmonics
+
+    # normalize
+    H = H/np.sum(abs(H), axis=2)[:,:,None]*chunkCenters.size
+
+    return np.ascontiguousarray(H.transpose(0,2,1)), chunkCenters, timeStamp 
+
+def fsfPower(state, N, T, centerFrequency, totalTime, bandwidth, relativeVelocity):
+    """Mean power of the normalized fading of each link over all chunks and time stamps. Same model as fsfWindow(), but the taps are summed by a matrix product. 
+    The result agrees with the power of fsfWindow() up to rounding. relativeVelocity may be an array([links, 1, 1]).
+    Returns: array([links])"""
+    doppler, delay, chunkCenters, timeStamp = modelTerms(state, N, T, centerFrequency, totalTime, bandwidth, relativeVelocity)
+    links, taps = doppler.shape[:2]
+    H = np.dot(doppler.transpose(0,2,1).reshape(-1, taps), delay).reshape(links, timeStamp.size, chunkCenters.size)
+    amplitude = abs(H)
+    amplitude = amplitude/np.sum(amplitude, axis=2)[:,:,None]*chunkCenters.size # normalize as fsfWindow()
+    return np.mean((amplitude**2).reshape(links, -1), axis=1)
+
+def modelTerms(state, N, T, centerFrequency, totalTime, bandwidth, relativeVelocity, start=0, stop=None):
+    """The two factors of the response: the Doppler part array([links, taps, stop-start]) and the delay part array([taps, N]) including the tap gains.
+    Returns: (doppler, delay, chunkCenters, timeStamp[start:stop])"""
     startTime = 0 # no effect
     chunkwidth = bandwidth/N
-    N_harmonics = 5 # magic number from model
-    numTaps = delay_taps.size
-    speedOfLight = 3e8
     dopplerFrequency = relativeVelocity * centerFrequency / speedOfLight
 
     chunkCenters = linspace(centerFrequency-bandwidth/2,centerFrequency+bandwidth/2-chunkwidth, num=N)
-    timeStamp = linspace(startTime, startTime+totalTime*(1-1./T),num=T)
+    timeStamp = linspace(startTime, startTime+totalTime*(1-1./T),num=T)[start:stop]
 
     tapGains = utils.dBToW(tapGains_dB)
     tapGainsNorm = tapGains/np.sum(tapGains)
-    N_chunks = chunkCenters.size
 
-    path_rand = random.rand(numTaps, N_harmonics)
-    phase_rand = random.rand(numTaps, N_harmonics)
-    
-    H = empty([chunkCenters.size, timeStamp.size ],dtype=complex)
-    H[:] = nan
-    for t in range(timeStamp.size):
-        disc_dopp_freq = dopplerFrequency * cos(2*math.pi*path_rand)
-        disc_dopp_phase = 2*math.pi*phase_rand
-
-        for f in range(chunkCenters.size):
-            H[f,t] = instantChunkFading(timeStamp[t], chunkCenters[f], tapGainsNorm,disc_dopp_phase, disc_dopp_freq, delay_taps, N_harmonics)
-        
-        # normalize
-        H[:,t] = H[:,t]/sum(abs(H[:,t]))*N_chunks
+    disc_dopp_freq = dopplerFrequency * cos(2*math.pi*state[:,0])
+    disc_dopp_phase = 2*math.pi*state[:,1]
 
-    return H, chunkCenters, timeStamp 
+    harmonics = exp(1.j*(disc_dopp_freq[...,None]*timeStamp + disc_dopp_phase[...,None])) # [links, taps, harmonics, time]
+    doppler = harmonics[:,:,0]
+    for h in range(1, N_harmonics):
+        doppler = doppler + harmonics[:,:,h] # [links, taps, time]
+    delay = tapGainsNorm * exp(-1.j*2*math.pi*delay_taps*chunkCenters) # [taps, N]
+    return doppler, delay, chunkCenters, timeStamp
 
 def instantChunkFading(t, f, tapGainsNorm,disc_dopp_phase, disc_dopp_freq, delay_taps, N_harmonics):
     """Fading model over a single frequency chunk."""
@@ -37,6 +37,48 @@ class TestSequenceFunctions(unittest.TestCase):
         result = np.ones(T) 
         np.testing.assert_array_almost_equal(ans, result)
 
+    def test_fsfBatch(self):
+        """ Batched fading agrees with the chunk by chunk model and with consecutive calls. """
+        N = 12
+        T = 4
+        centerFrequency = 2e9
+        totalTime = 0.01
+        bandwidth = 1e7
+        relativeVelocity = 30
+
+        np.random.seed(11)
+        H, chunkCenters, timeStamp = fsf.fsfBatch(3, N, T, centerFrequency, totalTime, bandwidth, relativeVelocity)
+        self.assertEqual(H.shape, (3, N, T))
+        np.random.seed(11)
+        for link in range(3):
+            np.testing.assert_allclose(H[link], fsf.fsf(N, T, centerFrequency, totalTime, bandwidth, relativeVelocity)[0], rtol=1e-9)
+
+        # reference: the scalar model for the last link
+        np.random.seed(11)
+        np.random.rand(2*2, 23, 5) # skip the first two links
+        path_rand = np.random.rand(23, 5)
+        phase_rand = np.random.rand(23, 5)
+        tapGains = utils.dBToW(fsf.tapGains_dB)
+        tapGainsNorm = tapGains/np.sum(tapGains)
+        disc_dopp_freq = relativeVelocity * centerFrequency / fsf.speedOfLight * np.cos(2*np.pi*path_rand)
+        disc_dopp_phase = 2*np.pi*phase_rand
+        reference = np.empty([N, T], dtype=complex)
+        for t in range(T):
+            for f in range(N):
+                reference[f,t] = fsf.instantChunkFading(timeStamp[t], chunkCenters[f], tapGainsNorm, disc_dopp_phase, disc_dopp_freq, fsf.delay_taps, fsf.N_harmonics)
+            reference[:,t] = reference[:,t]/np.sum(np.abs(reference[:,t]))*N
+        np.testing.assert_allclose(H[2], reference, rtol=1e-9)
+
+    def test_fsfPower(self):
+        """ The mean power agrees with the generated fading, also with one velocity per link. """
+        np.random.seed(3)
+        state = fsf.fadingState(4)
+        velocity = np.array([3., 30., 30., 120.])
+        power = fsf.fsfPower(state, 50, 20, 2e9, 0.01, 1e7, velocity[:,None,None])
+        for link in range(4):
+            H, chunkCenters, timeStamp = fsf.fsfWindow(state[link:link+1], 50, 20, 2e9, 0.01, 1e7, velocity[link])
+            np.testing.assert_allclose(power[link], np.mean(np.abs(H)**2), rtol=1e-12)
+
     def test_instantChunkFading(self):
         tapGainsNorm = np.array([ 
             0.0449,
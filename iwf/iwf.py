@@ -40,21 +40,11 @@ def inversewaterfill(channelValues, targetLoad, noiseIfPowerPerChannel, channelB
     channelValuesSorted = channelValues[channelValuesIndices]
     nifValuesSorted = noiseIfPowerPerChannel[channelValuesIndices]
     
-    # Initial waterlevel for K = 0
-    k = 1
+    # The waterlevel is lowered channel by channel until it hits the comparison wall
+    k = activeChannels(targetLoad, channelBandwidth, transmissionTime, channelValuesSorted, nifValuesSorted)
     channelSet = channelValuesSorted[0:k]
     nifSet = nifValuesSorted[0:k]
     waterlevelExp = waterlevelExponent(targetLoad, channelBandwidth, transmissionTime, channelSet, k, nifSet)
-
-    # Keep lowering the waterlevel until it hits the comparison wall
-    while (waterlevelExp > log2(comparison(nifValuesSorted[k], transmissionTime, channelBandwidth, channelValuesSorted[k]))):
-        k = k+1
-        channelSet = channelValuesSorted[0:k]
-        nifSet = nifValuesSorted[0:k]
-        waterlevelExp = waterlevelExponent(targetLoad, channelBandwidth, transmissionTime, channelSet , k, nifSet)
-
-        if k == K:
-            break
     
     # Waterlevel has been found. Use it to find power levels.
     waterlvl = waterlevel(waterlevelExp)
@@ -69,6 +59,71 @@ def inversewaterfill(channelValues, targetLoad, noiseIfPowerPerChannel, channelB
     cap = capacity(channelBandwidth, transmissionTime, powerlvlsOrig, channelValues, noiseIfPowerPerChannel) # this really just confirms we haven't made a mistake
     return powerlvlsOrig, waterlvl, cap
 
+def activeChannels(targetLoad, channelBandwidth, transmissionTime, channelValuesSorted, nifValuesSorted):
+    """Number of channels that receive power. Channels are sorted by descending quality.
+    The waterlevel exponents of all candidate sets are evaluated at once from cumulative sums of the log channel gains. The first candidate that does not rise above the wall of the next channel is the solution."""
+    K = channelValuesSorted.size
+    k = arange(1, K)
+    with errstate(divide='ignore', invalid='ignore'): # zero channels have an infinite wall
+        gains = log2(channelValuesSorted*transmissionTime*channelBandwidth/(nifValuesSorted*log(2)))
+        exponents = targetLoad/(channelBandwidth*transmissionTime*k) - cumsum(gains[:-1])/k
+        walls = log2(comparison(nifValuesSorted[1:], transmissionTime, channelBandwidth, channelValuesSorted[1:]))
+        stop = ~(exponents > walls)
+    if stop.any():
+        return argmax(stop) + 1
+    return K
+
+def inversewaterfillBatch(channelValues, users, targetLoad, noiseIfPowerPerChannel, channelBandwidth, transmissionTime):
+    """The inverse water-filling algorithm for many users at once. Each user has its own target load and set of channels. The sets may differ in size.
+    Input:
+        channelValues - array([channels]) of the channels of all users
+        users - array([channels]) user index of each channel, from 0 to U-1
+        targetLoad - scalar or array([U])
+        noiseIfPowerPerChannel - array([channels])
+    Output:
+        powerlevels - array([channels])
+        waterlevel - array([U]). nan for users without channels
+        capacity - array([U])"""
+    channelValues = asarray(channelValues, dtype=float)
+    noiseIfPowerPerChannel = asarray(noiseIfPowerPerChannel, dtype=float)
+    users = asarray(users, dtype=int)
+    U = users.max() + 1 if users.size else 0
+    counts = bincount(users, minlength=U)
+    starts = cumsum(counts) - counts
+    targetLoad = ones(U) * targetLoad
+
+    # Sort channels by user and descending quality
+    order = lexsort((-channelValues, users))
+    channelValuesSorted = channelValues[order]
+    nifValuesSorted = noiseIfPowerPerChannel[order]
+    usersSorted = users[order]
+    k = arange(users.size) - starts[usersSorted] + 1 # size of the candidate set that ends at this channel
+
+    with errstate(divide='ignore', invalid='ignore'):
+        gains = log2(channelValuesSorted*transmissionTime*channelBandwidth/(nifValuesSorted*log(2)))
+        cumulative = cumsum(gains)
+        cumulative -= concatenate([[0], cumulative])[starts][usersSorted] # restart the sum for each user
+        exponents = targetLoad[usersSorted]/(channelBandwidth*transmissionTime*k) - cumulative/k
+        walls = log2(comparison(nifValuesSorted, transmissionTime, channelBandwidth, channelValuesSorted))
+
+        # a candidate set is the solution if the user has no further channel or the next one is behind the wall
+        stop = ones(users.size, dtype=bool)
+        stop[:-1] = (usersSorted[1:] != usersSorted[:-1]) | ~(exponents[:-1] > walls[1:])
+        active = counts.copy()
+        minimum.at(active, usersSorted[stop], k[stop])
+
+        # Waterlevel has been found. Use it to find power levels.
+        waterlvl = tile(nan, U)
+        waterlvl[counts > 0] = waterlevel(exponents[(starts + active - 1)[counts > 0]])
+        powerlvls = where(k <= active[usersSorted], powerlevels(waterlvl[usersSorted], channelBandwidth, transmissionTime, nifValuesSorted, channelValuesSorted), 0)
+
+    # Sort back to match initial input
+    powerlvlsOrig = empty_like(powerlvls)
+    powerlvlsOrig[order] = powerlvls
+
+    cap = channelBandwidth * transmissionTime * bincount(users, log2(1. + powerlvlsOrig * channelValues / noiseIfPowerPerChannel), minlength=U)
+    return powerlvlsOrig, waterlvl, cap
+
 def waterlevel(exponent):
     """Converts the exponent to waterlevel."""
     return 2**exponent
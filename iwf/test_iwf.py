@@ -82,6 +82,33 @@ class TestSequenceFunctions(unittest.TestCase):
         np.testing.assert_array_almost_equal(waterlvl, waterlvl_answer)
         np.testing.assert_array_almost_equal(cap, targetLoad)
 
+    def test_iwf_single(self):
+        # one channel carries the whole load
+        powerlvls, waterlvl, cap = iwf.inversewaterfill(np.array([0.5]), 10., np.array([1.]), 1., 1.)
+        np.testing.assert_almost_equal(cap, 10.)
+        np.testing.assert_almost_equal(powerlvls, (2**10 - 1)/0.5)
+
+    def test_iwf_batch(self):
+        # users with different numbers of channels give the same result as separate calls
+        channelBandwidth = 6.
+        transmissionTime = 0.05
+        targetLoad = np.array([1.2, 0.5, 3., 1.])
+        eigvals = [np.array([ 0.2296,    0.0255    ,0.1810    ,0.1117    ,0.0129    ,0.2029    ,0.3114    ,0.0299]) * 1e-4,
+                np.array([0.1, 0.3, 0.2]) * 1e-4, np.array([]), np.array([0.4, 0.05]) * 1e-4]
+        users = np.concatenate([ np.repeat(u, len(e)) for u, e in enumerate(eigvals) ])
+        perm = np.random.permutation(len(users)) # channels of the users may be interleaved
+        channels = np.concatenate(eigvals)[perm]
+        users = users[perm]
+        noiseIfPower = 1.2e-9 * np.ones(len(users))
+        powerlvls, waterlvl, cap = iwf.inversewaterfillBatch(channels, users, targetLoad, noiseIfPower, channelBandwidth, transmissionTime)
+        for u in [0, 1, 3]:
+            p, w, c = iwf.inversewaterfill(channels[users==u], targetLoad[u], noiseIfPower[users==u], channelBandwidth, transmissionTime)
+            np.testing.assert_array_almost_equal(powerlvls[users==u] * 1e4, p * 1e4)
+            np.testing.assert_almost_equal(waterlvl[u] / w, 1.)
+            np.testing.assert_almost_equal(cap[u], targetLoad[u])
+        self.assertTrue(np.isnan(waterlvl[2]))
+        self.assertEqual(cap[2], 0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-''' Optimization entry point. Interface with PyIPOPT. 
+''' Optimization entry point. Interface with PyIPOPT. The DTX problem can also be solved natively without PyIPOPT.
 File: optimMinPow.py
 '''
 
@@ -15,7 +15,58 @@ __status__ = "Development"
 from numpy import *
 from optim import optimMinPow2x2
 from optim import optimMinPow2x2DTX
-import pyipopt
+try:
+    import pyipopt
+except ImportError:
+    pyipopt = None # only the native solver is available
+
+class WarmStart(object):
+    ''' Last solution of the power minimization of one cell. It is the starting point of the next solve if the users are the same. 
+    The cell keeps it between iterations and rate steps. Counts the solver iterations that warm starts save compared to the last cold start. Only the native solver reports iterations.'''
+
+    def __init__(self):
+        self.users = None # user identifiers of the last solve
+        self.solution = None # resource share per user and sleep share
+        self.price = None # dual price of the unit sum (native solver)
+        self.capacity = None # capacity per user (native solver)
+        self.iterations = None # iterations of the last solve. None if the solver does not report them.
+        self.coldIterations = None # iterations of the last cold start
+        self.warm = False # whether the last solve was warm started
+        self.saved = 0 # iterations saved by warm starts in total
+
+    def __repr__(self):
+        return ' '.join(['WarmStart for', str(self.users), 'saved', str(self.saved), 'iterations.'])
+
+    def prepare(self, users):
+        ''' Reorder the stored solution to the users (list of identifiers). Forget it if the users changed. Returns whether a warm start is possible.'''
+        users = list(users)
+        if self.solution is None or self.users is None or sorted(self.users) != sorted(users) or len(set(users)) != len(users):
+            self.solution = self.price = self.capacity = None
+            self.users = users
+            return False
+        order = [ self.users.index(user) for user in users ]
+        self.solution = append(self.solution[:-1][order], self.solution[-1])
+        if self.capacity is not None:
+            self.capacity = self.capacity[order]
+        self.users = users
+        return True
+
+    def record(self, solution, warm):
+        ''' Keep the solution and count the saved iterations.'''
+        self.solution = array(solution)
+        self.warm = warm
+        if self.iterations is None:
+            return
+        if not warm:
+            self.coldIterations = self.iterations
+        elif self.coldIterations is not None:
+            self.saved += max(0, self.coldIterations - self.iterations)
+
+def solverName(solver=None):
+    ''' The solver that optimizePCDTX uses for the setting solver. None selects IPOPT if pyipopt is installed.'''
+    if solver is None:
+        return 'native' if pyipopt is None else 'ipopt'
+    return solver
 
 def optimizePC(channel, noiseIfPower, rate, linkBandwidth, pMax, p0, m, verbosity=0):
     ''' Uses channel values, PHY parameters and power consumption characteristics to find minimal resource allocation. Returns resource allocation, objective value and IPOPT status. 
@@ -32,6 +83,9 @@ def optimizePC(channel, noiseIfPower, rate, linkBandwidth, pMax, p0, m, verbosit
         solution - resource share per user
         status - IPOPT status '''
 
+    if pyipopt is None:
+        raise ImportError('optimizePC requires pyipopt.')
+
     # the channel dimensions tell some more parameters
     users = channel.shape[0]
     n_tx  = channel.shape[1]
@@ -77,7 +131,7 @@ def optimizePC(channel, noiseIfPower, rate, linkBandwidth, pMax, p0, m, verbosit
 
     return obj, solution, status
 
-def optimizePCDTX(channel, noiseIfPower, rate, linkBandwidth, pMax, p0, m, pS, verbosity=0):
+def optimizePCDTX(channel, noiseIfPower, rate, linkBandwidth, pMax, p0, m, pS, verbosity=0, solver=None, warmStart=None, userIds=None):
     ''' Uses channel values, PHY parameters and power consumption characteristics to find minimal resource allocation under power control with DTX. Returns resource allocation, objective value and IPOPT status. 
     Input:
         channel - 3d array. 0d users, 1d n_tx, 2d n_rx
@@ -88,6 +142,9 @@ def optimizePCDTX(channel, noiseIfPower, rate, linkBandwidth, pMax, p0, m, pS, v
         pS - power consumption during sleep mode
         m - power consumption load factor
         verbosity - IPOPT verbosity level
+        solver - 'ipopt' or 'native' (dual decomposition in numpy). None selects IPOPT if pyipopt is installed.
+        warmStart - optional WarmStart of this cell. Used as starting point if the users are the same as last time. Updated with the new solution. Iteration counts and savings are only available with the native solver.
+        userIds - identifiers of the users in channel order, e.g. mobile ids. Defaults to their positions.
     Output:
         obj - solution objective value
         solution - resource share per user
@@ -98,6 +155,70 @@ def optimizePCDTX(channel, noiseIfPower, rate, linkBandwidth, pMax, p0, m, pS, v
     n_tx  = channel.shape[1]
     n_rx  = channel.shape[2]
 
+    solver = solverName(solver)
+    warm = False
+    if warmStart is not None:
+        warm = warmStart.prepare(range(users) if userIds is None else userIds)
+    if solver == 'native':
+        if n_tx is 2 and n_rx is 2:
+            obj, solution, status = optimMinPow2x2DTX.solveDual(noiseIfPower, channel, rate, linkBandwidth, pMax, p0, m, pS, warmStart=warmStart)
+        else:
+            raise NotImplementedError # other combinations may be needed later
+    elif solver == 'ipopt':
+        x0 = warmStart.solution if warm else None
+        obj, solution, status = optimizePCDTXipopt(channel, noiseIfPower, rate, linkBandwidth, pMax, p0, m, pS, verbosity, x0)
+        if warmStart is not None:
+            warmStart.iterations = None # not reported by pyipopt
+    else:
+        raise ValueError('Unknown solver: ' + str(solver))
+    if warmStart is not None:
+        warmStart.record(solution, warm)
+
+    if sum(solution) > 1.0001 or status is not 0:
+        print 'Sum of solution:', sum(solution)
+        print 'Status:', status
+        raise ValueError('Invalid solution')
+
+    return obj, solution, status
+
+def optimizePCDTXbatch(channels, valid, noiseIfPower, rate, linkBandwidth, pMax, p0, m, pS, warmStarts=None, userIds=None):
+    ''' optimizePCDTX for many independent problems at once, e.g. all cells of a network, with the native solver. 
+    Input:
+        channels - 4d array. 0d problems, 1d users (padded), 2d n_tx, 3d n_rx
+        valid - bool array([problems, users]). The real users of each problem come first.
+        noiseIfPower - array([problems, users])
+        rate, linkBandwidth, pMax, p0, m, pS - scalars or one value per problem
+        warmStarts - optional list of WarmStart per problem
+        userIds - optional list of user identifiers per problem
+    Output:
+        obj - array of solution objective values
+        solution - resource share per user and sleep share per problem. Zero for padding.
+        status - array of status per problem. Unlike optimizePCDTX, failed problems do not raise. '''
+    problems = channels.shape[0]
+    if channels.shape[2:] != (2, 2):
+        raise NotImplementedError # other combinations may be needed later
+    warm = [False] * problems
+    if warmStarts is not None:
+        for k, warmStart in enumerate(warmStarts):
+            users = int(sum(valid[k]))
+            warm[k] = warmStart.prepare(range(users) if userIds is None else userIds[k])
+    obj, solution, status = optimMinPow2x2DTX.solveDualBatch(noiseIfPower, channels, valid, rate, linkBandwidth, pMax, p0, m, pS, warmStarts=warmStarts)
+    if warmStarts is not None:
+        for k, warmStart in enumerate(warmStarts):
+            warmStart.record(append(solution[k][:-1][valid[k]], solution[k][-1]), warm[k])
+    return obj, solution, status
+
+def optimizePCDTXipopt(channel, noiseIfPower, rate, linkBandwidth, pMax, p0, m, pS, verbosity=0, x0=None):
+    ''' IPOPT solution of optimizePCDTX from the starting point x0. Returns obj, solution and status. The solution is not checked.
+    pyipopt takes only a starting point and does not report iterations. Warm starts therefore pass x0 and save no counted iterations.'''
+    if pyipopt is None:
+        raise ImportError('The ipopt solver requires pyipopt.')
+
+    # the channel dimensions tell some more parameters
+    users = channel.shape[0]
+    n_tx  = channel.shape[1]
+    n_rx  = channel.shape[2]
+
     # preparing IPOPT parameters
     nvar  = users + 1 # sleep mode is integrated as the last parameter 
     x_L = zeros((nvar), dtype=float_) * 0.0
@@ -107,16 +228,18 @@ def optimizePCDTX(channel, noiseIfPower, rate, linkBandwidth, pMax, p0, m, pS, v
     g_L[0] = 1.
     g_U = pMax * ones(ncon) # unit sum and all power constraints
     g_U[0] = 1.
-    nnzj = ncon * ncon
+    nnzj = ncon + users # the unit sum depends on all variables, each power constraint on one
     nnzh = 0 # tell that there is no hessian (Hessian approximation)
-    x0 = repeat([1./(nvar + 1)], nvar) # Starting point
+    if x0 is None:
+        x0 = repeat([1./(nvar + 1)], nvar) # Starting point
 
     # IPOPT requires single parameter functions
     if n_tx is 2 and n_rx is 2:
-        eval_f = lambda mus: optimMinPow2x2DTX.eval_f(mus, noiseIfPower, channel, rate, linkBandwidth, p0, m, pS)
-        eval_grad_f = lambda mus: optimMinPow2x2DTX.eval_grad_f(mus, noiseIfPower, channel, rate, linkBandwidth, p0, m, pS)
-        eval_g = lambda mus: optimMinPow2x2DTX.eval_g(mus, noiseIfPower, channel, rate, linkBandwidth)
-        eval_jac_g = lambda mus, flag: optimMinPow2x2DTX.eval_jac_g(mus, noiseIfPower, channel, rate, linkBandwidth, flag)
+        summary = optimMinPow2x2DTX.dissectSINR(channel) # once per solve instead of once per callback and user
+        eval_f = lambda mus: optimMinPow2x2DTX.eval_f(mus, noiseIfPower, summary, rate, linkBandwidth, p0, m, pS)
+        eval_grad_f = lambda mus: optimMinPow2x2DTX.eval_grad_f(mus, noiseIfPower, summary, rate, linkBandwidth, p0, m, pS)
+        eval_g = lambda mus: optimMinPow2x2DTX.eval_g(mus, noiseIfPower, summary, rate, linkBandwidth)
+        eval_jac_g = lambda mus, flag: optimMinPow2x2DTX.eval_jac_g(mus, noiseIfPower, summary, rate, linkBandwidth, flag)
     else:
         raise NotImplementedError # other combinations may be needed later
 
@@ -135,9 +258,4 @@ def optimizePCDTX(channel, noiseIfPower, rate, linkBandwidth, pMax, p0, m, pS, v
     solution, zl, zu, obj, status = nlp.solve(x0)
     nlp.close()
 
-    if sum(solution) > 1.0001 or status is not 0:
-        print 'Sum of solution:', sum(solution)
-        print 'Status:', status
-        raise ValueError('Invalid solution')
-
     return obj, solution, status
@@ -13,8 +13,8 @@ __maintainer__ = "Hauke Holtkamp"
 __email__ = "h.holtkamp@gmail.com" 
 __status__ = "Development" 
 
-import scipy.linalg
 from numpy import *
+from utils import mimo2x2
 
 def eval_f(mus, noiseIfPower, SINR, rate, linkBandwidth, p0, m ):
     """Objective function. Min power equal power 2x2 MIMO. 
@@ -43,13 +43,17 @@ def eval_grad_f(mus, noiseIfPower, SINR, rate, linkBandwidth, p0, m):
     if mus.size is 1:
         a,b,M = dissectSINR(SINR[0,:,:])
         capacity = rate / (linkBandwidth * mus)
-        return p0 + m*M*noiseIfPower*( ( ( a**2 / b + 2*2**capacity - 1/mus * ( rate/linkBandwidth* log(2) * 2**capacity) - 2 ) /  sqrt( a**2 + 2 * b * (2**capacity - 1) ) ) - a / b )
+        x = 2**capacity - 1
+        s = sqrt( a**2 + 2 * b * x )
+        return p0 + m*M*noiseIfPower*( 2*x / (s + a) - capacity * log(2) * 2**capacity / s ) # (s-a)/b rationalized. Stable for b -> 0
     else:
         result = zeros((mus.size), dtype=float_)
         for i in range(mus.size):
             a,b,M = dissectSINR(SINR[i,:,:])
             capacity = rate / (linkBandwidth * mus[i])
-            result[i] = p0 + m*M*noiseIfPower[i]*( ( ( a**2 / b + 2*2**capacity - 1/mus[i] * ( rate/linkBandwidth * log(2) * 2**capacity) - 2 ) /  sqrt( a**2 + 2 * b * (2**capacity - 1) ) ) - a/b )
+            x = 2**capacity - 1
+            s = sqrt( a**2 + 2 * b * x )
+            result[i] = p0 + m*M*noiseIfPower[i]*( 2*x / (s + a) - capacity * log(2) * 2**capacity / s ) # (s-a)/b rationalized. Stable for b -> 0
         #print result
         return result
 
@@ -112,17 +116,15 @@ def eval_jac_g(mus, noiseIfPower, SINR, rate, linkBandwidth, flag):
 def ergMIMOsinrCDITCSIR2x2(capacity, SINR, noiseIfPower):
     """Ergodic MIMO SNR as a function of achieved capacity and channel."""
     a,b,M = dissectSINR(SINR)
-    return noiseIfPower * (M / b) * ( -a + sqrt( a**2 + 2 * b * (2**capacity - 1) ) )
+    x = 2**capacity - 1
+    return noiseIfPower * M * 2 * x / ( a + sqrt( a**2 + 2 * b * x ) ) # (M/b)*(-a + sqrt(a**2 + 2*b*x)) rationalized. Stable for b -> 0
 
 def dissectSINR(SINR):
     """Take apart SINR into some values that we need often."""
     M = SINR.shape[0]
-#    eigvals, eigvects = scipy.linalg.eig(scipy.dot(SINR,SINR.conj().T))
-    eigvals, eigvects = scipy.linalg.eig(SINR)
-    e1 = eigvals[0].real
-    e2 = eigvals[1].real
-    a = e1 + e2
-    b = 2*e1 * e2
+    # a is the sum and b twice the product of the eigenvalues
+    a = real(mimo2x2.trace(SINR))
+    b = 2*real(mimo2x2.det(SINR))
 
     return (a,b,M)
 
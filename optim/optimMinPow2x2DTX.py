@@ -13,101 +13,241 @@ __maintainer__ = "Hauke Holtkamp"
 __email__ = "h.holtkamp@gmail.com" 
 __status__ = "Development" 
 
-import scipy.linalg
 from numpy import *
+from utils import mimo2x2
 
 def eval_f(mus, noiseIfPower, SINR, rate, linkBandwidth, p0, m, pS ):
     """Objective function. Min power equal power 2x2 MIMO. 
-    Variable is the resource share in TDMA. Last entry in mu[:] is sleep time share. Returns scalar."""
-    result = 0
-    for i in range(mus.size-1):
-        Ptxi = ptxOfMu(mus[i], rate, linkBandwidth, noiseIfPower[i], SINR[i,:,:])
-        Ppm = (p0 + m*Ptxi) * mus[i]
-        result = result + Ppm
-    result = result + mus[-1] * pS
-    return result
+    Variable is the resource share in TDMA. Last entry in mu[:] is sleep time share. Returns scalar.
+    SINR is array([users, 2, 2]) or its dissectSINR() summary, which solvers compute once per solve."""
+    a,b,M = summarize(SINR)
+    mus = asarray(mus, dtype=float_)
+    Ptx = ptxOfCapacity(rate / (linkBandwidth * mus[:-1]), asarray(noiseIfPower, dtype=float_)[:mus.size-1], a, b, M)
+    return sum((p0 + m*Ptx) * mus[:-1]) + mus[-1] * pS
 
 def eval_grad_f(mus, noiseIfPower, SINR, rate, linkBandwidth, p0, m, pS):
     """Gradient of the objective function. Returns array of scalars, each one the partial derivative. Last entry in mu[:] is sleep time share. """
-    result = 0
-    mus = array(mus) # allow iteration
-    result = zeros((mus.size), dtype=float_)
-    for i in range(mus.size-1): # the last derivative is different
-        a,b,M = dissectSINR(SINR[i,:,:])
-        capacity = rate / (linkBandwidth * mus[i])
-        result[i] = p0 + m*M*noiseIfPower[i]*( ( ( a**2 / b + 2*2**capacity - 1/mus[i] * ( rate/linkBandwidth * log(2) * 2**capacity) - 2 ) /  sqrt( a**2 + 2 * b * (2**capacity - 1) ) ) - a/b )
-    result[-1] = pS
+    a,b,M = summarize(SINR)
+    mus = asarray(mus, dtype=float_)
+    noiseIfPower = asarray(noiseIfPower, dtype=float_)[:mus.size-1]
+    result = empty((mus.size), dtype=float_)
+    capacity = rate / (linkBandwidth * mus[:-1])
+    x = 2**capacity - 1
+    s = sqrt( a**2 + 2 * b * x )
+    result[:-1] = p0 + m*M*noiseIfPower*( 2*x / (s + a) - capacity * log(2) * 2**capacity / s ) # (s-a)/b rationalized. Stable for b -> 0
+    result[-1] = pS # the last derivative is different
     return result
 
 def eval_g(mus, noiseIfPower, SINR, rate, linkBandwidth):
     """Constraint functions. Returns an array."""
-
-    mus = array(mus)
-    result = zeros((mus.size), dtype=float_)
+    a,b,M = summarize(SINR)
+    mus = asarray(mus, dtype=float_)
+    result = empty((mus.size), dtype=float_)
     result[0] = sum(mus) # first constraint is the unit sum
 
     # Other constraints: Maximum transmission power limit
-    for i in range(mus.size-1):
-        result[i+1] = ptxOfMu(mus[i], rate, linkBandwidth, noiseIfPower[i], SINR[i,:,:])
-
-    #print result
+    result[1:] = ptxOfCapacity(rate / (linkBandwidth * mus[:-1]), asarray(noiseIfPower, dtype=float_)[:mus.size-1], a, b, M)
     return result
 
 def eval_jac_g(mus, noiseIfPower, SINR, rate, linkBandwidth, flag):
     """Gradient of constraint function/Jacobian. min power equal power 2x2 MIMO.
-    mus is the resource share in TDMA. Output is a numpy array with the nnzj rows."""
+    mus is the resource share in TDMA. Output is a numpy array with the nnzj = ncon + users non-zero entries: 
+    the unit sum depends on all variables and each power constraint only on its own user's share."""
     ncon = mus.size
-    if flag: # The 'structure of the Jacobian' is the map of which return value refers to which constraint function. There are ncon*ncon constraints overall. There are ncon functions in eval_g, each of which has ncon partial derivatives. 
-        lineindex = array(range(ncon)).repeat(ncon)
-        rowindex  = tile(array(range(ncon)),ncon)
-        return (lineindex,rowindex) # returns something like [0,0,0,1,1,1,2,2,2], [0,1,2,0,1,2,0,1,2]...
+    users = ncon - 1
+    if flag: # The 'structure of the Jacobian' is the map of which return value refers to which constraint function and variable.
+        lineindex = concatenate((zeros(ncon, dtype=int), arange(1, ncon)))
+        rowindex  = concatenate((arange(ncon), arange(users)))
+        return (lineindex,rowindex) # returns something like [0,0,0,1,2], [0,1,2,0,1] 
 
     else:
-        index = 0
-        mus = array(mus) # allow iteration
-        result = zeros((ncon*ncon), dtype=float_)
-        # The derivatives of the unit sum are just 1
-        for i in range(ncon):
-            result[index] = 1
-            index = index + 1
-
-        # The derivatives of each power constraint:
-        for i in range(ncon-1): # the number of power constraints
-            for j in range(ncon): # the number of partial derivatives per power constraint
-                if i == j: # there is a partial derivative
-                    a,b,M = dissectSINR(SINR[i,:,:])
-                    capacity = rate / (linkBandwidth * mus[i])
-                    result[index] = M*noiseIfPower[i]* ( - (rate/linkBandwidth)* log(2) * 2**capacity) / (mus[i]**2 * sqrt( a**2 + 2*b*(2**capacity - 1)))
-                else: # there is no partial derivative
-                    result[index] = 0 # partial derivative is zero
-
-                index = index + 1
-
+        a,b,M = summarize(SINR)
+        mus = asarray(mus, dtype=float_)[:-1]
+        capacity = rate / (linkBandwidth * mus)
+        result = empty((ncon + users), dtype=float_)
+        result[:ncon] = 1 # The derivatives of the unit sum are just 1
+        # The derivatives of each power constraint by its own share
+        result[ncon:] = M*asarray(noiseIfPower, dtype=float_)[:users]* ( - (rate/linkBandwidth)* log(2) * 2**capacity) / (mus**2 * sqrt( a**2 + 2*b*(2**capacity - 1)))
         return result
 
+def ptxOfCapacity(capacity, noiseIfPower, a, b, M):
+    """Transmission power for the capacity given the dissected channel. Works on arrays of users."""
+    with errstate(over='ignore', invalid='ignore'):
+        x = 2**capacity - 1
+        value = noiseIfPower * M * 2 * x / ( a + sqrt( a**2 + 2 * b * x ) ) # (M/b)*(-a + sqrt(a**2 + 2*b*x)) rationalized. Stable for b -> 0
+    return where(capacity > 0.5e3, inf, value) # avoid overflow
+
 def ergMIMOsinrCDITCSIR2x2(capacity, SINR, noiseIfPower):
     """Ergodic MIMO SNR as a function of achieved capacity and channel."""
     a,b,M = dissectSINR(SINR)
-    if capacity > 0.5e3:
-        value = inf # avoid overflow warning
-    else:
-        value = noiseIfPower * (M / b) * ( -a + sqrt( a**2 + 2 * b * (2**capacity - 1) ) )
-    return value
+    return ptxOfCapacity(capacity, noiseIfPower, a, b, M)[()]
 
 def dissectSINR(SINR):
-    """Take apart SINR into some values that we need often. If SINR is trivial, one eigenvalue is zero."""
-    M = SINR.shape[0]
-    #eigvals, eigvects = scipy.linalg.eig(scipy.dot(H,H.conj().T)) # THIS LINE DETERMINES WHETHER WE ARE WORKING IN CHANNEL STATE OR SINR
-    eigvals, eigvects = scipy.linalg.eig(SINR) # SINR is a bad label. It is actually the effective channel 
-    e1 = eigvals[0].real
-    e2 = eigvals[1].real
-    a = e1 + e2
-    b = 2*e1 * e2
+    """Take apart SINR into some values that we need often. If SINR is trivial, one eigenvalue is zero.
+    Works on a single channel or on a stack array([users, 2, 2]). This is the summary that the evaluation functions need."""
+    M = SINR.shape[-2]
+    # SINR is a bad label. It is actually the effective channel. a is the sum and b twice the product of its eigenvalues.
+    a = real(mimo2x2.trace(SINR))
+    b = 2*real(mimo2x2.det(SINR))
 
     return (a,b,M)
 
+def summarize(SINR):
+    """dissectSINR() of the channels unless SINR already is such a summary."""
+    if isinstance(SINR, tuple):
+        return SINR
+    return dissectSINR(SINR)
+
 def ptxOfMu(mu, rate, linkBandwidth, noiseIfPower, SINR):
     """Returns transmission power needed for a certain channel capacity as a function of the MIMO channel and noise power."""
     capacity = rate / (linkBandwidth * mu)
     return ergMIMOsinrCDITCSIR2x2(capacity, SINR, noiseIfPower)
 
+
+def solveDual(noiseIfPower, SINR, rate, linkBandwidth, pMax, p0, m, pS, tol=1e-13, maxiter=200, warmStart=None):
+    """Minimal power allocation with DTX by Lagrangian dual decomposition. Native alternative to solving eval_f under eval_g with IPOPT.
+    The problem is convex and separable in the users' resource shares. For a price nu on the unit sum, each user's share solves d/dmu mu*(p0 + m*Ptx(mu)) = nu on its own, limited by pMax and mu <= 1.
+    This is a safeguarded Newton iteration on the capacity of all users at once. The shares grow with nu. If the shares at nu = pS leave time over, that time is sleep. 
+    Otherwise nu is found such that the shares sum to one. This is another safeguarded Newton iteration, which keeps nu between bisection brackets.
+    warmStart is an optional object with the attributes price and capacity from a previous solve of the same users. They are used as starting points if not None and are updated. 
+    Its attribute iterations is set to the number of evaluations of the users' derivatives.
+    Returns (obj, solution, status) like IPOPT. The last entry of solution is the sleep share. Status is 0 on success, 2 if the power limit makes the problem infeasible and -1 if maxiter is exceeded."""
+    a, b, M = summarize(SINR)
+    obj, solution, status = solveDualBatch(asarray(noiseIfPower, dtype=float_)[None], (a[None], b[None], M), ones([1, a.size], dtype=bool), 
+            rate, linkBandwidth, pMax, p0, m, pS, tol, maxiter, [warmStart])
+    return obj[0], solution[0], int(status[0])
+
+def solveDualBatch(noiseIfPower, SINR, valid, rate, linkBandwidth, pMax, p0, m, pS, tol=1e-13, maxiter=200, warmStarts=None):
+    """solveDual() for many independent problems at once, e.g. the cells of a network. Each problem is a row of padded arrays and has its own price.
+    Input:
+        noiseIfPower: array([problems, users])
+        SINR: array([problems, users, 2, 2]) or its dissectSINR() summary
+        valid: bool array([problems, users]). The real users of each problem come first, the rest is padding.
+        rate, linkBandwidth, pMax, p0, m, pS: scalars or array([problems])
+        warmStarts: optional list with a warm start object (see solveDual) or None per problem. The iteration count of a problem only counts the derivative evaluations while it is unsolved.
+    Output: (obj array([problems]), solution array([problems, users+1]) with zero shares for padding and the sleep share last, status array([problems]))"""
+    valid = asarray(valid, dtype=bool)
+    P, U = valid.shape
+    if U == 0: # nothing to transmit
+        return ones(P) * pS, concatenate((zeros([P, 0]), ones([P, 1])), axis=1), zeros(P, dtype=int)
+    rate, linkBandwidth, pMax, p0, m, pS = [ (ones(P) * asarray(value, dtype=float_))[:,None] for value in (rate, linkBandwidth, pMax, p0, m, pS) ]
+    a, b, M = summarize(SINR)
+    a = where(valid, a, 1.) # padding gets a harmless channel and no share
+    b = where(valid, b, 0.)
+    noiseIfPower = where(valid, noiseIfPower, 1.)
+    cMin = ones([P, U]) * rate / linkBandwidth # capacity at mu = 1
+    q = pMax / (M * noiseIfPower)
+    with errstate(divide='ignore'):
+        cMax = log2(1 + q*a + b*q**2/2) # capacity at ptx = pMax
+        muMin = where(valid, cMin / cMax, 0)
+    evaluations = zeros(P, dtype=int) # derivative evaluations per problem
+    if warmStarts is None:
+        warmStarts = [None] * P
+
+    def shares(capacity):
+        return where(valid, cMin / capacity, 0)
+
+    def derivative(capacity, counting=slice(None)):
+        """Derivative of each user's power with respect to its share (as in eval_grad_f) and its derivative with respect to the capacity. Counts an evaluation for the problems in counting."""
+        evaluations[counting] += 1
+        p = 2**capacity
+        x = p - 1
+        s = sqrt( a**2 + 2 * b * x )
+        value = p0 + m*M*noiseIfPower*( 2*x / (s + a) - capacity * log(2) * p / s )
+        slope = -m*M*noiseIfPower * capacity * log(2)**2 * p * (a**2 + b*p - 2*b) / s**3
+        return value, slope
+
+    status = -ones(P, dtype=int)
+    infeasible = sum(muMin, axis=1) > 1
+    status[infeasible] = 2
+    cMax[infeasible] = cMin[infeasible] # keeps the arithmetic finite
+    derivativeMin = derivative(cMin)[0] # largest derivative. Above, the share is 1
+    derivativeMax = derivative(cMax)[0] # smallest derivative. Below, the user is at the power limit
+
+    def capacities(nu, start, lower, upper, counting):
+        """Capacity of each user at the price nu array([problems, 1]) within [lower, upper] and the change of the sum of shares with nu. The derivative decreases with the capacity.
+        Evaluations count for the problems in counting until their capacities converge."""
+        pending = counting.copy()
+        lower = where(nu >= derivativeMin, cMin, where(nu <= derivativeMax, cMax, lower))
+        upper = where(nu >= derivativeMin, cMin, where(nu <= derivativeMax, cMax, upper))
+        interior = valid & (nu < derivativeMin) & (nu > derivativeMax)
+        capacity = clip(start, lower, upper)
+        for i in range(maxiter):
+            value, slope = derivative(capacity, pending)
+            larger = value > nu
+            lower = where(larger, capacity, lower)
+            upper = where(larger, upper, capacity)
+            new = capacity - (value - nu) / slope
+            new = where((new >= lower) & (new <= upper), new, (lower + upper) / 2) # bisection if Newton leaves the bracket
+            converged = (abs(new - capacity) <= tol * capacity) | (upper - lower <= tol * upper) | ~valid
+            capacity = new
+            pending &= ~converged.all(axis=1)
+            if converged.all():
+                break
+        return capacity, sum(where(interior, -cMin / (capacity**2 * slope), 0), axis=1) # dmu/dnu = dmu/dc / (dderivative/dc)
+
+    start = (cMin + cMax) / 2
+    price = zeros(P)
+    hasPrice = zeros(P, dtype=bool)
+    for k, warmStart in enumerate(warmStarts):
+        if warmStart is not None and warmStart.capacity is not None and warmStart.capacity.shape == (sum(valid[k]),):
+            start[k, valid[k]] = warmStart.capacity
+            if warmStart.price is not None:
+                price[k] = warmStart.price
+                hasPrice[k] = True
+    capacity, change = capacities(pS, start, cMin, cMax, ones(P, dtype=bool))
+
+    mus = shares(capacity)
+    sleep = maximum(1 - sum(mus, axis=1), 0)
+    solved = ~infeasible & (sum(mus, axis=1) <= 1) # time is left over for sleep
+    status[solved] = 0
+    nu = pS[:,0].copy()
+
+    # bracket the price: the shares sum to less than one at nuLow and to more at nuHigh
+    active = ~infeasible & ~solved # these have at least one user
+    nuLow = where(active, amin(where(valid, derivativeMax, inf), axis=1), 0)
+    nuHigh = where(active, minimum(pS[:,0], amax(where(valid, derivativeMin, -inf), axis=1)), 0) # above all derivativeMin, all shares are 1
+    cLow, cHigh = cMax.copy(), capacity.copy() # capacities at nuLow and nuHigh
+    warm = hasPrice & (nuLow < price) & (price < nuHigh)
+    nu[active] = where(warm, price, (nuLow + nuHigh) / 2)[active]
+    for i in range(maxiter):
+        if not active.any():
+            break
+        capacity, change = capacities(nu[:,None], capacity, cHigh, cLow, active)
+        excess = sum(shares(capacity), axis=1) - 1
+        up = active & (excess > 0)
+        down = active & ~(excess > 0)
+        nuHigh = where(up, nu, nuHigh)
+        cHigh = where(up[:,None], capacity, cHigh)
+        nuLow = where(down, nu, nuLow)
+        cLow = where(down[:,None], capacity, cLow)
+        with errstate(divide='ignore', invalid='ignore'):
+            new = where(change > 0, nu - excess / change, nan)
+            new = where((nuLow < new) & (new < nuHigh), new, (nuLow + nuHigh) / 2) # bisection if Newton leaves the bracket
+        done = active & ((abs(excess) <= tol) | (nuHigh - nuLow <= tol * maximum(1., abs(nuHigh))) | (abs(new - nu) <= tol * maximum(1., abs(nu))))
+        status[done] = 0
+        active &= ~done
+        nu = where(active, new, nu)
+
+    # interpolate between the bracketing shares so that they sum to one
+    bracketed = ~infeasible & ~solved
+    musLow = shares(cLow)
+    musHigh = shares(cHigh)
+    spread = sum(musHigh, axis=1) - sum(musLow, axis=1)
+    with errstate(divide='ignore', invalid='ignore'):
+        weight = where(spread > 0, (1 - sum(musLow, axis=1)) / spread, 0.)
+    mus[bracketed] = (musLow + weight[:,None] * (musHigh - musLow))[bracketed]
+    sleep[bracketed] = 0
+    nu[bracketed] = (nuLow + weight * (nuHigh - nuLow))[bracketed]
+    mus[infeasible] = minimum(muMin, 1)[infeasible]
+    sleep[infeasible] = 0
+
+    with errstate(divide='ignore', invalid='ignore'):
+        power = where(valid, mus * (p0 + m * ptxOfCapacity(cMin / mus, noiseIfPower, a, b, M)), 0)
+    obj = sum(power, axis=1) + sleep * pS[:,0]
+    for k, warmStart in enumerate(warmStarts):
+        if warmStart is not None:
+            warmStart.price = None if infeasible[k] else nu[k]
+            warmStart.capacity = cMin[k, valid[k]] / mus[k, valid[k]]
+            warmStart.iterations = evaluations[k]
+    return obj, concatenate((mus, sleep[:,None]), axis=1), status
@@ -19,11 +19,47 @@ import numpy as np
 from utils import utils
 import scipy.linalg
 
+class StubIpopt(object):
+    """Stands in for pyipopt. solve() evaluates the callbacks at the starting point and returns the given answer."""
+    def __init__(self, answer, obj):
+        self.answer = answer
+        self.obj = obj
+        self.starts = [] # starting points of all solves
+
+    def set_loglevel(self, level):
+        pass
+
+    def create(self, nvar, x_L, x_U, ncon, g_L, g_U, nnzj, nnzh, eval_f, eval_grad_f, eval_g, eval_jac_g):
+        self.problem = nvar, ncon, nnzj, eval_f, eval_grad_f, eval_g, eval_jac_g
+        return self
+
+    def int_option(self, name, value):
+        pass
+
+    str_option = num_option = int_option
+
+    def solve(self, x0):
+        nvar, ncon, nnzj, eval_f, eval_grad_f, eval_g, eval_jac_g = self.problem
+        x0 = np.array(x0, dtype=float)
+        self.starts.append(x0)
+        assert np.isfinite(eval_f(x0))
+        assert np.asarray(eval_grad_f(x0)).size == nvar
+        assert np.asarray(eval_g(x0)).size == ncon
+        assert [ len(index) for index in eval_jac_g(x0, True) ] == [nnzj, nnzj]
+        assert np.asarray(eval_jac_g(x0, False)).size == nnzj
+        return np.array(self.answer), np.zeros(nvar), np.zeros(nvar), self.obj, 0
+
+    def close(self):
+        pass
+
 class TestSequenceFunctions(unittest.TestCase):
 
     def setUp(self):
-        pass
+        self.solvers = ['native'] # the DTX problem is solved by each available solver
+        if optimMinPow.pyipopt is not None:
+            self.solvers.append('ipopt')
 
+    @unittest.skipIf(optimMinPow.pyipopt is None, 'pyipopt is not installed')
     def test_optimPC(self):
         # test for simple problem with known outcome
         H = np.array([[[1.-1j,-1.],[-1.,1.]],[[1.-1j,1.],[-1.,1.]],[[0.5,1.j],[1.,-1.j]]])
@@ -42,6 +78,34 @@ class TestSequenceFunctions(unittest.TestCase):
         np.testing.assert_almost_equal(obj, answerObj)
         np.testing.assert_almost_equal(solution, answerSol)
 
+    def test_ipoptInterface(self):
+        # the IPOPT paths with a stub of pyipopt: return values and warm starts
+        H = np.array([[[1.-1j,-1.],[-1.,1.]],[[1.-1j,1.],[-1.,1.]],[[0.5,1.j],[1.,-1.j]]])
+        for k in np.arange(3):
+            H[k,:,:] = scipy.dot(H[k,:,:], H[k,:,:].conj().T)
+        args = (np.ones(3), 1, 1, 10, 10, 2, 5)
+        objNative, solutionNative, statusNative = optimMinPow.optimizePCDTX(H, *args, solver='native')
+        pyipopt = optimMinPow.pyipopt
+        try:
+            optimMinPow.pyipopt = StubIpopt(solutionNative, objNative)
+            warmStart = optimMinPow.WarmStart()
+            obj, solution, status = optimMinPow.optimizePCDTX(H, *args, solver='ipopt', warmStart=warmStart, userIds=[7, 8, 9])
+            np.testing.assert_array_equal(solution, solutionNative)
+            self.assertEqual(status, 0)
+            self.assertFalse(warmStart.warm)
+            # the same users in another order start from the reordered solution
+            optimMinPow.optimizePCDTX(H[::-1], *args, solver='ipopt', warmStart=warmStart, userIds=[9, 8, 7])
+            self.assertTrue(warmStart.warm)
+            self.assertEqual(warmStart.iterations, None) # only the native solver counts iterations
+            self.assertEqual(warmStart.saved, 0)
+            np.testing.assert_array_equal(optimMinPow.pyipopt.starts[-1], np.append(solutionNative[:-1][::-1], solutionNative[-1]))
+
+            optimMinPow.pyipopt = StubIpopt(solutionNative[:-1], 2.)
+            obj, solution, status = optimMinPow.optimizePC(H, np.ones(3), 1, 1, 10, 0, 1)
+            np.testing.assert_array_equal(solution, solutionNative[:-1])
+        finally:
+            optimMinPow.pyipopt = pyipopt
+
     def test_optimPCDTX_trivial(self):
         # test for simple problem with known outcome
         H = np.ones([3,2,2])
@@ -55,16 +119,17 @@ class TestSequenceFunctions(unittest.TestCase):
         pS = 5
         pMax = 10
 
-        obj, solution, status = optimMinPow.optimizePCDTX(H, noisepower, rate, linkBandwidth, pMax, p0, m, pS, 0)
-        answerObj = 17.000000115485285
-        answerSol = np.array([ 0.33333334,  0.33333334,  0.33333334,  0.        ])
-        np.testing.assert_almost_equal(obj, answerObj)
-        np.testing.assert_almost_equal(solution, answerSol)
+        for solver in self.solvers:
+            obj, solution, status = optimMinPow.optimizePCDTX(H, noisepower, rate, linkBandwidth, pMax, p0, m, pS, 0, solver)
+            answerObj = 17. # exact: each user needs 3.5 W for a third of the time. IPOPT stops at 17.000000115485285
+            answerSol = np.array([ 0.33333334,  0.33333334,  0.33333334,  0.        ])
+            np.testing.assert_almost_equal(obj, answerObj, decimal=6)
+            np.testing.assert_almost_equal(solution, answerSol)
 
-        for k in np.arange(H.shape[0]):
-            ptx = optimMinPow2x2DTX.ptxOfMu(solution[k], rate, linkBandwidth, noisepower[k], H[k,:,:])
-            rate_test = solution[k]*np.real(utils.ergMIMOCapacityCDITCSIR(H[k,:,:], ptx))
-            np.testing.assert_almost_equal(rate_test, rate)
+            for k in np.arange(H.shape[0]):
+                ptx = optimMinPow2x2DTX.ptxOfMu(solution[k], rate, linkBandwidth, noisepower[k], H[k,:,:])
+                rate_test = solution[k]*np.real(utils.ergMIMOCapacityCDITCSIR(H[k,:,:], ptx))
+                np.testing.assert_almost_equal(rate_test, rate)
 
 # TODO: Find out why this fails to find a solution
 #        CSI_Optim = np.array([[[  7.47e-04+0.j,   7.47e-04+0.j],
@@ -100,16 +165,88 @@ class TestSequenceFunctions(unittest.TestCase):
         pS = 5
         pMax = 10
 
-        obj, solution, status = optimMinPow.optimizePCDTX(H, noisepower, rate, linkBandwidth, pMax, p0, m, pS, 0)
-        answerObj = 13.9204261
-        answerSol = np.array([ 0.32342002,  0.24371824,  0.27855287,  0.15430887])
-        np.testing.assert_almost_equal(obj, answerObj)
-        np.testing.assert_almost_equal(solution, answerSol)
+        for solver in self.solvers:
+            obj, solution, status = optimMinPow.optimizePCDTX(H, noisepower, rate, linkBandwidth, pMax, p0, m, pS, 0, solver)
+            answerObj = 13.9204261
+            answerSol = np.array([ 0.32342002,  0.24371824,  0.27855287,  0.15430887])
+            np.testing.assert_almost_equal(obj, answerObj)
+            np.testing.assert_almost_equal(solution, answerSol)
+
+            for k in np.arange(H.shape[0]):
+                ptx = optimMinPow2x2DTX.ptxOfMu(solution[k], rate, linkBandwidth, noisepower[k], H[k,:,:])
+                rate_test = solution[k]*np.real(utils.ergMIMOCapacityCDITCSIR(H[k,:,:], ptx))
+                np.testing.assert_almost_equal(rate_test, rate)
+
+    def test_optimPCDTXinfeasible(self):
+        # the power limit cannot meet the rate
+        H = np.ones([3,2,2])*2.
+        obj, solution, status = optimMinPow2x2DTX.solveDual(np.ones(3), H, 10, 1, 1, 10, 2, 5)
+        self.assertEqual(status, 2)
+        self.assertRaises(ValueError, optimMinPow.optimizePCDTX, H, np.ones(3), 10, 1, 1, 10, 2, 5, 0, 'native')
+
+    def test_warmStart(self):
+        # a slightly changed problem for the same users starts from the last solution
+        H = np.array([[[1.-1j,-1.],[-1.,1.]],[[1.-1j,1.],[-1.,1.]],[[0.5,1.j],[1.,-1.j]]])
+        for k in np.arange(3):
+            H[k,:,:] = scipy.dot(H[k,:,:], H[k,:,:].conj().T)
+        args = (np.ones(3), 1, 1, 10, 10, 2, 200) # no sleep
+        warmStart = optimMinPow.WarmStart()
+        optimMinPow.optimizePCDTX(H, *args, solver='native', warmStart=warmStart, userIds=[7, 8, 9])
+        self.assertFalse(warmStart.warm)
+        cold = warmStart.iterations
+
+        obj, solution, status = optimMinPow.optimizePCDTX(H*1.01, *args, solver='native', warmStart=warmStart, userIds=[7, 8, 9])
+        self.assertTrue(warmStart.warm)
+        self.assertTrue(warmStart.iterations < cold)
+        self.assertEqual(warmStart.saved, cold - warmStart.iterations)
+        objCold, solutionCold, _ = optimMinPow.optimizePCDTX(H*1.01, *args, solver='native')
+        np.testing.assert_almost_equal(obj, objCold)
+        np.testing.assert_almost_equal(solution, solutionCold)
 
-        for k in np.arange(H.shape[0]):
-            ptx = optimMinPow2x2DTX.ptxOfMu(solution[k], rate, linkBandwidth, noisepower[k], H[k,:,:])
-            rate_test = solution[k]*np.real(utils.ergMIMOCapacityCDITCSIR(H[k,:,:], ptx))
-            np.testing.assert_almost_equal(rate_test, rate)
+        # the same users in another order
+        obj, solution, status = optimMinPow.optimizePCDTX(H[::-1]*1.01, *args, solver='native', warmStart=warmStart, userIds=[9, 8, 7])
+        self.assertTrue(warmStart.warm)
+        np.testing.assert_almost_equal(solution[:-1], solutionCold[:-1][::-1])
+
+        # other users
+        optimMinPow.optimizePCDTX(H, *args, solver='native', warmStart=warmStart, userIds=[1, 8, 9])
+        self.assertFalse(warmStart.warm)
+
+    def test_optimPCDTXbatch(self):
+        # padded problems give the same results as individual solves
+        H = np.array([[[1.-1j,-1.],[-1.,1.]],[[1.-1j,1.],[-1.,1.]],[[0.5,1.j],[1.,-1.j]]])
+        for k in np.arange(3):
+            H[k,:,:] = scipy.dot(H[k,:,:], H[k,:,:].conj().T)
+        args = (1, 1, 10, 10, 2, 5)
+        channels = np.zeros([3,3,2,2], dtype=complex)
+        channels[0] = H
+        channels[1,:2] = H[1:]*0.5
+        valid = np.array([[True]*3, [True, True, False], [False]*3])
+        noiseIfPower = np.where(valid, 1., 0.)
+        obj, solution, status = optimMinPow.optimizePCDTXbatch(channels, valid, noiseIfPower, *args)
+
+        objSingle, solutionSingle, statusSingle = optimMinPow.optimizePCDTX(H, np.ones(3), *args, solver='native')
+        np.testing.assert_almost_equal(obj[0], objSingle)
+        np.testing.assert_almost_equal(solution[0], solutionSingle)
+        objSingle, solutionSingle, statusSingle = optimMinPow.optimizePCDTX(H[1:]*0.5, np.ones(2), *args, solver='native')
+        np.testing.assert_almost_equal(obj[1], objSingle)
+        np.testing.assert_almost_equal(solution[1][[0,1,3]], solutionSingle)
+        self.assertEqual(solution[1][2], 0) # padding
+        np.testing.assert_almost_equal(solution[2], [0, 0, 0, 1]) # no users, full sleep
+        self.assertEqual(list(status), [0, 0, 0])
+
+        # each problem counts its own derivative evaluations, as if it were solved alone
+        args = (1, 1, 10, 10, 2, 200) # no sleep, so the price iteration runs
+        channels[2] = H * 3
+        valid[2] = True
+        warmStarts = [ optimMinPow.WarmStart() for k in range(3) ]
+        optimMinPow.optimizePCDTXbatch(channels, valid, np.where(valid, 1., 0.), *args, warmStarts=warmStarts)
+        for k in range(3):
+            users = int(np.sum(valid[k]))
+            warmStart = optimMinPow.WarmStart()
+            optimMinPow.optimizePCDTX(channels[k,:users], np.ones(users), *args, solver='native', warmStart=warmStart)
+            self.assertEqual(warmStarts[k].iterations, warmStart.iterations)
+        self.assertNotEqual(warmStarts[0].iterations, warmStarts[2].iterations)
 
     def test_optimPCDTXrandomChannel(self):
         # test for simple problem with known outcome
@@ -128,13 +265,14 @@ class TestSequenceFunctions(unittest.TestCase):
         pS = 50
         pMax = 40
         
-        obj, solution, status = optimMinPow.optimizePCDTX(H, noisepower, rate, linkBandwidth, pMax, p0, m, pS, 0)
+        for solver in self.solvers:
+            obj, solution, status = optimMinPow.optimizePCDTX(H, noisepower, rate, linkBandwidth, pMax, p0, m, pS, 0, solver)
 
-        # Test that all calls were correct and their order. What goes in must come out.
-        for k in np.arange(users):
-            ptx = optimMinPow2x2DTX.ptxOfMu(solution[k], rate, linkBandwidth, noisepower[k], H[k,:,:]) # power as a function of the MIMO link
-            rate_test = solution[k]*np.real(utils.ergMIMOCapacityCDITCSIR(H[k,:,:], ptx/noisepower[k]))*linkBandwidth # bps
-            np.testing.assert_almost_equal(rate_test, rate)
+            # Test that all calls were correct and their order. What goes in must come out.
+            for k in np.arange(users):
+                ptx = optimMinPow2x2DTX.ptxOfMu(solution[k], rate, linkBandwidth, noisepower[k], H[k,:,:]) # power as a function of the MIMO link
+                rate_test = solution[k]*np.real(utils.ergMIMOCapacityCDITCSIR(H[k,:,:], ptx/noisepower[k]))*linkBandwidth # bps
+                np.testing.assert_almost_equal(rate_test, rate)
             
 
 
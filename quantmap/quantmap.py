@@ -46,46 +46,40 @@ def quantmap(alloc, N, T):
         m_k = floor(  alloc[:-1] * N * T  ) 
         leftoverRBs = N*T - sum(m_k)
 
+    t_active = int(t_active)
+
     # add remaining RBs to users round robin
-    # set index here so the round robin continues where it left off within the while loop. 
     rnd = random.permutation(K) # random starting point
-    index = rnd[0] # Can this be done in one line with the one above?
-        
     
     # Note that it's possible that a user receives RBs who did not request any since we are overcompensating
-    while leftoverRBs > 0:
-        m_k[index] = m_k[index] + 1
-        leftoverRBs = leftoverRBs - 1
-        index = mod(index+1, K)  # move to next user
+    if leftoverRBs > 0:
+        m_k = m_k + roundrobin(ones(K) * ceil(leftoverRBs / K), leftoverRBs, rnd[0])[0]
 
     m_k_start = m_k # save value for comparison later
 
     # Mapping per slot (from budget)
     m_slot = empty([t_active, K])
     m_slot[:] = nan
-    # for each active time slot
 
-    # set index here so the round robin continues where it left off within the while loop. 
-    indx = rnd[0] # Can this be done in one line with the one above?
+    # test validity. Every slot hands out N RBs.
+    if sum(m_k_start) != N * t_active:
+        disp('Sum mismatch in quantMap.m!')
+
+    # set index here so the round robin continues where it left off in the previous slot
+    indx = rnd[0]
     for slot in arange(t_active):
         # take first guess at allocation by floor()
         m_slot[slot, :] = floor( m_k/sum(m_k) * N )
 
-        # fill up the remaining 
+        # fill up the remaining. Only where there is room, otherwise there may be negative slot numbers
         remainder = N - sum(m_slot[slot, :])
-        while remainder > 0:
-            if nansum(m_slot[:,indx]) < m_k_start[indx]: # only if there is room. otherwise there may be negative slot numbers
-                m_slot[slot, indx] = m_slot[slot, indx] + 1
-                remainder = remainder - 1
-            indx = mod(indx+1, K)  # move to next user
+        if remainder > 0:
+            added, indx = roundrobin(m_k - m_slot[slot, :], remainder, indx) # room is what is left of the budget
+            m_slot[slot, :] += added
 
         # keep track
         m_k = m_k - m_slot[slot, :]
 
-        # test validity
-        if nansum( m_k + nansum( m_slot,axis=0)) != N * t_active:
-            disp('Sum mismatch in quantMap.m!')
-
     # test validity
     if (sum(m_slot,axis=0) != m_k_start).all():
         raise ValueError ('Assignment faulty in quantMap.m!')
@@ -97,3 +91,20 @@ def quantmap(alloc, N, T):
     outMap[:t_active, :] = m_slot
 
     return outMap
+
+def roundrobin(room, count, start):
+    """Hand out count units one by one to the users in cyclic order, beginning with user start. Users without room are skipped.
+    All full rounds are counted at once by cumulative sums over the rounds. Returns the units per user and the user after the last one served."""
+    K = room.size
+    order = mod(start + arange(K), K)
+    room = maximum(room[order], 0)
+    handed = cumsum(sum(room[:,newaxis] >= arange(1, max(room) + 1), 0)) # units handed out after each full round
+    if handed.size == 0 or handed[-1] < count:
+        raise ValueError ('Not enough room for the round robin in quantMap.m!')
+    rounds = searchsorted(handed, count) # full rounds before the last one
+    units = minimum(room, rounds)
+    served = nonzero(room > rounds)[0][:int(count - sum(units))] # users served in the last round
+    units[served] += 1
+    added = empty(K)
+    added[order] = units
+    return added, mod(order[served[-1]] + 1, K)
@@ -13,7 +13,7 @@ __maintainer__ = "Hauke Holtkamp"
 __email__ = "h.holtkamp@gmail.com" 
 __status__ = "Development" 
 
-from quantmap import quantmap
+from quantmap import quantmap, roundrobin
 import unittest
 import numpy as np
 from utils import utils
@@ -46,6 +46,29 @@ class TestSequenceFunctions(unittest.TestCase):
         answer = np.nansum(outMap[:,-1]) # last user's resources
 
         self.assertTrue(N*T*alloc[9] < answer)
-       
+
+    def test_quantmap_invariants(self):
+        # each active slot hands out all N RBs, nothing is negative and the sleep slots come last
+        N = 100
+        T = 20
+        for trial in range(20):
+            alloc = np.random.rand(8)
+            alloc[-1] *= 4
+            alloc /= np.sum(alloc)
+            outMap = quantmap(alloc, N, T)
+            active = ~np.isnan(outMap[:,0])
+            t_active = np.sum(active)
+            self.assertTrue(active[:t_active].all())
+            np.testing.assert_array_equal(np.sum(outMap[active], 1), N)
+            self.assertTrue((outMap[active] >= 0).all())
+            self.assertTrue((np.sum(outMap[active], 0) >= np.ceil(alloc[:-1] * N * T) - 1).all())
+
+    def test_roundrobin(self):
+        # users without room are skipped and the next round continues after the last one served
+        added, nxt = roundrobin(np.array([0., 2., 1., 5.]), 5, 2)
+        np.testing.assert_array_equal(added, [0, 2, 1, 2])
+        self.assertEqual(nxt, 2)
+        self.assertRaises(ValueError, roundrobin, np.array([1., 1.]), 3, 0)
+
 if __name__ == '__main__':
     unittest.main()
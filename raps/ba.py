@@ -47,31 +47,22 @@ def ba(rate, wrld, cell, mobiles, users):
     noiseIfPowerPerResource = np.empty([N,T,users])
     noiseIfPowerPerResource[:] = np.nan
     for idx, obj in enumerate(mobiles):
-        CSI_BA[:,:,:,:,idx] = obj.baseStations[obj.BS]['cells'][cell]['CSI_OFDMA']
+        CSI_BA[:,:,:,:,idx] = obj.cellCSI(cell)
         noiseIfPowerPerResource[:,:,idx] = obj.noiseIfPower * np.ones([N,T]) / N
 
     resourceTime = totalTime / T
     resourceBandwidth = systemBandwidth / N
     baseSNR = pPerResource / (noiseIfPowerPerResource)
-    user = 0
-    usedRBCounter = np.zeros(T)
-    flag = False
-
-    for n in np.arange(N):
-        for t in np.arange(T):
-            usedRBCounter[t] = usedRBCounter[t] + 1
-            H = np.dot(CSI_BA[:,:,n,t,user], CSI_BA[:,:,n,t,user].conj().T) 
-            bitsInThisRB = resourceBandwidth * resourceTime * np.real(utils.ergMIMOCapacityCDITCSIR(H, baseSNR[n,t,user]))
-            bitloadPerUser[user] = bitloadPerUser[user] - bitsInThisRB
-
-            if bitloadPerUser[user] <= 0:
-                user = user+1
-            if user >= K:
-                flag = True
-                break
-
-        if flag:
-            break
+
+    # bits of each RB in frequency first order (n, t)
+    bits = np.empty([K, N*T])
+    for user in np.arange(K):
+        CSI = CSI_BA[:,:,:,:,user].transpose(2,3,0,1) # (N, T, 2, 2)
+        H = np.einsum('...ij,...kj->...ik', CSI, CSI.conj())
+        bits[user] = (resourceBandwidth * resourceTime * np.real(utils.ergMIMOCapacityCDITCSIRStack(H, baseSNR[0,0,user]))).ravel()
+
+    owner, bitloadPerUser = allocate_in_order(bits, bitloadPerUser)
+    usedRBCounter = np.bincount(np.flatnonzero(owner >= 0) % T, minlength=T).astype(float)
 
     if (bitloadPerUser<0).all():
         pTxBA = pPerResource[0,0,0] * usedRBCounter
@@ -112,13 +103,11 @@ def dtx(rate, wrld, cell, mobiles, users):
     pSupplyDTX = np.nan
     resourceTime = totalTime / T
     resourceBandwidth = systemBandwidth / N
-    user = 0
     
     usedRBs = np.zeros([N,T])
     outmap = np.ones([N,T])
     outmap[:] = np.nan
     usedRBs[:] = np.nan
-    flag = False
 
     if cell.sleep_alignment == 'random_shift_once': # same shift for all iterations
         shift = cell.sleep_slot_priority[0]
@@ -143,23 +132,16 @@ def dtx(rate, wrld, cell, mobiles, users):
         slot_order = np.arange(T) 
 
     logger.info('Sleep alignment used: ' + str( slot_order))
+    slot_order = np.asarray(slot_order, dtype=int)
+    capacities = RB_bit_capacities(cell, mobiles, resourceBandwidth, resourceTime, pPerResource)
 
-    for t in slot_order: 
-        for n in np.arange(N):
-            usedRBs[n,t] = 1
-            outmap[n,t] = mobiles[user].id_
-            bitsInThisRB = RB_bit_capacity(mobiles[user], n, t, resourceBandwidth, 
-                        resourceTime, pPerResource) 
-            bitloadPerUser[user] = bitloadPerUser[user] - bitsInThisRB
-
-            if bitloadPerUser[user] <= 0:
-                user = user+1
-            if user >= K:
-                flag = True
-                break
-
-        if flag:
-            break
+    # whole bits of each RB in time slot order, frequency first within a slot
+    bits = np.int_(capacities[:K][:,:,slot_order]).transpose(0,2,1).reshape(K, -1).astype(float)
+    owner, bitloadPerUser = allocate_in_order(bits, bitloadPerUser)
+    used = np.flatnonzero(owner >= 0)
+    n, t = used % N, slot_order[used // N]
+    usedRBs[n,t] = 1
+    outmap[n,t] = np.array([ mob.id_ for mob in mobiles ])[owner[used]]
 
     if (bitloadPerUser<0).all():
         pTxDTX_OFDMA = pPerResource * usedRBs
@@ -183,6 +165,29 @@ def dtx(rate, wrld, cell, mobiles, users):
 
     return pSupplyDTX
 
+def allocate_in_order(bits, bitloadPerUser):
+    """Hand out resource blocks in a fixed order. The first user receives RBs until its bit load is served, then the next user, and so on.
+    Input:
+        bits: bit capacity of each RB in allocation order for each user (users, RBs)
+        bitloadPerUser: array of bit load by user index
+    Output:
+        owner: user index of each RB. -1 for unused RBs.
+        remaining: bit load left per user. Zero or less for served users."""
+    users, RBs = bits.shape
+    owner = -np.ones(RBs, dtype=int)
+    remaining = np.array(bitloadPerUser, dtype=float)
+    start = 0
+    for user in np.arange(users):
+        if start >= RBs:
+            break
+        left = np.subtract.accumulate(np.concatenate([[remaining[user]], bits[user, start:]]))[1:] # same float steps as one RB at a time
+        served = left <= 0
+        count = np.argmax(served) + 1 if served.any() else left.size
+        owner[start:start+count] = user
+        remaining[user] = left[count-1]
+        start += count
+    return owner, remaining
+
 def capacity_achieved_per_mobile(target, wrld, cell, mobiles):
     '''Returns list in length of number of mobiles in cell indicating capacity achieved (True) or not (False) for each mobile.'''
     li = []
@@ -219,10 +224,8 @@ def achieved_capacity_on_mobile(wrld, cell, mobile):
     resourceTime = totalTime / T
     resourceBandwidth = systemBandwidth / N
 
-    cap = 0
-    for i in np.arange(len(n)):
-            cap += RB_bit_capacity(mobile, n[i], t[i], resourceBandwidth, 
-                    resourceTime, pPerResource)
+    capacities = RB_bit_capacities(cell, [mobile], resourceBandwidth, resourceTime, pPerResource)[0]
+    cap = int(np.sum(np.int_(capacities[n, t]))) # bits are counted per RB
 
     return cap
             
@@ -231,3 +234,19 @@ def achieved_capacity_on_mobile(wrld, cell, mobile):
 def RB_bit_capacity(mobile, n, t, bw, time, power):
     """Bit capacity of resource block"""
     return int(bw * time * np.real(utils.ergMIMOCapacityCDITCSIR(mobile.OFDMA_EC[:,:,n,t], power)) )
+
+def RB_bit_capacities(cell, mobiles, bw, time, power):
+    """Bit capacity of all resource blocks of the mobiles at the same power on each RB. Returns array([users, N, T]). Unlike RB_bit_capacity, the bits are not rounded down.
+    The capacities are computed in one pass and cached in the cell until the SINR of a mobile changes."""
+    if not hasattr(cell, 'capacityCache'): # cells from older pickles
+        cell.capacityCache = dict()
+    cache = cell.capacityCache
+    keys = [ (getattr(mob, 'sinrVersion', None), bw, time, power) for mob in mobiles ]
+    missing = [ idx for idx, mob in enumerate(mobiles) 
+            if keys[idx][0] is None or cache.get(mob.id_, (None, None))[0] != keys[idx] ]
+    if missing:
+        EC = np.array([ mobiles[idx].OFDMA_EC for idx in missing ]).transpose(0,3,4,1,2) # (users, N, T, antennas, 2)
+        capacities = bw * time * np.real(utils.ergMIMOCapacityCDITCSIRStack(EC, power))
+        for i, idx in enumerate(missing):
+            cache[mobiles[idx].id_] = (keys[idx], capacities[i])
+    return np.array([ cache[mob.id_][1] for mob in mobiles ])
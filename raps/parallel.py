@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+''' Parallel scheduling of all cells within one iteration.
+
+The scheduling decision of a cell (ba.dtx, raps.raps, pf.pf_ba, ...) only depends on the current effective channels of its own mobiles. Each cell's inputs are copied into small snapshots that stand in for the World, Cell and Mobile objects. These are shipped to a pool of worker processes, so the World is never pickled. The new transmission powers and allocations are applied to the cells afterwards, before the next SINR update.
+Every cell is scheduled with its own random seed. The outcome does not depend on the number of processes or on the order in which cells finish. The random generators of the calling process are restored after each cell, so the rest of a simulation draws the same numbers as without scheduling.
+
+File: parallel.py
+'''
+
+__author__ = "Hauke Holtkamp"
+__credits__ = "Hauke Holtkamp"
+__license__ = "unknown"
+__version__ = "unknown"
+__maintainer__ = "Hauke Holtkamp"
+__email__ = "h.holtkamp@gmail.com"
+__status__ = "Development"
+
+import ba
+import numpy as np
+import random
+import multiprocessing
+import logging
+logger = logging.getLogger('RAPS_script')
+
+# These sleep alignments rank time slots with methods and state of the real Cell. Such cells are scheduled in the calling process.
+localAlignments = ('sinr', 'sinr_protect', 'dtx_segregation')
+
+class Snapshot(object):
+    """Plain attribute container that stands in for a World, Cell, Mobile or BaseStation in a worker."""
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+def cellSeed(seed, iteration, cell):
+    """Seed of the random generators for the scheduling of cell in an iteration."""
+    return [seed, iteration, cell.cellid]
+
+def seedGenerators(seed):
+    """Seed numpy's and python's random generators."""
+    np.random.seed(seed)
+    random.seed(np.random.randint(2**31))
+
+def seeded(seed, function, *args):
+    """Call function(*args) with the random generators seeded. Their previous states are restored afterwards."""
+    states = np.random.get_state(), random.getstate()
+    seedGenerators(seed)
+    try:
+        return function(*args)
+    finally:
+        np.random.set_state(states[0])
+        random.setstate(states[1])
+
+def cellJob(wrld, cell, mobiles, rate, seed):
+    """Copy everything the scheduling of cell needs into snapshots. Returns (world, cell, mobiles, rate, seed)."""
+    sleep_slot_priority = seeded(seed, getattr, cell, 'sleep_slot_priority') # may be drawn on first access
+    cellSnapshot = Snapshot(cellid=cell.cellid, antennas=cell.antennas, pMax=cell.pMax, phy=wrld.PHY,
+            sleep_alignment=cell.sleep_alignment, sleep_slot_priority=sleep_slot_priority,
+            warmStart=cell.warmStart, capacityCache=dict(), OFDMA_power=cell.OFDMA_power.copy(), outmap=cell.outmap.copy())
+    if cell.sleep_alignment == 'static':
+        cellSnapshot.static_timeslots = cell.static_timeslots
+    mobileSnapshots = []
+    for mob in mobiles:
+        BS = Snapshot(p0=mob.BS.p0, m=mob.BS.m, pS=mob.BS.pS)
+        mobileSnapshots.append(Snapshot(id_=mob.id_, antennas=mob.antennas, BS=BS, cell=cellSnapshot, PHY=mob.PHY,
+            noiseIfPower=mob.noiseIfPower, OFDMA_EC=mob.OFDMA_EC.copy(), OFDMA_effSINR=mob.OFDMA_effSINR.copy(), sinrVersion=getattr(mob, 'sinrVersion', None)))
+    wconf = Snapshot(optim_solver=getattr(wrld.wconf, 'optim_solver', None))
+    worldSnapshot = Snapshot(PHY=wrld.PHY, wconf=wconf, mobiles=mobileSnapshots)
+    return worldSnapshot, cellSnapshot, mobileSnapshots, rate, seed
+
+def runScheduler(scheduler, wrld, cell, mobiles, rate, seed):
+    """Call scheduler(wrld, cell, mobiles, rate) with seeded random generators. Returns (result, error message or None)."""
+    try:
+        return seeded(seed, scheduler, wrld, cell, mobiles, rate), None
+    except ValueError as err:
+        return None, str(err)
+
+def dtx(wrld, cell, mobiles, rate):
+    """ba.dtx with the scheduler signature."""
+    return ba.dtx(rate, wrld, cell, mobiles, len(mobiles))
+
+def scheduleCell(job):
+    """Worker: schedule one cell snapshot. Returns (result, error, OFDMA_power, outmap, warmStart)."""
+    scheduler, (wrld, cell, mobiles, rate, seed) = job
+    result, error = runScheduler(scheduler, wrld, cell, mobiles, rate, seed)
+    return result, error, cell.OFDMA_power, cell.outmap, cell.warmStart
+
+class ParallelScheduler(object):
+    """Schedules all cells of a World for one iteration, in parallel if processes > 1.
+    scheduler is a module level function (wrld, cell, mobiles, rate) -> result that sets cell.OFDMA_power and cell.outmap, e.g. raps.raps or pf.pf_ba. Failed cells (ValueError) give the result failure."""
+
+    def __init__(self, scheduler, processes=1, seed=None, failure=np.nan):
+        self.scheduler = scheduler
+        self.failure = failure
+        if seed is None:
+            seed = np.random.randint(2**31) # reproducible from the global seed
+        self.seed = seed
+        if processes is None or processes < 1:
+            processes = multiprocessing.cpu_count()
+        self.processes = processes
+        self.pool = multiprocessing.Pool(processes) if processes > 1 else None
+
+    def schedule(self, wrld, rate, iteration):
+        """Schedule all cells of wrld and apply the new transmission powers and allocations. Returns a list of results aligned with wrld.cells. Cells without mobiles do not transmit and give None."""
+        cellMobiles = dict((cell, []) for cell in wrld.cells)
+        for mob in wrld.mobiles:
+            cellMobiles[mob.cell].append(mob)
+
+        jobs = []
+        results = dict()
+        for cell in wrld.cells:
+            mobiles = cellMobiles[cell]
+            seed = cellSeed(self.seed, iteration, cell)
+            if not mobiles:
+                cell.OFDMA_power[:] = 0
+                results[cell] = None
+            elif cell.sleep_alignment in localAlignments:
+                results[cell] = self.finish(cell, *runScheduler(self.scheduler, wrld, cell, mobiles, rate, seed))
+            else:
+                jobs.append((cell, (self.scheduler, cellJob(wrld, cell, mobiles, rate, seed))))
+
+        if self.pool is None:
+            outputs = [ scheduleCell(job) for cell, job in jobs ]
+        else:
+            outputs = self.pool.map(scheduleCell, [ job for cell, job in jobs ], chunksize=1)
+        for (cell, job), (result, error, power, outmap, warmStart) in zip(jobs, outputs):
+            cell.OFDMA_power[:] = power
+            cell.outmap = outmap
+            cell.warmStart = warmStart
+            results[cell] = self.finish(cell, result, error)
+        return [ results[cell] for cell in wrld.cells ]
+
+    def finish(self, cell, result, error):
+        """Log the outcome of a cell"""
+        logger.info( 'Cell ID: ' + str(cell.cellid) )
+        if error is not None:
+            logger.warning( error )
+            return self.failure
+        return result
+
+    def close(self):
+        """Shut down the worker processes."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
@@ -17,6 +17,7 @@ __status__ = "Development"
 
 import numpy as np
 from utils import utils
+import ba
 import logging
 logger = logging.getLogger('PF_script')
 
@@ -42,11 +43,6 @@ def pf(wrld, cell, mobiles, rate, avg_rate, plotting=False):
 def pf_ba(wrld, cell, mobiles, rate, plotting=False):
     """Power control proportional fair.
     Perform PF on entire OFDMA frame and then only use as many RBs as needed."""
-    # need to map algorithm indices to mobile ids (artifact from MATLAB)
-    id_map = dict()
-    for k, mob in enumerate(mobiles):
-        id_map[k] = mob.id_
-
     users = len(mobiles) 
     logger.info( '{0:50} {1:5d}'.format('Mobiles in this cell:', len(mobiles)))
     N = wrld.PHY.numFreqChunks
@@ -57,37 +53,11 @@ def pf_ba(wrld, cell, mobiles, rate, plotting=False):
     totalTime = wrld.PHY.simulationTime
     resourceTime = totalTime / T
     resourceBandwidth = systemBandwidth / N
-
-    remainingBitsPerUser = rate * wrld.PHY.simulationTime * np.ones(users)
     bitloadPerUser = rate * wrld.PHY.simulationTime
-    transmittedBitsPerUser = np.ones(users)
-    
-    alloc  = np.ones([N,T], dtype=int) * len(mobiles) # carries user index per RB. len(mobiles) is not a valid user index. 
-    metric = np.empty([N, users]) # PF decision metric. RB capacity over already transmitted bits.
-    user_cap = np.empty([N, users])
-    frame_cap = np.empty([N,T])
-    best_rate = np.empty([N,T])
-    
-    # First, decide which user should receive which RB if *all* RBs were to be used
-    for t in np.arange(T):
-        for idx, mob in enumerate(mobiles):
-            for n in np.arange(N):
-                user_cap[n,idx] =  RB_bit_capacity(mob, n, t, resourceBandwidth, 
-                        resourceTime, pPerResource) 
-                metric[n,idx] = user_cap[n,idx] / transmittedBitsPerUser[idx] 
 
-        alloc[:,t] = np.argmax(metric, axis=1)
-        best_rate[:,t] = user_cap[np.arange(alloc[:,t].shape[0]),alloc[:,t]] # save for later
-        
-        for n in np.arange(N):
-            remainingBitsPerUser[alloc[n,t]] -= RB_bit_capacity(mobiles[alloc[n,t]], n, t, 
-                    resourceBandwidth, resourceTime, pPerResource) # note that this can become negative. That is not realistic, but positively affects the metric
-
-        for idx, mob in enumerate(mobiles):
-            if remainingBitsPerUser[idx] < 0:
-                remainingBitsPerUser[idx] = -1e20 # prevent further allocation in metric. Otherwise some users would rate starve.
-            
-        transmittedBitsPerUser = np.maximum(bitloadPerUser - remainingBitsPerUser, np.ones_like(bitloadPerUser)) # prevent inf metric
+    # First, decide which user should receive which RB if *all* RBs were to be used
+    capacities = ba.RB_bit_capacities(cell, mobiles, resourceBandwidth, resourceTime, pPerResource) # (users, N, T)
+    alloc, best_rate, remainingBitsPerUser = pf_allocation(capacities, bitloadPerUser)
     
     if (remainingBitsPerUser > 0).any():
         raise ValueError('Proportional fair overloaded!')
@@ -96,24 +66,7 @@ def pf_ba(wrld, cell, mobiles, rate, plotting=False):
         raise ValueError('Proportional fair allocation incomplete!')
         
     # Second, rank each user's RB by quality and only use the best ones as needed
-    alloc_flat = alloc.flatten()
-    metric_flat = metric.flatten()
-    best_rate_flat = best_rate.flatten()
-    
-    bitsTransmitted = np.zeros(users)
-    sum_rate = 0 # sanity checker
-    for idx, mob in enumerate(mobiles):
-        subset_args = np.argsort(best_rate_flat[alloc_flat == idx])[::-1] # descending
-        for a in subset_args:
-            superset_arg = np.arange(len(best_rate_flat))[alloc_flat==idx][a] 
-            n, t = np.unravel_index(superset_arg, best_rate.shape)
-            bitsTransmitted[idx] += best_rate_flat[superset_arg]
-            if np.isnan(best_rate[n,t]):
-                raise ValueError('Value already assigned!')
-            sum_rate += best_rate[n,t]
-            best_rate[n, t] = np.nan # mark as used
-            if bitsTransmitted[idx] > bitloadPerUser:
-                break
+    sum_rate = pf_prune(alloc, best_rate, users, bitloadPerUser)
 
     # Sanity check
     if sum_rate < users * rate * totalTime:
@@ -123,11 +76,8 @@ def pf_ba(wrld, cell, mobiles, rate, plotting=False):
     cell.OFDMA_power = np.zeros([cell.antennas, N, T])
     cell.OFDMA_power[:, np.isnan(best_rate)] = pPerResource/2. # each antenna receives half power
 
-    # remap to mobile ids
-    outmap_ids = np.copy(alloc)
-    for k,v in id_map.iteritems():
-        outmap_ids[alloc==k] = v
-    cell.outmap = outmap_ids
+    # remap to mobile ids (algorithm indices are an artifact from MATLAB)
+    cell.outmap = np.array([ mob.id_ for mob in mobiles ])[alloc]
 
     # count power consumption
     usedRBs = np.sum(np.isnan(best_rate),axis=0)
@@ -150,61 +100,16 @@ def pf_dtx(wrld, cell, mobiles, rate):
     totalTime = wrld.PHY.simulationTime
     resourceTime = totalTime / T
     resourceBandwidth = systemBandwidth / N
-
-    remainingBitsPerUser = rate * wrld.PHY.simulationTime * np.ones(users)
     bitloadPerUser = rate * wrld.PHY.simulationTime
-    transmittedBitsPerUser = np.ones(users)
-    
-    alloc  = np.ones([N,T], dtype=int) * len(mobiles) # will throw err if used as indexed unchanged
-    metric = np.empty([N, users]) # PF decision metric. RB capacity over already transmitted bits.
-    user_cap = np.empty([N, users])
-    frame_cap = np.empty([N,T])
-    best_rate = np.empty([N,T])
-    best_rate[:] = -1
-    for t in np.arange(T):
-        for idx, mob in enumerate(mobiles):
-            for n in np.arange(N):
-                user_cap[n,idx] =  RB_bit_capacity(mob, n, t, resourceBandwidth, 
-                        resourceTime, pPerResource) 
-                metric[n,idx] = user_cap[n,idx] / transmittedBitsPerUser[idx] 
 
-        alloc[:,t] = np.argmax(metric, axis=1)
-        best_rate[:,t] = user_cap[np.arange(alloc[:,t].shape[0]),alloc[:,t]] # save for later
-        
-        for n in np.arange(N):
-            remainingBitsPerUser[alloc[n,t]] -= RB_bit_capacity(mobiles[alloc[n,t]], n, t, 
-                    resourceBandwidth, resourceTime, pPerResource) # note that this can become negative. That is not realistic, but positively affects the metric
-        for idx, mob in enumerate(mobiles):
-            if remainingBitsPerUser[idx] < 0:
-                remainingBitsPerUser[idx] = -1e20 # prevent further allocation in metric
-
-        if (remainingBitsPerUser<0).all(): # all are served
-            break
-            
-        transmittedBitsPerUser = np.maximum(bitloadPerUser - remainingBitsPerUser, np.ones_like(bitloadPerUser)) # prevent inf metric
+    capacities = ba.RB_bit_capacities(cell, mobiles, resourceBandwidth, resourceTime, pPerResource) # (users, N, T)
+    alloc, best_rate, remainingBitsPerUser = pf_allocation(capacities, bitloadPerUser, sleep=True)
     
     if (remainingBitsPerUser > 0).any():
         raise ValueError('Proportional fair overloaded!')
 
     # rank each user's RB by quality and only use the best ones as needed
-    alloc_flat = alloc.flatten()
-    metric_flat = metric.flatten()
-    best_rate_flat = best_rate.flatten()
-    
-    bitsTransmitted = np.zeros(users)
-    sum_rate = 0 # sanity checker
-    for idx, mob in enumerate(mobiles):
-        subset_args = np.argsort(best_rate_flat[alloc_flat == idx])[::-1] # descending
-        for a in subset_args:
-            superset_arg = np.arange(len(best_rate_flat))[alloc_flat==idx][a] 
-            n, t = np.unravel_index(superset_arg, best_rate.shape)
-            bitsTransmitted[idx] += best_rate_flat[superset_arg]
-            if np.isnan(best_rate[n,t]):
-                raise ValueError( 'Value already assigned!')
-            sum_rate += best_rate[n,t]
-            best_rate[n, t] = np.nan # mark as used
-            if bitsTransmitted[idx] > bitloadPerUser:
-                break
+    sum_rate = pf_prune(alloc, best_rate, users, bitloadPerUser)
 
     # Sanity check
     if sum_rate < users * rate * totalTime:
@@ -214,9 +119,8 @@ def pf_dtx(wrld, cell, mobiles, rate):
     cell.OFDMA_power = np.zeros([cell.antennas, N, T])
     cell.OFDMA_power[:, np.isnan(best_rate)] = pPerResource/2. # each antenna receives half power
 
-    import pdb; pdb.set_trace() # FIX OUTMAP TO HOLD mobile.id_!!!!
-    
-    cell.outmap = alloc
+    # remap to mobile ids. Sleep slots are not allocated.
+    cell.outmap = np.array([ mob.id_ for mob in mobiles ] + [np.nan])[alloc]
 
     # count power consumption
     usedRBs = np.sum(np.isnan(best_rate),axis=0)
@@ -228,6 +132,57 @@ def pf_dtx(wrld, cell, mobiles, rate):
     logger.info( '{0:50} {1:5.2f} W'.format('DTX Proportional-fair objective:', pSupplyPF_DTX))
     return pSupplyPF_DTX
 
+def pf_allocation(capacities, bitloadPerUser, sleep=False):
+    """PF allocation of all RBs, time slot by time slot. The metric is the RB capacity over the bits a user has already transmitted.
+    With sleep, the allocation stops after the time slot that serves all users.
+    Input:
+        capacities: bits of each RB (users, N, T)
+        bitloadPerUser: target bits per user
+    Output:
+        alloc: user index per RB (N, T). Unallocated RBs carry users, which is not a valid user index.
+        best_rate: bits of the allocated user on each RB (N, T). -1 on unallocated RBs.
+        remainingBitsPerUser: negative for served users"""
+    users, N, T = capacities.shape
+    remainingBitsPerUser = bitloadPerUser * np.ones(users)
+    transmittedBitsPerUser = np.ones(users)
+    
+    alloc  = np.ones([N,T], dtype=int) * users
+    best_rate = -np.ones([N,T])
+    for t in np.arange(T):
+        user_cap = capacities[:,:,t].T # (N, users)
+        metric = user_cap / transmittedBitsPerUser
+
+        alloc[:,t] = np.argmax(metric, axis=1)
+        best_rate[:,t] = user_cap[np.arange(N),alloc[:,t]] # save for later
+        
+        np.subtract.at(remainingBitsPerUser, alloc[:,t], best_rate[:,t]) # note that this can become negative. That is not realistic, but positively affects the metric
+        remainingBitsPerUser[remainingBitsPerUser < 0] = -1e20 # prevent further allocation in metric. Otherwise some users would rate starve.
+
+        if sleep and (remainingBitsPerUser<0).all(): # all are served
+            break
+            
+        transmittedBitsPerUser = np.maximum(bitloadPerUser - remainingBitsPerUser, np.ones(users)) # prevent inf metric
+
+    return alloc, best_rate, remainingBitsPerUser
+
+def pf_prune(alloc, best_rate, users, bitloadPerUser):
+    """Rank each user's RBs by quality and only use the best ones until its bit load is exceeded. Used RBs are marked by NaN in best_rate.
+    Returns the sum of the used rates."""
+    best_rate_flat = best_rate.flatten()
+    alloc_flat = alloc.flatten()
+    used = []
+    for idx in np.arange(users):
+        superset_args = np.flatnonzero(alloc_flat == idx)
+        order = superset_args[np.argsort(best_rate_flat[superset_args])[::-1]] # descending
+        bitsTransmitted = np.cumsum(best_rate_flat[order])
+        exceeded = bitsTransmitted > bitloadPerUser
+        count = np.argmax(exceeded) + 1 if exceeded.any() else order.size
+        if np.isnan(best_rate_flat[order[:count]]).any():
+            raise ValueError('Value already assigned!')
+        used.append(order[:count])
+    used = np.concatenate(used)
+    best_rate.flat[used] = np.nan # mark as used
+    return np.cumsum(np.concatenate([[0], best_rate_flat[used]]))[-1] # in order of use
 
 def RB_bit_capacity(mobile, n, t, bw, time, power):
     """Bit capacity of resource block"""
@@ -22,17 +22,12 @@ from rcg import rcg
 from iwf import iwf
 from utils import utils
 from optim import optimMinPow
-from scipy import linalg
+from utils import mimo2x2
 import logging
 logger = logging.getLogger('RAPS_script')
 
 def raps(wrld, cell, mobiles, rate, plotting=False):
     """In the cell, allocate powers and sleep modes to mobiles."""
-    # need to map algorithm indices to mobile ids (artifact from MATLAB)
-    id_map = dict()
-    for k, mob in enumerate(mobiles):
-        id_map[k] = mob.id_
-    
     # Make sure all mobiles are associated with the cell correctly
     for mob in mobiles:
         if mob.cell != cell:
@@ -40,24 +35,14 @@ def raps(wrld, cell, mobiles, rate, plotting=False):
     logger.info( '{0:50} {1:5d}'.format('Mobiles in this cell:', len(mobiles)))
 
     # Build SINR arrays
-    users = len(mobiles) 
-    N = wrld.PHY.numFreqChunks
-    T = wrld.PHY.numTimeslots
-    noisePower = wrld.wconf.systemNoisePower
-
-    # EC_Optim contains one MIMO value per mobile (the center chunk effective channel)
-    EC_Optim = np.empty([users, cell.antennas, wrld.mobiles[0].antennas], dtype=complex) # TODO Will we ever have mobiles with different numbers of annteas?
-    # SINR_Quant contains one value for each RB and user
-    SINR_Quant = np.empty([N, T, users]) 
-    centerChunkIndex = np.floor(N/2)
-    whichTimeslotIndex = list(cell.sleep_slot_priority).index(0)
-    for idx, mob in enumerate(mobiles):
-        EC_Optim[idx,:,:] = mob.OFDMA_EC[:,:,centerChunkIndex,whichTimeslotIndex] / N # scale this effective channel over all chunks
-        SINR_Quant[:,:,idx] = np.mean(mob.OFDMA_effSINR,0) # SINR for RCG 
+    EC_Optim, SINR_Quant = raps_inputs(wrld, cell, mobiles)
 
     ### Step 1 ###
     # Optimization call
-    pSupplyOptim, resourceAlloc, status = optimMinPow.optimizePCDTX(EC_Optim, np.ones(EC_Optim.shape[0]), rate, wrld.PHY.systemBandwidth, cell.pMax, mobiles[0].BS.p0, mobiles[0].BS.m, mobiles[0].BS.pS)
+    pSupplyOptim, resourceAlloc, status = optimMinPow.optimizePCDTX(EC_Optim, np.ones(EC_Optim.shape[0]), rate, wrld.PHY.systemBandwidth, cell.pMax, mobiles[0].BS.p0, mobiles[0].BS.m, mobiles[0].BS.pS, 
+            solver=getattr(wrld.wconf, 'optim_solver', None), warmStart=cell.warmStart, userIds=[ mob.id_ for mob in mobiles ])
+    if cell.warmStart.iterations is not None:
+        logger.debug( 'Optimizer iterations: {0} ({1} start). Saved by warm starts so far: {2}'.format(cell.warmStart.iterations, 'warm' if cell.warmStart.warm else 'cold', cell.warmStart.saved))
     logger.debug( 'Resource Allocation: ' + str(resourceAlloc))
     logger.debug( 'Sleep priority: ' + str(cell.sleep_slot_priority))
     logger.info( '{0:50} {1:5.2f} W'.format('Real-valued optimization objective:', pSupplyOptim) )
@@ -70,6 +55,100 @@ def raps(wrld, cell, mobiles, rate, plotting=False):
         channelplotter.bar(resourceAlloc,'Resource Share Optim', 'rscshare.pdf')
         import pdb; pdb.set_trace()
     
+    pSupplyQuant = raps_allocation(wrld, cell, mobiles, rate, resourceAlloc, SINR_Quant)
+    return pSupplyOptim, pSupplyQuant
+
+def raps_cells(wrld, cells, rate, plotting=False):
+    """RAPS in all cells. The optimizations are solved in one batch (raps_batch) with the native solver. Other solvers and plotting run raps cell by cell.
+    Returns a list with (pSupplyOptim, pSupplyQuant) per cell. Both are nan if no allocation is found and None if the cell has no mobiles."""
+    cells = list(cells)
+    solver = optimMinPow.solverName(getattr(wrld.wconf, 'optim_solver', None))
+    if solver == 'native' and not plotting:
+        return raps_batch(wrld, cells, rate)
+    results = []
+    for cell in cells:
+        mobiles = [ mob for mob in wrld.mobiles if mob.cell == cell ]
+        logger.info( 'Cell ID: ' + str(cell.cellid) )
+        if not mobiles:
+            cell.OFDMA_power[:] = 0
+            results.append(None)
+            continue
+        try:
+            results.append(raps(wrld, cell, mobiles, rate, plotting=plotting))
+        except ValueError as err:
+            logger.warning( err )
+            results.append((np.nan, np.nan))
+    return results
+
+def raps_batch(wrld, cells, rate):
+    """RAPS in all cells at once. The real-valued optimization of all cells is solved together by the native solver on padded arrays. Then each cell maps its solution to the OFDMA frame.
+    Cells without mobiles do not transmit. Returns a list with (pSupplyOptim, pSupplyQuant) per cell. Both are nan if no allocation is found and None if the cell has no mobiles."""
+    cells = list(cells)
+    cellMobiles = dict((cell, []) for cell in cells)
+    for mob in wrld.mobiles:
+        if mob.cell in cellMobiles:
+            cellMobiles[mob.cell].append(mob)
+    busy = [ cell for cell in cells if cellMobiles[cell] ]
+
+    # padded optimization inputs of all cells
+    inputs = [ raps_inputs(wrld, cell, cellMobiles[cell]) for cell in busy ]
+    users = max([0] + [ len(cellMobiles[cell]) for cell in busy ])
+    EC_Optim = np.zeros([len(busy), users, 2, 2], dtype=complex)
+    valid = np.zeros([len(busy), users], dtype=bool)
+    for k, cell in enumerate(busy):
+        EC_Optim[k, :len(cellMobiles[cell])] = inputs[k][0]
+        valid[k, :len(cellMobiles[cell])] = True
+    BSs = [ cellMobiles[cell][0].BS for cell in busy ]
+    pSupplyOptim, resourceAlloc, status = optimMinPow.optimizePCDTXbatch(EC_Optim, valid, np.ones(valid.shape), rate, wrld.PHY.systemBandwidth, 
+            [ cell.pMax for cell in busy ], [ bs.p0 for bs in BSs ], [ bs.m for bs in BSs ], [ bs.pS for bs in BSs ], 
+            warmStarts=[ cell.warmStart for cell in busy ], userIds=[ [ mob.id_ for mob in cellMobiles[cell] ] for cell in busy ])
+
+    results = dict()
+    for k, cell in enumerate(busy):
+        mobiles = cellMobiles[cell]
+        logger.info( 'Cell ID: ' + str(cell.cellid) )
+        if status[k] != 0:
+            logger.warning( 'No solution in cell ' + str(cell.cellid) + '. Status: ' + str(status[k]) )
+            results[cell] = (np.nan, np.nan)
+            continue
+        logger.info( '{0:50} {1:5.2f} W'.format('Real-valued optimization objective:', pSupplyOptim[k]) )
+        share = np.append(resourceAlloc[k][:-1][valid[k]], resourceAlloc[k][-1])
+        try:
+            results[cell] = (pSupplyOptim[k], raps_allocation(wrld, cell, mobiles, rate, share, inputs[k][1]))
+        except ValueError as err:
+            logger.warning( err )
+            results[cell] = (np.nan, np.nan)
+    for cell in cells:
+        if not cellMobiles[cell]:
+            cell.OFDMA_power[:] = 0
+    return [ results.get(cell) for cell in cells ]
+
+def raps_inputs(wrld, cell, mobiles):
+    """Optimization input of a cell: EC_Optim array([users, cell antennas, mobile antennas]) with the center chunk effective channel per mobile and SINR_Quant array([N, T, users]) for RCG."""
+    users = len(mobiles) 
+    N = wrld.PHY.numFreqChunks
+    T = wrld.PHY.numTimeslots
+
+    # EC_Optim contains one MIMO value per mobile (the center chunk effective channel)
+    EC_Optim = np.empty([users, cell.antennas, wrld.mobiles[0].antennas], dtype=complex) # TODO Will we ever have mobiles with different numbers of annteas?
+    # SINR_Quant contains one value for each RB and user
+    SINR_Quant = np.empty([N, T, users]) 
+    centerChunkIndex = N // 2
+    whichTimeslotIndex = list(cell.sleep_slot_priority).index(0)
+    for idx, mob in enumerate(mobiles):
+        EC_Optim[idx,:,:] = mob.OFDMA_EC[:,:,centerChunkIndex,whichTimeslotIndex] / N # scale this effective channel over all chunks
+        SINR_Quant[:,:,idx] = np.mean(mob.OFDMA_effSINR,0) # SINR for RCG 
+    return EC_Optim, SINR_Quant
+
+def raps_allocation(wrld, cell, mobiles, rate, resourceAlloc, SINR_Quant):
+    """Map the real-valued resource shares of the mobiles to the OFDMA frame of the cell and set its transmission power. Returns the supply power."""
+    # need to map algorithm indices to mobile ids (artifact from MATLAB)
+    id_map = dict()
+    for k, mob in enumerate(mobiles):
+        id_map[k] = mob.id_
+    N = wrld.PHY.numFreqChunks
+    T = wrld.PHY.numTimeslots
+
     ### Step 2 ###
 
     # Map real valued solution to OFDMA frame
@@ -81,24 +160,27 @@ def raps(wrld, cell, mobiles, rate, plotting=False):
     resourcesPerTimeslot = resourcesPerTimeslot[cell.sleep_slot_priority]
 
     # RCG
-    for t in np.arange(T):
-        outmap[:,t],_ = rcg.rcg(SINR_Quant[:,t,:],resourcesPerTimeslot[t,:]) # outmap.shape = (N,T) tells the user index
+    outmap[:] = rcg.rcgBatch(SINR_Quant, resourcesPerTimeslot) # outmap.shape = (N,T) tells the user index
 
-    # Given allocation and rate target, we inverse waterfill channels for each user separately on the basis of full SINR 
+    # Given allocation and rate target, we inverse waterfill channels for each user separately on the basis of full SINR. All users are water-filled in one call.
     # IWF
-    powerlvls = np.empty([N, T, mob.antennas])
+    powerlvls = np.empty([N, T, mobiles[-1].antennas])
     powerlvls[:] = np.nan
     
+    eigVals = []
     for idx, obj in enumerate(mobiles): 
         # grab user SINR
         EC_usr = obj.OFDMA_EC[:,:,outmap==idx] # all effective channels assigned to this user
-        noiseIfPower_usr = np.real(EC_usr[0,0,:].repeat(2) * 0 + 1) # TODO remove later  #(obj.baseStations[obj.BS].cells[obj.cell].OFDMA_interferencePower + obj.baseStations[obj.BS].cells[obj.cell].OFDMA_noisePower) * np.ones(SINR_user_all[0,0,:,:].shape)[outmap==idx].ravel().repeat(2) # one IF value per resource, so repeat once to match spatial channels
         # create list of eigVals
-        eigVals = np.real([linalg.eig(EC_usr[:,:,i])[0] for i in np.arange(EC_usr.shape[2])]).ravel() # two eigvals (spatial channels) per resource
-        targetLoad = rate * wrld.PHY.simulationTime 
-        # inverse waterfill and fill back to OFDMA position
-        powlvl, waterlvl, cap = iwf.inversewaterfill(eigVals, targetLoad, noiseIfPower_usr, wrld.PHY.systemBandwidth / N, wrld.PHY.simulationTime / T)
-        powerlvls[outmap==idx,:] = powlvl.reshape(EC_usr.shape[2],obj.antennas)
+        eigVals.append(mimo2x2.eigvalsh(EC_usr.transpose(2,0,1)).ravel()) # two eigvals (spatial channels) per resource
+    users = np.concatenate([ np.repeat(idx, len(eig)) for idx, eig in enumerate(eigVals) ])
+    eigVals = np.concatenate(eigVals)
+    noiseIfPower = np.ones(eigVals.size) # TODO remove later  #(obj.baseStations[obj.BS].cells[obj.cell].OFDMA_interferencePower + obj.baseStations[obj.BS].cells[obj.cell].OFDMA_noisePower) * np.ones(SINR_user_all[0,0,:,:].shape)[outmap==idx].ravel().repeat(2) # one IF value per resource, so repeat once to match spatial channels
+    targetLoad = rate * wrld.PHY.simulationTime 
+    # inverse waterfill and fill back to OFDMA position
+    powlvl, waterlvl, cap = iwf.inversewaterfillBatch(eigVals, users, targetLoad, noiseIfPower, wrld.PHY.systemBandwidth / N, wrld.PHY.simulationTime / T)
+    for idx, obj in enumerate(mobiles): 
+        powerlvls[outmap==idx,:] = powlvl[users==idx].reshape(-1,obj.antennas)
 
     ptx = np.array([np.nansum(np.nansum(powerlvls[:,t,:],axis=0),axis=0) for t in np.arange(T)])
     logging.debug('Ptx' + str(ptx))
@@ -120,7 +202,7 @@ def raps(wrld, cell, mobiles, rate, plotting=False):
     pSupplyQuant = np.mean(psupplyPerSlot)
     logger.info( '{0:50} {1:5.2f} W'.format('Integer-valued optimization objective:', pSupplyQuant))
 
-    return pSupplyOptim, pSupplyQuant
+    return pSupplyQuant
 
 
 def capacity_achieved_per_mobile(target, wrld, cell, mobiles):
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+''' Unit tests for the bit allocation module
+
+File: test_ba.py
+'''
+
+__author__ = "Hauke Holtkamp"
+__credits__ = "Hauke Holtkamp"
+__license__ = "unknown"
+__version__ = "unknown"
+__maintainer__ = "Hauke Holtkamp"
+__email__ = "h.holtkamp@gmail.com"
+__status__ = "Development"
+
+
+import ba
+from configure import phy, wconfig
+from world import world
+
+import numpy as np
+import random
+import copy
+import unittest
+
+class TestSequenceFunctions(unittest.TestCase):
+
+    def setUp(self):
+        configPath = 'configure/settings1tier1sector.cfg'
+        self.phy = phy.PHY(configPath)
+        self.wconf = wconfig.Wconfig(configPath)
+        self.wconf.hexTiers = 0
+        self.wconf.usersPerCell = 3
+        np.random.seed(5)
+        random.seed(5)
+        self.wrld = world.World(copy.copy(self.wconf), self.phy)
+        self.wrld.associatePathlosses()
+        self.wrld.calculateSINRs()
+
+    def test_RB_bit_capacities(self):
+        # the same bits as RB_bit_capacity. Cached until the SINRs change.
+        cell = self.wrld.cells[0]
+        mobiles = [ mob for mob in self.wrld.mobiles if mob.cell is cell ]
+        power = cell.pMax / self.phy.numFreqChunks
+        capacities = ba.RB_bit_capacities(cell, mobiles, 1e3, 1e-3, power)
+        self.assertEqual(capacities.shape, (len(mobiles), self.phy.numFreqChunks, self.phy.numTimeslots))
+        for idx, mob in enumerate(mobiles):
+            for n, t in [(0, 0), (3, 7), (self.phy.numFreqChunks - 1, self.phy.numTimeslots - 1)]:
+                self.assertEqual(int(capacities[idx, n, t]), ba.RB_bit_capacity(mob, n, t, 1e3, 1e-3, power))
+
+        np.testing.assert_array_equal(ba.RB_bit_capacities(cell, mobiles[::-1], 1e3, 1e-3, power), capacities[::-1])
+
+        # changing the channel alone does not invalidate the cache, a SINR update does
+        mob = mobiles[0]
+        mob.OFDMA_EC[:] = 0
+        np.testing.assert_array_equal(ba.RB_bit_capacities(cell, [mob], 1e3, 1e-3, power)[0], capacities[0])
+        mob.calculateSINR(self.wconf.systemNoisePower)
+        capacities = ba.RB_bit_capacities(cell, [mob], 1e3, 1e-3, power)
+        self.assertEqual(int(capacities[0, 3, 7]), ba.RB_bit_capacity(mob, 3, 7, 1e3, 1e-3, power))
+
+    def test_allocate_in_order(self):
+        # each user is served before the next one starts. The last RB of a user may exceed its load.
+        bits = np.array([[3., 3., 3., 3., 3., 3.], [1., 2., 2., 2., 2., 2.], [5., 5., 5., 5., 5., 5.]])
+        owner, remaining = ba.allocate_in_order(bits, np.array([5., 4., 20.]))
+        np.testing.assert_array_equal(owner, [0, 0, 1, 1, 2, 2])
+        np.testing.assert_array_equal(remaining, [-1., 0., 10.])
+        owner, remaining = ba.allocate_in_order(bits, np.array([1., 1., 1.]))
+        np.testing.assert_array_equal(owner, [0, 1, 2, -1, -1, -1])
+
+if __name__ == '__main__':
+    unittest.main()
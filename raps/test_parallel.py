@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+''' Unit tests for the parallel scheduling module
+
+File: test_parallel.py
+'''
+
+__author__ = "Hauke Holtkamp"
+__credits__ = "Hauke Holtkamp"
+__license__ = "unknown"
+__version__ = "unknown"
+__maintainer__ = "Hauke Holtkamp"
+__email__ = "h.holtkamp@gmail.com"
+__status__ = "Development"
+
+
+import parallel
+import raps
+import pf
+from configure import phy, wconfig
+from world import world
+
+import numpy as np
+import random
+import copy
+import unittest
+
+class TestSequenceFunctions(unittest.TestCase):
+
+    def setUp(self):
+        configPath = 'configure/settings1tier1sector.cfg'
+        self.phy = phy.PHY(configPath)
+        self.wconf = wconfig.Wconfig(configPath)
+        self.wconf.hexTiers = 1
+        self.wconf.usersPerCell = 3
+
+    def schedule(self, scheduler, processes):
+        """Two iterations of scheduling on a fixed world. Returns the results, cell powers and allocations."""
+        np.random.seed(5)
+        random.seed(5)
+        wrld = world.World(copy.copy(self.wconf), self.phy)
+        wrld.associatePathlosses()
+        wrld.calculateSINRs()
+        scheduler = parallel.ParallelScheduler(scheduler, processes=processes, seed=1)
+        out = []
+        for i in np.arange(1,3):
+            results = scheduler.schedule(wrld, 1e6, i)
+            out.append((results, [ cell.OFDMA_power.copy() for cell in wrld.cells ], [ cell.outmap.copy() for cell in wrld.cells ]))
+            wrld.calculateSINRs()
+        scheduler.close()
+        return out
+
+    def test_parallel(self):
+        # the same outcome as the sequential run
+        for scheduler in (parallel.dtx, raps.raps, pf.pf_ba):
+            sequential = self.schedule(scheduler, 1)
+            parallel_ = self.schedule(scheduler, 2)
+            for (res1, power1, outmap1), (res2, power2, outmap2) in zip(sequential, parallel_):
+                np.testing.assert_equal(res1, res2)
+                np.testing.assert_array_equal(power1, power2)
+                np.testing.assert_array_equal(outmap1, outmap2)
+
+    def test_randomState(self):
+        # scheduling does not change the random numbers that the caller draws afterwards
+        wrld = world.World(copy.copy(self.wconf), self.phy)
+        wrld.associatePathlosses()
+        wrld.calculateSINRs()
+        for cell in wrld.cells:
+            cell.sleep_alignment = 'random_once' # draws the sleep slots on first access
+        state = np.random.get_state(), random.getstate()
+        parallel.ParallelScheduler(raps.raps, seed=1).schedule(wrld, 1e6, 1)
+        self.assertEqual(state[0][1].tolist(), np.random.get_state()[1].tolist())
+        self.assertEqual(state[1], random.getstate())
+
+    def test_failure(self):
+        # overloaded cells return the failure value and keep their power
+        np.random.seed(5)
+        random.seed(5)
+        wrld = world.World(copy.copy(self.wconf), self.phy)
+        wrld.associatePathlosses()
+        wrld.calculateSINRs()
+        power = [ cell.OFDMA_power.copy() for cell in wrld.cells ]
+        results = parallel.ParallelScheduler(parallel.dtx, seed=1, failure='failed').schedule(wrld, 1e12, 1)
+        for cell, result in zip(wrld.cells, results):
+            self.assertEqual(result, 'failed' if cell.mobiles else None)
+        for cell, p in zip(wrld.cells, power):
+            if cell.mobiles:
+                np.testing.assert_array_equal(cell.OFDMA_power, p)
+
+if __name__ == '__main__':
+    unittest.main()
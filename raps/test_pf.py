@@ -49,7 +49,19 @@ class TestSequenceFunctions(unittest.TestCase):
         pSupplyPC = pf.pf_ba(world1, world1.cells[0], world1.mobiles, rate)
         pSupplyDTX = pf.pf_dtx(world1, world1.cells[0], world1.mobiles, rate)
 
-        
+        # the outmap holds mobile ids, NaN in sleep slots
+        ids = [ mob.id_ for mob in world1.mobiles ]
+        outmap = world1.cells[0].outmap
+        self.assertTrue(np.in1d(outmap[~np.isnan(outmap)], ids).all())
+
+    def test_pf_prune(self):
+        # each user uses its best RBs until the bit load is exceeded
+        alloc = np.array([[0, 1], [0, 1], [0, 2]])
+        best_rate = np.array([[1., 4.], [3., 2.], [5., -1.]])
+        sum_rate = pf.pf_prune(alloc, best_rate, 2, 5.)
+        np.testing.assert_array_equal(np.isnan(best_rate), [[False, True], [True, True], [True, False]])
+        self.assertEqual(sum_rate, 14.)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+''' Unit tests for the RAPS module
+
+File: test_raps.py
+'''
+
+__author__ = "Hauke Holtkamp"
+__credits__ = "Hauke Holtkamp"
+__license__ = "unknown"
+__version__ = "unknown"
+__maintainer__ = "Hauke Holtkamp"
+__email__ = "h.holtkamp@gmail.com"
+__status__ = "Development"
+
+
+import raps
+from configure import phy, wconfig
+from optim import optimMinPow
+from world import world
+
+import numpy as np
+import random
+import copy
+import warnings
+import sys
+import unittest
+
+class TestSequenceFunctions(unittest.TestCase):
+
+    def setUp(self):
+        configPath = 'configure/settings1tier1sector.cfg'
+        self.phy = phy.PHY(configPath)
+        self.wconf = wconfig.Wconfig(configPath)
+        self.wconf.hexTiers = 1
+        self.wconf.usersPerCell = 3
+
+    def world(self, solver):
+        np.random.seed(5)
+        random.seed(5)
+        wconf = copy.copy(self.wconf)
+        wconf.optim_solver = solver
+        wrld = world.World(wconf, self.phy)
+        wrld.associatePathlosses()
+        wrld.calculateSINRs()
+        return wrld
+
+    def test_rapsCells(self):
+        # the batch gives the results of raps cell by cell
+        wrld = self.world('native')
+        np.random.seed(1)
+        batch = raps.raps_cells(wrld, wrld.cells, 1e6)
+        power = [ cell.OFDMA_power.copy() for cell in wrld.cells ]
+
+        wrld = self.world('native')
+        np.random.seed(1)
+        for cell, result, p in zip(wrld.cells, batch, power):
+            mobiles = [ mob for mob in wrld.mobiles if mob.cell == cell ]
+            if not mobiles:
+                self.assertTrue(result is None)
+                continue
+            np.testing.assert_almost_equal(raps.raps(wrld, cell, mobiles, 1e6), result)
+            np.testing.assert_almost_equal(cell.OFDMA_power, p)
+
+    def test_rapsCellsWarnings(self):
+        # the batch indexes the padded arrays without numpy warnings, which newer numpy versions raise as errors
+        wrld = self.world('native')
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            for module in sys.modules.values(): # warnings shown before would be skipped
+                getattr(module, '__warningregistry__', {}).clear()
+            results = raps.raps_cells(wrld, wrld.cells, 1e6)
+        self.assertTrue(all( result is None or np.isfinite(result).all() for result in results ))
+
+    @unittest.skipIf(optimMinPow.pyipopt is not None, 'pyipopt is installed')
+    def test_rapsCellsSolver(self):
+        # other solvers than the native one are not batched
+        wrld = self.world('ipopt')
+        self.assertRaises(ImportError, raps.raps_cells, wrld, wrld.cells, 1e6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -42,9 +42,6 @@ def rcg(costmp, targetUserAssignment):
     if len(targetUserAssignment) is not users:
         raise ValueError('rcg input mismatch')
 
-    currentSubcarrierAssignment = empty([subcarriers]); currentSubcarrierAssignment[:] = nan
-    currentUserAssignment = zeros([users]); #currentUserAssignment[:] = nan
-
     # an NaN array signifies a sleep mode slot
     if sum(isnan(targetUserAssignment)) == users:
         outMap = empty([subcarriers])
@@ -53,49 +50,60 @@ def rcg(costmp, targetUserAssignment):
         return outMap, initialMap
 
     # initial subcarrier assignment by strength regardless of count
-    for sc in range(subcarriers):
-        maxindex = argmax(costmap[sc,:])
-        currentSubcarrierAssignment[sc] = maxindex # save which user has the best value
-        currentUserAssignment[maxindex] = currentUserAssignment[maxindex] + 1
+    currentSubcarrierAssignment = argmax(costmap, 1).astype(float_) # save which user has the best value
+    currentUserAssignment = bincount(currentSubcarrierAssignment.astype(int_), minlength=users).astype(float_)
         
     initialMap = currentUserAssignment.copy()
-#    print initialMap
-
-    # perform the RCG reassignment. Take from the overloaded and give to the dissatisfied.
-    overloadedUsers = (targetUserAssignment-currentUserAssignment<0) # boolean array
-    satisfiedUsers = (targetUserAssignment-currentUserAssignment<=0) # boolean array
-
-    for olusrindex in arange(users):
-        while overloadedUsers[olusrindex]:
-
-            # find nearest neighbor
-            subcarrierIndicesOfOlusr = (currentSubcarrierAssignment == olusrindex)
-            subcarrierIndicesOfOtherUsers = (currentSubcarrierAssignment != olusrindex)
-            
-            diffmp = abs(diffmap(costmap.copy(), olusrindex)) # generate map of differences
-            
-            diffmp[:,where(satisfiedUsers==True)] = nan # clear out the satisfieds. We do not compare to them.
-            minindx = nanargmin(diffmp[:,where(satisfiedUsers==False)],0) # subcarrier indices of useful values
-            diffmp[subcarrierIndicesOfOtherUsers,:] = nan # clear out rest
-
-            # trade subcarrier with nearest neighbor (nn)
-            nnindex = unravel_index(nanargmin(diffmp), diffmp.shape)
-            tradesc = nnindex[0]
-            tousr   = nnindex[1]
-            
+
+    trade(costmap, targetUserAssignment, currentSubcarrierAssignment, currentUserAssignment)
+
+    outMap = currentSubcarrierAssignment
+    return outMap, initialMap 
+
+def rcgBatch(costmp, targetUserAssignment):
+    """Rate craving greedy subcarrier allocation in all timeslots of a frame.
+    Input: costmap array([subcarriers, timeslots, users]), targetUserAssignment array([timeslots, users]). A NaN row signifies a sleep mode slot.
+    Output: outMap array([subcarriers, timeslots]) of user indices"""
+    subcarriers, timeslots, users = costmp.shape
+    costmap = float32(real(costmp))
+    if targetUserAssignment.shape != (timeslots, users):
+        raise ValueError('rcg input mismatch')
+
+    # initial subcarrier assignment of all timeslots by strength regardless of count
+    outMap = argmax(costmap, 2).astype(float_)
+    for t in arange(timeslots):
+        if isnan(targetUserAssignment[t]).all():
+            outMap[:,t] = nan
+            continue
+        currentUserAssignment = bincount(outMap[:,t].astype(int_), minlength=users).astype(float_)
+        trade(costmap[:,t,:], targetUserAssignment[t], outMap[:,t], currentUserAssignment)
+    return outMap
+
+def trade(costmap, targetUserAssignment, currentSubcarrierAssignment, currentUserAssignment):
+    """Perform the RCG reassignment in place. Take from the overloaded and give to the dissatisfied.
+    An overloaded user only loses subcarriers, so the differences to all other users on its subcarriers are sorted once. Trades are taken from that queue in order of increasing difference, skipping traded subcarriers and satisfied users."""
+    users = costmap.shape[1]
+    for olusrindex in nonzero(targetUserAssignment-currentUserAssignment<0)[0]:
+        subcarrierIndicesOfOlusr = nonzero(currentSubcarrierAssignment == olusrindex)[0]
+        diffmp = abs(diffmap(costmap[subcarrierIndicesOfOlusr], olusrindex)) # generate map of differences
+        queue = argsort(diffmp, axis=None, kind='mergesort') # stable, so ties go to the first subcarrier and user like nanargmin
+        queue = queue[:count_nonzero(~isnan(diffmp))] # NaNs are sorted last
+        tradescs = subcarrierIndicesOfOlusr[queue // users].tolist()
+        tousrs = (queue % users).tolist()
+
+        for tradesc, tousr in zip(tradescs, tousrs):
+            if not currentUserAssignment[olusrindex] > targetUserAssignment[olusrindex]:
+                break
+            if currentSubcarrierAssignment[tradesc] != olusrindex or not currentUserAssignment[tousr] < targetUserAssignment[tousr]:
+                continue # already traded or satisfied
+
             # trade the nearest neighbor
             currentSubcarrierAssignment[tradesc] = tousr
             currentUserAssignment[tousr] = currentUserAssignment[tousr] + 1
             currentUserAssignment[olusrindex] = currentUserAssignment[olusrindex] - 1
-#            print targetUserAssignment
-#            print currentUserAssignment
 
-            # keep track
-            overloadedUsers = (targetUserAssignment-currentUserAssignment<0) # boolean array
-            satisfiedUsers = (targetUserAssignment-currentUserAssignment<=0) # boolean array
-
-    outMap = currentSubcarrierAssignment
-    return outMap, initialMap 
+        if currentUserAssignment[olusrindex] > targetUserAssignment[olusrindex]:
+            raise ValueError('rcg found no user to take the subcarriers')
 
 def diffmap(costmap, userindex):
     """For a reference user, this function returns the differences rather than absolute values."""
@@ -47,6 +47,15 @@ class TestSequenceFunctions(unittest.TestCase):
         outMap, initial = rcg.rcg(subcarriermap, target)
         self.assertTrue((np.bincount(np.int32(outMap)) == target).all())
 
+    def test_rcgBatch(self):
+        # all timeslots at once give the same result as one call per timeslot. The NaN timeslot sleeps.
+        costmap = np.dstack([self.costmap1, self.costmap2, self.costmap1]).transpose(0,2,1)
+        target = np.array([self.target1, self.target2, np.repeat(np.nan, 4)])
+        outMap = rcg.rcgBatch(costmap, target)
+        np.testing.assert_array_equal(outMap[:,0], self.result1)
+        np.testing.assert_array_equal(outMap[:,1], self.result2.ravel())
+        self.assertTrue(np.isnan(outMap[:,2]).all())
+
 
 
 
@@ -17,7 +17,7 @@ import time
 start = time.time()
 
 # imports
-from world import world
+from world import worldcache
 import numpy as np
 from scipy import linalg
 import scipy.stats.stats as scistats
@@ -90,7 +90,7 @@ def oneIteration(rate, CSI_Optim, SINR_Quant):
     # Optimization call
     import pdb; pdb.set_trace()
     
-    pSupplyOptim, resourceAlloc, status = optimMinPow.optimizePCDTX(CSI_Optim, PnoiseIf_Optim, rate, wrld.PHY.systemBandwidth, cell.pMax, bs.p0, bs.m, bs.pS)
+    pSupplyOptim, resourceAlloc, status = optimMinPow.optimizePCDTX(CSI_Optim, PnoiseIf_Optim, rate, wrld.PHY.systemBandwidth, cell.pMax, bs.p0, bs.m, bs.pS, warmStart=cell.warmStart) # consecutive rates start from the last solution
     print '{0:50} {1:5.2f} W'.format('Real-valued optimization objective:', pSupplyOptim)
     
     ## Plot ##
@@ -167,9 +167,11 @@ for itr in np.arange(iterations):
 
     # We only generate one world per iteration. All rates are optimized within this world. Since world creation takes the majority of computing time, this makes simulations much faster.
     wconf = wconfig.Wconfig(configPath) # this should be a member of World()
-    wrld  = world.World(wconf, phy.PHY(configPath))
-    wrld.associatePathlosses()
-    wrld.calculateSINRs()
+    if wconf.world_cache: # the operating parameters are those of the config that stored the world
+        wrld = worldcache.cachedWorld(wconf, phy.PHY(configPath), wconf.world_seed + itr, fixCenterUsers=False)
+        wrld.update_operating_parameters(wconf)
+    else:
+        wrld = worldcache.generateWorld(wconf, phy.PHY(configPath), fixCenterUsers=False)
     bs = wrld.baseStations[0] 
     cell = bs.cells[0] # Sectors are important because they are the end of the link (not always base stations)
 
@@ -21,10 +21,10 @@ import os
 import sys
 sys.path.append(os.getcwd())
 
-from world import world, loadprecomputedworld
+from world import world, loadprecomputedworld, worldcache
 import numpy as np
 from configure import phy, wconfig
-from raps import pf
+from raps import pf, parallel
 from utils import utils
 import shutil
 import logging
@@ -72,11 +72,15 @@ def main():
             logger.info('Loading world from file: ' + wconf.load_world)
             wrld = loadprecomputedworld.load(wconf.load_world)
             wrld.update_operating_parameters(wconf)
+        elif wconf.world_cache:
+            wrld = worldcache.cachedWorld(wconf, phy_, wconf.world_seed + r - 1)
+            wrld.update_operating_parameters(wconf)
         else:
             wrld  = world.World(wconf, phy_)
             wrld.associatePathlosses()
             wrld.calculateSINRs()
             wrld.fix_center_cell_users() # set 0 to disable
+        scheduler = parallel.ParallelScheduler(pf.pf_ba, processes=wconf.scheduling_processes)
 
         ### Show world ###
         if plotting:
@@ -101,22 +105,11 @@ def main():
 
 
             ### Each cell performs PF independently ###
-            for cell in wrld.cells:
-                logger.info( 'Cell ID: ' + str(cell.cellid) )
-                mobiles = [mob for mob in wrld.mobiles if mob.cell == cell]
-
-                try:
-                    pSupplyPF = pf.pf_ba(wrld, cell, mobiles, rate)
-                except ValueError as err:
-                    logger.warning( err )
-                    pSupplyPF = np.nan 
-                    # no solution could be found
-                except IndexError:
+            pfResults = scheduler.schedule(wrld, rate, i) # changes the wrld object. Failed cells give nan
+            for cell, pSupplyPF in zip(wrld.cells, pfResults):
+                if pSupplyPF is None:
                     logger.info( 'By chance there is no mobile in the cell.' )
-                    cell.OFDMA_power[:] = 0
-                except:
-                    logger.error(sys.exc_info())
-                    raise
+                    pSupplyPF = np.nan
                 if cell in wrld.consideredCells:
                     if plotting:
                         plotPowerProfile(cell, r, i, pSupplyPF)
@@ -140,6 +133,7 @@ def main():
 
     #        plotPowerProfiles(wrld, i)
     #        import pdb; pdb.set_trace()
+        scheduler.close()
 
     ### Finish up ###
     sumrate_data = np.mean(resultPF[1:,-1]) # average power consumption at the last iteration
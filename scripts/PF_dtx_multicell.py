@@ -16,7 +16,7 @@ __status__ = "Development"
 import time
 start = time.time()
 
-from world import world, loadprecomputedworld
+from world import world, loadprecomputedworld, worldcache
 import numpy as np
 from configure import phy, wconfig
 from raps import pf
@@ -69,6 +69,9 @@ def main():
             logger.info('Loading world from file: ' + wconf.load_world)
             wrld = loadprecomputedworld.load(wconf.load_world)
             wrld.update_operating_parameters(wconf)
+        elif wconf.world_cache:
+            wrld = worldcache.cachedWorld(wconf, phy_, wconf.world_seed + r - 1)
+            wrld.update_operating_parameters(wconf)
         else:
             wrld  = world.World(wconf, phy_)
             wrld.associatePathlosses()
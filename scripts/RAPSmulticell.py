@@ -21,10 +21,10 @@ import os
 import sys
 sys.path.append(os.getcwd())
 
-from world import world, loadprecomputedworld
+from world import world, loadprecomputedworld, worldcache
 import numpy as np
 from configure import phy, wconfig
-from raps import raps, ba
+from raps import raps, ba, parallel
 from utils import utils
 import shutil # copies files
 import uuid # unique logging folders
@@ -84,11 +84,16 @@ def main():
             logger.info('Loading world from file: ' + wconf.load_world)
             wrld = loadprecomputedworld.load(wconf.load_world)
             wrld.update_operating_parameters(wconf)
+        elif wconf.world_cache:
+            wrld = worldcache.cachedWorld(wconf, phy_, wconf.world_seed + r - 1)
+            wrld.update_operating_parameters(wconf)
         else:
             wrld = world.World(wconf, phy_)
             wrld.associatePathlosses()
             wrld.calculateSINRs()
             wrld.fix_center_cell_users() # set 0 in settings file to disable
+        if wconf.scheduling_processes != 1:
+            scheduler = parallel.ParallelScheduler(raps.raps, processes=wconf.scheduling_processes, failure=(np.nan, np.nan))
 
         ### Show world ###
         if plotting:
@@ -112,26 +117,31 @@ def main():
             logger.info( '*'*80 )
 
 
-            ### Each cell performs RAPS independently ###
-            for cell in wrld.cells:
+            ### Each cell performs RAPS independently. Either in parallel processes or in this one, where the native solver handles all cells in one batch ###
+            if wconf.scheduling_processes != 1:
+                rapsResults = scheduler.schedule(wrld, rate, i) # changes the wrld object
+            else:
+                rapsResults = raps.raps_cells(wrld, wrld.cells, rate, plotting=plotting) # changes the wrld object
+            for cell, rapsResult in zip(wrld.cells, rapsResults):
                 logger.info( 'Cell ID: ' + str(cell.cellid) )
                 mobiles = [mob for mob in wrld.mobiles if mob.cell == cell]
 
-                try:
-                    resultOpt, resultQu = raps.raps(wrld, cell, mobiles, rate, plotting=plotting) # changes the wrld object
-                    resBA = ba.ba(rate, wrld, cell, mobiles, len(mobiles)) # BA ignores the actual cell transmission powers 
-                except ValueError as err:
-                    logger.warning( err )
+                if rapsResult is None:
+                    logger.info( 'By chance there is no mobile in the cell.' )
                     resultOpt = np.nan 
                     resultQu  = np.nan 
                     resBA  = np.nan 
-                    # no solution could be found
-                except IndexError:
-                    logger.info( 'By chance there is no mobile in the cell.' )
-                    cell.OFDMA_power[:] = 0
-                except:
-                    logger.error(sys.exc_info())
-                    raise
+                elif np.isnan(rapsResult[0]):
+                    resultOpt, resultQu = rapsResult # no solution could be found
+                    resBA  = np.nan 
+                else:
+                    resultOpt, resultQu = rapsResult
+                    try:
+                        resBA = ba.ba(rate, wrld, cell, mobiles, len(mobiles)) # BA ignores the actual cell transmission powers 
+                    except ValueError as err:
+                        logger.warning( err )
+                        resBA  = np.nan 
+                        # no solution could be found
                 if cell in wrld.consideredCells:
                     if plotting:
                         plotPowerProfile(cell, r, i, resultQu)
@@ -174,6 +184,9 @@ def main():
     #        plotPowerProfiles(wrld, i)
     #        import pdb; pdb.set_trace()
         
+        if wconf.scheduling_processes != 1:
+            scheduler.close()
+
     ### Finish up ###
     sumrate_data = np.mean(resultRAPS[1:,-1]) # average power consumption at the last iteration
     writeFile(outpath+'sumrateRAPS.csv', sumrate_data)
@@ -24,7 +24,7 @@ from plotting import networkplotter
 
 # custom
 from world import *
-from world import world
+from world import worldcache
 from configure import phy, wconfig
 
 ############### Read config file #####################
@@ -33,9 +33,12 @@ configPath = 'configure/settingsBeFemtoCalibration.cfg'
 
 SINRlist = []
 for itr in range(1,iterations+1):
-    wrld = world.World(wconfig.Wconfig(configPath), phy.PHY(configPath)) 
-    wrld.associatePathlosses()
-    wrld.calculateSINRs()
+    wconf = wconfig.Wconfig(configPath)
+    if wconf.world_cache: # the operating parameters are those of the config that stored the world
+        wrld = worldcache.cachedWorld(wconf, phy.PHY(configPath), wconf.world_seed + itr, fixCenterUsers=False)
+        wrld.update_operating_parameters(wconf)
+    else:
+        wrld = worldcache.generateWorld(wconf, phy.PHY(configPath), fixCenterUsers=False)
 
     ### Wideband SINR ###
     SINRlist += [mob.SINR for mob in wrld.consideredMobiles]
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-''' Precompute one world according to config file and store in uuid file.
+''' Precompute one world according to config file and store in uuid file. The world is stored as a snapshot (see world/snapshot.py).
 
 File: precomputeworld.py
 '''
@@ -14,16 +14,15 @@ __email__ = "h.holtkamp@gmail.com"
 __status__ = "Development" 
 
 import sys, getopt, os
-from world import world
+from world import world, snapshot
 from configure import wconfig, phy 
-import cPickle 
 import uuid
 import shutil
 import logging
 logger = logging.getLogger('RAPS_script') # takes care of printing to std out
 
 
-def main(configfile, outfolder=os.path.join('out','worlds')):
+def main(configfile, outfolder=os.path.join('out','worlds'), compress=False):
 
     try:
         with open(configfile) as f: pass
@@ -31,17 +30,14 @@ def main(configfile, outfolder=os.path.join('out','worlds')):
         print '<configfile> does not exist.' 
         sys.exit()
 
-    outpath = os.path.join(outfolder, str(uuid.uuid4())+'.pkl')
+    outpath = os.path.join(outfolder, str(uuid.uuid4())+'.npz')
     if not os.path.exists(outfolder):
         os.makedirs(outfolder)
-    output = open(outpath, 'wb') 
 
     shutil.copyfile(configfile, os.path.splitext(outpath)[0]+'.cfg') # save configuration
 
     wrld = generateWorld(configfile)
-    cPickle.dump(wrld, output)
-        
-    output.close()
+    snapshot.save(wrld, outpath, compress=compress)
 
     print "=" * 44
 
@@ -23,9 +23,9 @@ import uuid # unique logging folders
 import logging
 import sys
 sys.path.append(os.getcwd()) # for condor
-from world import world, loadprecomputedworld
+from world import world, loadprecomputedworld, worldcache
 from configure import phy, wconfig
-from raps import raps, ba
+from raps import raps, ba, parallel
 from utils import utils
 
 ### Global ###
@@ -85,11 +85,15 @@ def main(settings_count): #settings_count comes from condor
             logger.info('Loading world from file: ' + wconf.load_world)
             wrld = loadprecomputedworld.load(wconf.load_world)
             wrld.update_operating_parameters(wconf)
+        elif wconf.world_cache:
+            wrld = worldcache.cachedWorld(wconf, phy_, wconf.world_seed + r - 1)
+            wrld.update_operating_parameters(wconf)
         else:
             wrld  = world.World(wconf, phy_)
             wrld.associatePathlosses()
             wrld.calculateSINRs()
             wrld.fix_center_cell_users() # set 0 in settings file to disable
+        scheduler = parallel.ParallelScheduler(parallel.dtx, processes=wconf.scheduling_processes)
 
         ### Show world ###
         if plotting:
@@ -115,22 +119,11 @@ def main(settings_count): #settings_count comes from condor
 
 
             ### Each cell performs DTX independently ###
-            for cell in wrld.cells:
-                logger.info( 'Cell ID: ' + str(cell.cellid) )
-                mobiles = [mob for mob in wrld.mobiles if mob.cell == cell]
-
-                try:
-                    resDTX = ba.dtx(rate, wrld, cell, mobiles, len(mobiles)) 
-                except ValueError as err:
-                    logger.warning( err )
-                    resDTX  = np.nan 
-                    # no solution could be found
-                except IndexError:
+            dtxResults = scheduler.schedule(wrld, rate, i) # changes the wrld object. Failed cells give nan
+            for cell, resDTX in zip(wrld.cells, dtxResults):
+                if resDTX is None:
                     logger.info( 'By chance there is no mobile in the cell.' )
-                    cell.OFDMA_power[:] = 0
-                except:
-                    logger.error(sys.exc_info())
-                    raise
+                    resDTX = np.nan
                 if cell in wrld.consideredCells:
                     if plotting:
                         plotPowerProfile(cell, r, i, resDTX)
@@ -168,6 +161,8 @@ def main(settings_count): #settings_count comes from condor
     #        plotPowerProfiles(wrld, i)
     #        import pdb; pdb.set_trace()
         
+        scheduler.close()
+
     ### Finish up ###
     sumrate_data = np.mean(resultDTX[1:,-1]) # average power consumption at the last iteration
     writeFile(outpath+'sumrateDTX.csv', sumrate_data)
@@ -15,6 +15,7 @@ __status__ = "Development"
 
 import unittest
 
-# discover() requires Python 2.7 with numpy
-suite = unittest.TestLoader().discover('.') # search from here
-unittest.TextTestRunner(verbosity=2).run(suite)
+if __name__ == '__main__': # discover() imports this file as well
+    # discover() requires Python 2.7 with numpy
+    suite = unittest.TestLoader().discover('.') # search from here
+    unittest.TextTestRunner(verbosity=2).run(suite)
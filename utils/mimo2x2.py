@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+''' Closed-form linear algebra for 2x2 MIMO. All functions work on stacks of matrices. The matrices are in the last two axes, as in numpy.linalg, i.e. array([..., 2, 2]).
+These replace general LAPACK calls on the many tiny matrices of the simulator.
+
+File: mimo2x2.py
+'''
+
+__author__ = "Hauke Holtkamp"
+__credits__ = "Hauke Holtkamp"
+__license__ = "unknown"
+__version__ = "unknown"
+__maintainer__ = "Hauke Holtkamp"
+__email__ = "h.holtkamp@gmail.com"
+__status__ = "Development"
+
+import numpy as np
+
+def _check(A):
+    A = np.asarray(A)
+    if A.shape[-2:] != (2,2):
+        raise ValueError('Expected 2x2 matrices in the last two axes, got shape ' + str(A.shape))
+    return A
+
+def det(A):
+    """Determinant of each 2x2 matrix. Returns array([...])"""
+    A = _check(A)
+    return A[...,0,0]*A[...,1,1] - A[...,0,1]*A[...,1,0]
+
+def trace(A):
+    """Trace of each 2x2 matrix. Returns array([...])"""
+    A = _check(A)
+    return A[...,0,0] + A[...,1,1]
+
+def inv(A):
+    """Inverse of each 2x2 matrix by the adjugate. Returns array([..., 2, 2])"""
+    A = _check(A)
+    d = det(A)
+    result = np.empty(A.shape, dtype=np.result_type(A, d, float))
+    result[...,0,0] = A[...,1,1]
+    result[...,0,1] = -A[...,0,1]
+    result[...,1,0] = -A[...,1,0]
+    result[...,1,1] = A[...,0,0]
+    result /= d[...,None,None]
+    return result
+
+def eigvalsh(A):
+    """Real eigenvalues of each Hermitian 2x2 matrix in descending order. Returns array([..., 2])
+    The larger eigenvalue is (a+d)/2 + sqrt(((a-d)/2)^2 + |b|^2). The smaller one is taken from the determinant to avoid cancellation."""
+    A = _check(A)
+    a = np.real(A[...,0,0])
+    d = np.real(A[...,1,1])
+    half = (a + d)/2
+    disc = np.sqrt(((a - d)/2)**2 + np.abs(A[...,0,1])**2)
+    result = np.empty(A.shape[:-1], dtype=float)
+    result[...,0] = half + disc
+    with np.errstate(divide='ignore', invalid='ignore'):
+        small = np.real(det(A)) / result[...,0]
+    result[...,1] = np.where(result[...,0] > 0, small, half - disc)
+    return result
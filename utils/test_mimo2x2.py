@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+''' Unit test for the mimo2x2 module 
+
+File: test_mimo2x2.py
+'''
+
+__author__ = "Hauke Holtkamp"
+__credits__ = "Hauke Holtkamp"
+__license__ = "unknown"
+__version__ = "unknown"
+__maintainer__ = "Hauke Holtkamp"
+__email__ = "h.holtkamp@gmail.com" 
+__status__ = "Development" 
+
+import unittest
+import numpy as np
+import mimo2x2
+
+class TestSequenceFunctions(unittest.TestCase):
+
+    def setUp(self):
+        H = np.random.randn(5, 3, 2, 2) + 1j*np.random.randn(5, 3, 2, 2)
+        self.A = np.einsum('...ij,...kj->...ik', H, H.conj()) # Hermitian, stacked
+        self.A += 0.1*np.eye(2)
+
+    def test_det(self):
+        np.testing.assert_allclose(mimo2x2.det(self.A), np.linalg.det(self.A))
+
+    def test_trace(self):
+        np.testing.assert_allclose(mimo2x2.trace(self.A), np.trace(self.A, axis1=-2, axis2=-1))
+
+    def test_inv(self):
+        np.testing.assert_allclose(mimo2x2.inv(self.A), np.linalg.inv(self.A))
+
+    def test_eigvalsh(self):
+        np.testing.assert_allclose(mimo2x2.eigvalsh(self.A), np.linalg.eigvalsh(self.A)[...,::-1])
+        # rank one channel
+        np.testing.assert_allclose(mimo2x2.eigvalsh(np.ones([2,2])), [2., 0.])
+        np.testing.assert_allclose(mimo2x2.eigvalsh(np.zeros([2,2])), [0., 0.])
+
+    def test_shape(self):
+        self.assertRaises(ValueError, mimo2x2.det, np.ones([3,3]))
+       
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,7 @@ __status__ = "Development"
 
 import numpy as np
 import scipy.linalg
+import mimo2x2
  
 #Converts dBm Watt
 def dBmTomW(dBmVal):
@@ -58,9 +59,20 @@ def ergMIMOCapacityCDITCSIR(SINR, SNRrx):
     # receive antennas
     N = SINR.shape[1]
 
-    capacity = np.log2( np.linalg.det( np.identity(N) + SNRrx/M * SINR  ) )
+    if (M, N) == (2, 2):
+        capacity = np.log2( mimo2x2.det( np.identity(N) + SNRrx/M * SINR  ) )
+    else:
+        capacity = np.log2( np.linalg.det( np.identity(N) + SNRrx/M * SINR  ) )
     return capacity
 
+def ergMIMOCapacityCDITCSIRStack(SINR, SNRrx):
+    """ergMIMOCapacityCDITCSIR of each matrix in a stack array([..., M, N])"""
+    M, N = SINR.shape[-2:]
+    if (M, N) == (2, 2):
+        return np.log2( mimo2x2.det( np.identity(N) + SNRrx/M * SINR  ) )
+    else:
+        return np.log2( np.linalg.det( np.identity(N) + SNRrx/M * SINR  ) )
+
 def shift(arr, n):
     """ Shift a vector with wrap around. Useful for aranges in for loops."""
     return np.concatenate((arr[n:], arr[:n]))
@@ -15,6 +15,7 @@ __status__ = "Development"
 
 from utils import utils
 from raps import ba
+from optim import optimMinPow
 import numpy as np
 import logging
 import random
@@ -40,6 +41,8 @@ class Cell(object):
         self._sleep_slot_priority = None
         self.mobiles = set() 
         self.neighbors = set()
+        self.warmStart = optimMinPow.WarmStart() # last resource allocation. Starting point of the next one.
+        self.capacityCache = dict() # RB bit capacities by mobile id. See ba.RB_bit_capacities
 
         self.dtxs = Dtx_segregator(self.phy.numTimeslots) # TODO: Only create this when it's needed
 
@@ -137,10 +140,11 @@ class Cell(object):
 
     def get_timeslots_by_sinr(self,randomize=True):
         """Rank timeslots by the mean SINR to decide which ones to favor. Mean over space, frequency and mobiles."""
-        sinr = np.empty([len(self.mobiles), self.phy.numTimeslots])
-        for idx, mob in enumerate(self.mobiles):
-            sinr[idx,:] = np.mean(np.mean(mob.OFDMA_effSINR, 0),0)
-        sinr = np.mean(sinr, 0)
+        if self.mobiles:
+            effSINR = np.array([ mob.OFDMA_effSINR for mob in self.mobiles ]) # (mobiles, streams, N, T)
+            sinr = np.mean(np.mean(np.mean(effSINR, 1), 1), 0)
+        else:
+            sinr = np.nan * np.ones(self.phy.numTimeslots)
         logger.info('effSINR: ' + str(sinr))
         ranking = sinr.argsort()[::-1] # descending order
 
@@ -164,11 +168,9 @@ class Cell(object):
         resourceBandwidth = systemBandwidth / N
 
         cap = np.zeros([T])
-        for t in np.arange(T):
-            for idx, mob in enumerate(self.mobiles):
-                for n in np.arange(N):
-                    cap[t] += ba.RB_bit_capacity(mob, n, t, resourceBandwidth, 
-                                    resourceTime, pPerResource)
+        if self.mobiles:
+            capacities = ba.RB_bit_capacities(self, list(self.mobiles), resourceBandwidth, resourceTime, pPerResource)
+            cap[:] = np.sum(np.sum(np.int_(capacities), 0), 0) # bits are counted per RB
         logger.info('capacity: ' + str(cap))
 
         ranking = cap.argsort()[::-1] # descending order
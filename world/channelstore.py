@@ -0,0 +1,420 @@
+#!/usr/bin/env python
+
+''' Central channel store. Holds the channel data between all mobiles and all cells of a world as contiguous arrays (structure of arrays).
+Mobiles and cells are addressed by integer index. The nested dictionary interface mob.baseStations[bs]['cells'][cell][key] is kept as a thin view on top of the arrays.
+
+File: channelstore.py
+'''
+
+__author__ = "Hauke Holtkamp"
+__credits__ = "Hauke Holtkamp"
+__license__ = "unknown"
+__version__ = "unknown"
+__maintainer__ = "Hauke Holtkamp"
+__email__ = "h.holtkamp@gmail.com"
+__status__ = "Development"
+
+import numpy as np
+import collections
+from utils import utils
+from fsf import fsf
+
+# link data arrays with one row per mobile, apart from the fading
+linkArrays = ('distance', 'LNS', 'angle', 'pathgain', 'averagePRx', 'SINR', 'velocity', 'CSI_OFDMA', 'significant', 'backgroundGain', 'pruned')
+
+class ChannelStore(object):
+    """Channel data of all mobile-cell links. Rows are mobiles (mob.index), columns are base stations or cells in world order.
+    Arrays:
+        distance: array([mobiles, BS])
+        LNS: array([mobiles, BS])
+        angle: array([mobiles, cells]) in degrees
+        pathgain: array([mobiles, cells]) linear
+        averagePRx: array([mobiles, cells]) received power at pMax
+        SINR: array([mobiles, cells]) unused by the simulator, kept for the dict interface
+        all_FSF: array([mobiles, cells, mobile antennas, cell antennas, N, timeslots]) fading over all iterations. Generated on access with lazy fading.
+        fadingState: array([mobiles, cells, mobile antennas, cell antennas, 2, taps, harmonics]) random state of the fading of each link. Only with lazy fading.
+        velocity: array([mobiles]) relative velocity of each mobile
+        CSI_OFDMA: array([mobiles, cells, mobile antennas, cell antennas, N, T]) CSI of the current iteration
+        significant: bool array([mobiles, cells]) significant interferers. All cells unless pruned by pruneInterferers()
+        backgroundGain: array([mobiles, cells]) average channel gain of pruned interferers. Zero for all other cells.
+        pruned: bool array([mobiles]) whether pruneInterferers() has handled the mobile
+    With lazy fading, only the random state of the frequency selective fading is kept and the window of an iteration is generated when it is needed. 
+    Memory then does not grow with the number of iterations and the CSI is identical to the precomputed fading.
+    """
+
+    def __init__(self, baseStations, PHY, fadingTimeslots=None, mobileAntennas=2, dtype=complex, lazyFading=False):
+        self.PHY = PHY
+        self.baseStations = list(baseStations)
+        self.cells = [ cell for bs in self.baseStations for cell in bs.cells ]
+        self.bsIndex = dict((bs, indexbs) for indexbs, bs in enumerate(self.baseStations))
+        self.cellIndex = dict((cell, indexcell) for indexcell, cell in enumerate(self.cells))
+        self.cellBS = np.array([ self.bsIndex[bs] for bs in self.baseStations for cell in bs.cells ], dtype=int)
+        self.pMax = np.array([ cell.pMax for cell in self.cells ], dtype=float)
+        self.mobileAntennas = mobileAntennas
+        self.cellAntennas = self.cells[0].antennas if self.cells else 2
+        if fadingTimeslots is None:
+            fadingTimeslots = PHY.numTimeslots * PHY.iterations
+        self.fadingTimeslots = fadingTimeslots
+        self.dtype = dtype
+        self.lazyFading = lazyFading
+        self.mobiles = []
+        self.epoch = 0 # counts changes of the CSI. Cached results derived from the CSI are valid for one epoch.
+
+        B = len(self.baseStations)
+        C = len(self.cells)
+        self.distance = np.empty([0, B])
+        self.LNS = np.empty([0, B])
+        self.angle = np.empty([0, C])
+        self.pathgain = np.empty([0, C])
+        self.averagePRx = np.empty([0, C])
+        self.SINR = np.empty([0, C])
+        if lazyFading:
+            self.fadingState = np.empty([0, C, mobileAntennas, self.cellAntennas, 2, fsf.delay_taps.size, fsf.N_harmonics])
+        else:
+            self._all_FSF = np.empty([0, C, mobileAntennas, self.cellAntennas, PHY.numFreqChunks, fadingTimeslots], dtype=dtype)
+        self.velocity = np.empty([0])
+        self.CSI_OFDMA = np.empty([0, C, mobileAntennas, self.cellAntennas, PHY.numFreqChunks, PHY.numTimeslots], dtype=dtype)
+        self.significant = np.empty([0, C], dtype=bool)
+        self.backgroundGain = np.empty([0, C])
+        self.pruned = np.empty([0], dtype=bool)
+        self._buffers = dict((name, getattr(self, name)) for name in self._rowArrays()) # the arrays above are views of the first rows of these
+
+    def __repr__(self):
+        return ' '.join(['ChannelStore with', str(len(self.mobiles)), 'mobiles and', str(len(self.cells)), 'cells.'])
+
+    def __getstate__(self):
+        """Pickle the rows in use without the spare capacity."""
+        state = self.__dict__.copy()
+        del state['_buffers']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._buffers = dict((name, getattr(self, name)) for name in self._rowArrays())
+
+    def _rowArrays(self):
+        """Attribute names of the arrays with one row per mobile."""
+        return list(linkArrays) + ['fadingState' if self.lazyFading else '_all_FSF']
+
+    def _resize(self, rows):
+        """Let the row arrays hold rows mobiles. The buffers grow by half of their size when they are full, so adding mobiles one at a time copies each row only a few times on average."""
+        used = len(self.mobiles)
+        for name in self._rowArrays():
+            buf = self._buffers[name]
+            if rows > len(buf):
+                new = np.empty((max(rows, len(buf) + len(buf) // 2),) + buf.shape[1:], dtype=buf.dtype)
+                new[:used] = buf[:used]
+                self._buffers[name] = buf = new
+            setattr(self, name, buf[:rows])
+
+    def addMobiles(self, mobiles):
+        """Append rows for the mobiles and attach them to the store. Existing rows keep their index. Returns the new row indices."""
+        first = len(self.mobiles)
+        count = len(mobiles)
+        if count:
+            self._resize(first + count)
+            fill = dict(significant=True, backgroundGain=0, pruned=False)
+            for name in self._rowArrays():
+                getattr(self, name)[first:] = fill.get(name, np.nan)
+            self.velocity[first:] = [ mob.velocity for mob in mobiles ]
+
+        for offset, mob in enumerate(mobiles):
+            mob.attachChannels(self, first + offset)
+            self.mobiles.append(mob)
+        self.invalidate()
+        return np.arange(first, first + count)
+
+    def arrays(self):
+        """The link data arrays by name, e.g. for storing a world. The fading is 'fadingState' with lazy fading and 'all_FSF' otherwise."""
+        arrays = dict((name, getattr(self, name)) for name in linkArrays)
+        if self.lazyFading:
+            arrays['fadingState'] = self.fadingState
+        else:
+            arrays['all_FSF'] = self._all_FSF
+        return arrays
+
+    def setArrays(self, arrays):
+        """Replace the link data of all attached mobiles by arrays as returned by arrays(). The store keeps the given arrays without copying them. Starts a new CSI epoch."""
+        for name, arr in self.arrays().items():
+            if name not in arrays or arrays[name].shape != arr.shape or arrays[name].dtype != arr.dtype:
+                raise ValueError('Link data ' + name + ' does not match the channel store.')
+        for name, arr in arrays.items():
+            name = '_all_FSF' if name == 'all_FSF' else name
+            setattr(self, name, arr)
+            self._buffers[name] = arr
+        self.invalidate()
+
+    def setPathgains(self, rows, pathgain):
+        """Store pathgain array([len(rows), cells]) and the resulting average received power. The interferer pruning of the rows is reset."""
+        self.pathgain[rows] = pathgain
+        self.averagePRx[rows] = self.pMax * pathgain
+        self.resetPruning(rows)
+
+    def resetPruning(self, rows):
+        """Forget the interferer pruning of the rows. All cells are significant until pruneInterferers() handles the rows again."""
+        self.significant[rows] = True
+        self.backgroundGain[rows] = 0
+        self.pruned[rows] = False
+
+    @property
+    def all_FSF(self):
+        """Fading of all links over all iterations. With lazy fading, this is generated for the whole store on each access."""
+        if self.lazyFading:
+            return np.array([ self.fading(row) for row in range(len(self.mobiles)) ]).reshape(self.CSI_OFDMA.shape[:-1] + (self.fadingTimeslots,))
+        return self._all_FSF
+
+    def fading(self, row, cells=slice(None), start=0, stop=None):
+        """Fading of one mobile's links to the cells on the timeslots start:stop. Returns array([cells, mobile antennas, cell antennas, N, stop-start]). A single cell index drops the cells axis."""
+        if not self.lazyFading:
+            return self._all_FSF[row, cells, :, :, :, start:stop]
+        if np.isscalar(cells):
+            return self.fading(row, [cells], start, stop)[0]
+        state = self.fadingState[row, cells]
+        H, _, _ = fsf.fsfWindow(state.reshape((-1,) + state.shape[3:]), self.PHY.numFreqChunks, self.fadingTimeslots, self.PHY.centerFrequency, self.PHY.simulationTime, self.PHY.systemBandwidth, self.velocity[row], start, stop)
+        return H.reshape(state.shape[:3] + H.shape[1:])
+
+    def setFading(self, row, cells, state):
+        """Set the fading of one mobile's links to the cells from the random state array([cells, mobile antennas, cell antennas, 2, taps, harmonics]) as drawn by fsf.fadingState(). 
+        A state of None is the same channel on all resources. The CSI is set to the first iteration."""
+        if state is None:
+            if self.lazyFading:
+                raise ValueError('Lazy fading requires frequency selective fading.')
+            self._all_FSF[row, cells] = np.eye(self.mobileAntennas, self.cellAntennas)[:,:,None,None]
+        elif self.lazyFading:
+            self.fadingState[row, cells] = state
+        else:
+            H, _, _ = fsf.fsfWindow(state.reshape((-1,) + state.shape[3:]), self.PHY.numFreqChunks, self.fadingTimeslots, self.PHY.centerFrequency, self.PHY.simulationTime, self.PHY.systemBandwidth, self.velocity[row])
+            self._all_FSF[row, cells] = H.reshape(state.shape[:3] + H.shape[1:])
+        T = self.PHY.numTimeslots
+        self.CSI_OFDMA[row, cells] = np.sqrt(self.pathgain[row, cells])[..., None, None, None, None] * self.fading(row, cells, 0, T)
+        self.invalidate()
+
+    def updateFSF(self, iteration, rows=slice(None)):
+        """Select the fading window of an iteration and scale it by the pathgain amplitude. This is done for all links of the given rows at once.
+        With lazy fading, the window is generated one mobile at a time. A new CSI epoch only starts if the CSI changed. 
+        Without Doppler (zero velocity) or without frequency selective fading, all windows are the same and the interference can be updated incrementally."""
+        T = self.PHY.numTimeslots
+        if T*iteration >= self.fadingTimeslots:
+            raise ValueError('updateFSF() on empty iteration.')
+        changed = False
+        if self.lazyFading:
+            for row in np.atleast_1d(np.arange(len(self.mobiles))[rows]):
+                CSI = np.sqrt(self.pathgain[row])[:, None, None, None, None] * self.fading(row, slice(None), T*iteration, T*(iteration+1))
+                if changed or not np.array_equal(CSI, self.CSI_OFDMA[row]):
+                    self.CSI_OFDMA[row] = CSI
+                    changed = True
+        else:
+            window = self._all_FSF[rows, :, :, :, :, T*iteration:T*(iteration+1)]
+            CSI = np.sqrt(self.pathgain[rows])[..., None, None, None, None] * window
+            changed = not np.array_equal(CSI, self.CSI_OFDMA[rows])
+            self.CSI_OFDMA[rows] = CSI
+        if changed:
+            self.invalidate()
+
+    def invalidate(self):
+        """Start a new CSI epoch. The store's own writers and the setters of the views do this. Call it after writing to CSI_OFDMA in place, e.g. through an array returned by a view."""
+        self.epoch += 1
+
+    def cellPower(self):
+        """Transmission power of all cells. Returns array([cells, cell antennas, N, T])"""
+        return np.array([ cell.OFDMA_power for cell in self.cells ])
+
+    def pruneInterferers(self, rows, serving, noisePower, margin):
+        """Keep only interferers whose average received power is within margin (dB) of noise plus the strongest interferer. The remaining cells are later added as background power with their average channel gain.
+        Returns the a priori approximation error per mobile: the share of interference plus noise power that is handled as background."""
+        rows = np.asarray(rows, dtype=int)
+        serving = np.asarray(serving, dtype=int)
+        M = len(rows)
+        interferers = self.averagePRx[rows].copy()
+        interferers[np.arange(M), serving] = 0
+        noisePower = np.asarray(noisePower, dtype=float)
+        threshold = (noisePower + interferers.max(axis=1)) * utils.dBToW(-margin)
+        significant = interferers >= threshold[:,None]
+        significant[np.arange(M), serving] = True # the serving cell is never background
+        background = ~significant
+
+        fading = np.zeros([M, len(self.cells)]) # average fading power of the pruned links
+        selected = np.nonzero(background)
+        fading[selected] = self.meanFadingPower(rows[selected[0]], selected[1])
+        self.significant[rows] = significant
+        self.backgroundGain[rows] = np.where(background, self.pathgain[rows] * fading, 0)
+        self.pruned[rows] = True
+        return np.sum(interferers * background, axis=1) / (noisePower + np.sum(interferers, axis=1))
+
+    def meanFadingPower(self, rows, cells, chunk=2**16):
+        """Mean power of the fading of the links (rows[i], cells[i]) over all antennas, resources and timeslots. Returns array([len(rows)]).
+        The links are handled in batches of about chunk fading values. With lazy fading, the power of each batch is computed by fsf.fsfPower() without generating the windows."""
+        rows = np.asarray(rows, dtype=int)
+        cells = np.asarray(cells, dtype=int)
+        antennas = self.mobileAntennas * self.cellAntennas
+        batch = max(1, chunk // (antennas * self.PHY.numFreqChunks * self.fadingTimeslots))
+        power = np.empty(len(rows))
+        for start in range(0, len(rows), batch):
+            r = rows[start:start+batch]
+            c = cells[start:start+batch]
+            if self.lazyFading:
+                state = self.fadingState[r, c]
+                velocity = np.repeat(self.velocity[r], antennas)[:, None, None] # one Doppler frequency per link
+                antennaPower = fsf.fsfPower(state.reshape((-1,) + state.shape[3:]), self.PHY.numFreqChunks, self.fadingTimeslots, self.PHY.centerFrequency, self.PHY.simulationTime, self.PHY.systemBandwidth, velocity)
+                power[start:start+batch] = np.mean(antennaPower.reshape(len(r), antennas), axis=1)
+            else:
+                power[start:start+batch] = np.mean(np.abs(self._all_FSF[r, c].reshape(len(r), -1))**2, axis=1)
+        return power
+
+    def interfererWeight(self, rows, serving):
+        """Weight array([len(rows), cells]) for the interference covariance. Ones for significant interferers, zero for the serving cell and pruned cells."""
+        weight = self.significant[rows].astype(float)
+        weight[np.arange(len(weight)), serving] = 0 # no self-interference
+        return weight
+
+    def backgroundInterference(self, rows, power):
+        """Interference power array([len(rows), N, T]) of pruned cells per receive antenna. power is array([cells, cell antennas, N, T])."""
+        totalPower = np.sum(power, axis=1) # [cells, N, T]
+        return np.dot(self.backgroundGain[rows], totalPower.reshape(len(totalPower), -1)).reshape((-1,) + totalPower.shape[1:])
+
+    def view(self, row):
+        """Dictionary compatible view of one mobile's channels."""
+        return MobileChannelView(self, row)
+
+
+class MobileChannelView(collections.MutableMapping):
+    """mob.baseStations compatible view. Maps base stations to BaseStationChannelView."""
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, bs):
+        return BaseStationChannelView(self._store, self._row, self._store.bsIndex[bs])
+
+    def __setitem__(self, bs, value):
+        raise TypeError('Base stations are fixed by the channel store.')
+
+    def __delitem__(self, bs):
+        raise TypeError('Base stations are fixed by the channel store.')
+
+    def __iter__(self):
+        return iter(self._store.baseStations)
+
+    def __len__(self):
+        return len(self._store.baseStations)
+
+    def __contains__(self, bs):
+        return bs in self._store.bsIndex
+
+    def has_key(self, bs):
+        return bs in self
+
+
+class BaseStationChannelView(collections.MutableMapping):
+    """View of the 'cells', 'distance' and 'LNS' entries of one mobile-BS pair."""
+    _keys = ('cells', 'distance', 'LNS')
+
+    def __init__(self, store, row, indexbs):
+        self._store = store
+        self._row = row
+        self._indexbs = indexbs
+
+    def __getitem__(self, key):
+        if key == 'cells':
+            return CellsChannelView(self._store, self._row, self._indexbs)
+        if key in ('distance', 'LNS'):
+            return getattr(self._store, key)[self._row, self._indexbs]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in ('distance', 'LNS'):
+            raise KeyError(key)
+        getattr(self._store, key)[self._row, self._indexbs] = value
+
+    def __delitem__(self, key):
+        raise TypeError('Channel store entries cannot be deleted.')
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def has_key(self, key):
+        return key in self
+
+
+class CellsChannelView(collections.MutableMapping):
+    """View of the cells of one BS as seen by one mobile. Maps cells to LinkChannelView."""
+
+    def __init__(self, store, row, indexbs):
+        self._store = store
+        self._row = row
+        self._indexbs = indexbs
+
+    def _cells(self):
+        return self._store.baseStations[self._indexbs].cells
+
+    def __getitem__(self, cell):
+        if cell not in self._cells():
+            raise KeyError(cell)
+        return LinkChannelView(self._store, self._row, self._store.cellIndex[cell])
+
+    def __setitem__(self, cell, value):
+        raise TypeError('Cells are fixed by the channel store.')
+
+    def __delitem__(self, cell):
+        raise TypeError('Cells are fixed by the channel store.')
+
+    def __iter__(self):
+        return iter(self._cells())
+
+    def __len__(self):
+        return len(self._cells())
+
+    def __contains__(self, cell):
+        return cell in self._cells()
+
+    def has_key(self, cell):
+        return cell in self
+
+
+class LinkChannelView(collections.MutableMapping):
+    """View of one mobile-cell link. Array entries are returned as views into the store, so in-place changes are shared. 
+    Setting 'CSI_OFDMA' starts a new CSI epoch. In-place changes of the returned array must be followed by store.invalidate().
+    With lazy fading, 'all_FSF' is generated on access and is read-only."""
+    _keys = ('averagePRx', 'pathgain', 'all_FSF', 'SINR', 'CSI_OFDMA')
+
+    def __init__(self, store, row, indexcell):
+        self._store = store
+        self._row = row
+        self._indexcell = indexcell
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        if key == 'all_FSF':
+            return self._store.fading(self._row, self._indexcell)
+        return getattr(self._store, key)[self._row, self._indexcell]
+
+    def __setitem__(self, key, value):
+        if key not in self._keys:
+            raise KeyError(key)
+        if key == 'all_FSF':
+            if self._store.lazyFading:
+                raise TypeError('all_FSF is generated from the fading state with lazy fading.')
+            self._store._all_FSF[self._row, self._indexcell] = value
+            return
+        getattr(self._store, key)[self._row, self._indexcell] = value
+        if key == 'pathgain':
+            self._store.resetPruning(self._row)
+        elif key == 'CSI_OFDMA':
+            self._store.invalidate()
+
+    def __delitem__(self, key):
+        raise TypeError('Channel store entries cannot be deleted.')
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def has_key(self, key):
+        return key in self
@@ -53,9 +53,8 @@ def hexmap(tiers, interSiteDistance):
                 pointListMap.append(array([indexX, indexY]))
     
     # Only keep points that are close enough 
-    for point in pointListMap:
-        if (pointInHex(point, EWHexagon(origin, inclusionDistance))):
-            pointList.append(point)
+    inside = points_in_hex(array(pointListMap), [EWHexagon(origin, inclusionDistance)])[:,0]
+    pointList = [ point for point, keep in zip(pointListMap, inside) if keep ]
 
     return pointList
 
@@ -85,7 +84,76 @@ def pointInHex(point, hexagon):
         p1x,p1y = p2x,p2y
 
     return inside
-    
+
+def points_in_hex(points, hexagons):
+    """Vectorized pointInHex(). Tells for each point in array([M,2]) whether it lies inside each of the hexagons. 
+    Uses the same ray casting rule as pointInHex() on all edges at once. Returns: boolean array([M, len(hexagons)])"""
+    points = array(points, dtype=float).reshape(-1,2)
+    x = points[:,0][:,None]
+    y = points[:,1][:,None]
+    poly = array([ hexa.vertices() for hexa in hexagons ], dtype=float).reshape(-1,6,2) # [H, 6, 2]
+
+    inside = zeros([points.shape[0], poly.shape[0]], dtype=bool)
+    for i in range(poly.shape[1]):
+        p1x, p1y = poly[:,i-1,0], poly[:,i-1,1]
+        p2x, p2y = poly[:,i,0], poly[:,i,1]
+        crossing = (y > minimum(p1y,p2y)) & (y <= maximum(p1y,p2y)) & (x <= maximum(p1x,p2x))
+        with errstate(divide='ignore', invalid='ignore'):
+            xinters = (y-p1y)*(p2x-p1x)/(p2y-p1y)+p1x # unused where p1y == p2y, since no crossing is possible there
+        inside ^= crossing & ((p1x == p2x) | (x <= xinters))
+
+    return inside
+
+class HexLattice(object):
+    """Constant time lookup of the hexagon that contains a point. 
+    All hexagons must be NS hexagons of equal size on one grid, as placed by hexmap(). 
+    Points are converted to axial hex grid coordinates, rounded to the nearest hexagon and looked up in a table."""
+
+    def __init__(self, hexagons):
+        if not hexagons:
+            raise ValueError('HexLattice requires at least one hexagon')
+        if [ hexa for hexa in hexagons if not isinstance(hexa, NSHexagon) or abs(hexa.outerRadius - hexagons[0].outerRadius) > 1e-6 ]:
+            raise ValueError('HexLattice requires NS hexagons of equal size')
+        self.outerRadius = hexagons[0].outerRadius
+        self.origin = array(hexagons[0].center, dtype=float)
+
+        centers = array([ hexa.center for hexa in hexagons ], dtype=float)
+        q, r = self.axial(centers)
+        if (sqrt(sum((self.center(q, r) - centers)**2, axis=1)) > 1e-3 * self.outerRadius).any():
+            raise ValueError('Hexagons are not placed on one hexagonal grid')
+        self._qmin = q.min()
+        self._rmin = r.min()
+        self._table = -ones([q.max()-self._qmin+1, r.max()-self._rmin+1], dtype=int)
+        self._table[q-self._qmin, r-self._rmin] = arange(len(hexagons))
+
+    def axial(self, points):
+        """Axial coordinates (q, r) of the hexagons containing the points in array([M,2]). Integer arrays."""
+        points = (array(points, dtype=float).reshape(-1,2) - self.origin) / self.outerRadius
+        q = (math.sqrt(3)/3 * points[:,0] - points[:,1]/3.)
+        r = 2./3 * points[:,1]
+        # cube rounding
+        s = -q - r
+        rq, rr, rs = around(q), around(r), around(s)
+        dq, dr, ds = abs(rq - q), abs(rr - r), abs(rs - s)
+        fixq = (dq > dr) & (dq > ds)
+        fixr = ~fixq & (dr > ds)
+        rq[fixq] = -rr[fixq] - rs[fixq]
+        rr[fixr] = -rq[fixr] - rs[fixr]
+        return rq.astype(int), rr.astype(int)
+
+    def center(self, q, r):
+        """Center coordinates of the hexagons with axial coordinates (q, r). Returns array([M,2])"""
+        return self.origin + self.outerRadius * column_stack(( math.sqrt(3) * (q + r/2.), 1.5 * r ))
+
+    def locate(self, points):
+        """Index of the hexagon containing each point in array([M,2]). -1 where no hexagon contains the point."""
+        q, r = self.axial(points)
+        q = q - self._qmin
+        r = r - self._rmin
+        found = (q >= 0) & (q < self._table.shape[0]) & (r >= 0) & (r < self._table.shape[1])
+        index = -ones(q.shape, dtype=int)
+        index[found] = self._table[q[found], r[found]]
+        return index
 
 def distance(pointA, pointB):
     "Wrapper for linalg.norm"
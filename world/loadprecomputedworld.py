@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-''' Load precomputed world from pickle file 
+''' Load precomputed world from a snapshot or a legacy pickle file 
 
 File: loadprecomputedworld.py
 '''
@@ -15,17 +15,20 @@ __status__ = "Development"
 
 import sys, os
 import cPickle
-import pprint
+import zipfile
 import world
+import snapshot
+
+def load(filename, mmap=True):
+    """Load a world from a snapshot file (see snapshot.py) or from a pickle file. A pickle file may hold several objects. The last one is returned.
+    With mmap, the channel and pathloss arrays of a snapshot are shared read-only memory maps of the file (see snapshot.load)."""
+    if zipfile.is_zipfile(filename): # npz archive
+        return snapshot.load(filename, mmap=mmap)
 
-def load(filename):
-    """Load a world from a pickle file"""
-    
     pkl_file = open(filename, 'rb')
     while True:
         try:
             data1 = cPickle.load(pkl_file)
-            pprint.pprint(data1)
         except EOFError:
             break
 
@@ -34,4 +37,4 @@ def load(filename):
 
 
 if __name__ == '__main__':
-    load(sys.argv[1])
+    print load(sys.argv[1])
@@ -16,12 +16,12 @@ __status__ = "Development"
 
 
 import numpy as np
-from scipy import linalg
 from physicalentity import PhysicalEntity
 from collections import namedtuple
 import basestation
 from utils import utils
 from fsf import fsf
+import sinr
 
 class Mobile(PhysicalEntity):
     "Mobile equipment class. A mobile has a position and some information about its interaction with base stations."
@@ -41,10 +41,13 @@ class Mobile(PhysicalEntity):
         self.noisePower = None # system noise power over entire bandwidth
         self.interferencePower = None 
         self.noiseIfPower = None # the perceived noise power over the system bandwidth when all undesired BS send at PMax
+        self._channels = None # channel store of the world. Holds all link data once attached.
+        self.index = None # row of this mobile in the channel store
         # self.OFDMA_assignedCSI = None # numpy array of CSI from assigned BS on each resource
         self.OFDMA_interferenceCovar = np.empty([self.antennas, 2, self.PHY.numFreqChunks, self.PHY.numTimeslots], dtype=complex)
         self.OFDMA_EC = np.empty([antennas, 2, self.PHY.numFreqChunks, self.PHY.numTimeslots], dtype=complex) # effective channel including noise and interference. H*Cn*Hh on each RB TODO: remove magic number cell antennas
         self.OFDMA_effSINR = np.empty([max(antennas, 2), self.PHY.numFreqChunks, self.PHY.numTimeslots]) # unit power SINR on each spatial stream/channel. real-valued positive
+        self.sinrVersion = 0 # counts updates of the OFDMA SINR. Results derived from it can be cached per version.
 
         self.id_ = Mobile.id_ 
         Mobile.id_ += 1
@@ -63,7 +66,33 @@ class Mobile(PhysicalEntity):
     @property
     def OFDMA_CSI(self):
         """Return the CSI on each RB of the associated BS (np array)"""
-        return self.baseStations[self.BS]['cells'][self.cell]['CSI_OFDMA']
+        return self.cellCSI(self.cell)
+
+    def cellCSI(self, cell):
+        """Return the CSI on each RB from any cell (np array)"""
+        if self._channels is not None:
+            return self._channels.CSI_OFDMA[self.index, self._channels.cellIndex[cell]]
+        return self.baseStations[cell_bs(self, cell)]['cells'][cell]['CSI_OFDMA']
+
+    @property
+    def channels(self):
+        """The channel store holding this mobile's link data. None if the mobile is not attached."""
+        return self._channels
+
+    def attachChannels(self, store, index):
+        """Keep all link data in row index of the channel store from now on."""
+        self._channels = store
+        self.index = index
+
+    @property
+    def distances(self):
+        """Distances to all base stations in world order. View into the channel store."""
+        return self._channels.distance[self.index]
+
+    @property
+    def pathgains(self):
+        """Pathgains to all cells in world order. View into the channel store."""
+        return self._channels.pathgain[self.index]
 
     @property
     def OFDMA_SINR(self):
@@ -100,7 +129,9 @@ class Mobile(PhysicalEntity):
 
     @property
     def baseStations(self):
-        """The base stations that the mobile is associated with."""
+        """The base stations that the mobile is associated with. Once the mobile is attached to a channel store, this is a dict compatible view of it."""
+        if self._channels is not None:
+            return self._channels.view(self.index)
         return self._baseStations
    
     @baseStations.setter
@@ -126,26 +157,47 @@ class Mobile(PhysicalEntity):
         # once we know pathgain and bs, we can also get the received power
         self.baseStations[baseStation]['cells'][cell]['averagePRx'] = cell.pMax * pathgain
         
+        if self._channels is not None:
+            self._channels.setFading(self.index, [self._channels.cellIndex[cell]], self.fadingState(1, cell.antennas, enablefsf))
+            return
+        CSI = self.fading(1, cell.antennas, enablefsf)[0]
+        self.baseStations[baseStation]['cells'][cell]['all_FSF'] = CSI
+        self.baseStations[baseStation]['cells'][cell]['CSI_OFDMA'] = np.sqrt(pathgain) * CSI[:,:,:,:self.PHY.numTimeslots]
+
+    def setPathlosses(self, pathgains, enablefsf=False):
+        """Store the pathgains to all cells of the channel store in world order and draw the fading of all links in one batch. The mobile must be attached to a channel store."""
+        store = self._channels
+        store.setPathgains(self.index, pathgains)
+        store.setFading(self.index, slice(None), self.fadingState(len(store.cells), store.cellAntennas, enablefsf))
+
+    def fadingState(self, cells, cellAntennas, enablefsf=False):
+        """Random state of the fading of the links to a number of cells. Returns array([cells, antennas, cell antennas, 2, taps, harmonics]) or None without frequency selective fading.
+        The links are drawn in the same order as by fading()."""
+        if not enablefsf:
+            return None
+        state = fsf.fadingState(cells*self.antennas*cellAntennas)
+        return state.reshape((cells, self.antennas, cellAntennas) + state.shape[1:])
+
+    def fading(self, cells, cellAntennas, enablefsf=False):
+        """Fading of the links to a number of cells. Returns array([cells, antennas, cell antennas, N, timeslots])."""
         if enablefsf:
             # Add uncorrelated frequency selective CSI for all antennas combinations. In this power domain we use the square root of the pathgain together with the fsf
-            CSI = np.empty([self.antennas, cell.antennas, self.PHY.numFreqChunks, self.PHY.numTimeslots*self.PHY.iterations],dtype=complex)
-            CSI[:] = np.nan # 32000 bytes
-            for n_tx in range(self.antennas):
-                for n_rx in range(cell.antennas):
-                    CSI[n_tx,n_rx,:,:], _, _ = fsf.fsf(self.PHY.numFreqChunks, self.PHY.numTimeslots*self.PHY.iterations, self.PHY.centerFrequency, self.PHY.simulationTime, self.PHY.systemBandwidth, self.velocity) # 32000 bytes
-                    
+            # The links are drawn in the order cell, n_tx, n_rx. 
+            CSI, _, _ = fsf.fsfBatch(cells*self.antennas*cellAntennas, self.PHY.numFreqChunks, self.PHY.numTimeslots*self.PHY.iterations, self.PHY.centerFrequency, self.PHY.simulationTime, self.PHY.systemBandwidth, self.velocity) 
+            return CSI.reshape(cells, self.antennas, cellAntennas, self.PHY.numFreqChunks, self.PHY.numTimeslots*self.PHY.iterations)
         else: # Same channel on all resources. No self-interference. 
             '''Long note: Calling this _no_fsf_ is not accurate. Firstly, it avoids the call to fsf. But also, it creates an unrealistic MIMO channel. Working with such a channel and its capacity is very unrealistic. It should only be used for debugging.  '''
-            CSI = np.tile(np.eye(self.antennas, cell.antennas, dtype=complex)[:,:,None,None],[self.PHY.numFreqChunks, self.PHY.numTimeslots]) # 32000 bytes, 16 bytes per entry
-            
-        self.baseStations[baseStation]['cells'][cell]['all_FSF'] = CSI
-        self.baseStations[baseStation]['cells'][cell]['CSI_OFDMA'] = np.sqrt(pathgain) * CSI[:,:,:,:self.PHY.numTimeslots]
+            CSI = np.tile(np.eye(self.antennas, cellAntennas, dtype=complex)[:,:,None,None],[self.PHY.numFreqChunks, self.PHY.numTimeslots]) # 32000 bytes, 16 bytes per entry
+            return np.tile(CSI, [cells, 1, 1, 1, 1])
 
     def updateFSF(self, iteration):
         """The CSI model calculates the frequency selective fading component for the entire simulation over all iterations. 
         It is stored in the CSI_OFDMA array for each iteration. This function updates the CSI_OFDMA to the new value.
         This function assists backward compatibility.
         """
+        if self._channels is not None:
+            self._channels.updateFSF(iteration, self.index)
+            return
         for indexbs, bs in enumerate(self.baseStations):
             for cell in bs.cells:
                 pathgain = self.baseStations[bs]['cells'][cell]['pathgain']
@@ -156,10 +208,45 @@ class Mobile(PhysicalEntity):
 
     def calculateSINR(self, systemNoisePower):
         """ The mobile calculates and stores SINR and effective channel information based on the information it holds on each cell. """
-        ## Coarse SINR for association
+        self.calculateCoarseSINR(systemNoisePower)
+
+        ## OFDMA interference 
+        # Each BS is transmitting at a certain power on each RB and MIMO channel
+        # Collect power from interfering BS as interference for each RB
+        # Here comes the beast. It is handled for all RBs at once by the batched kernel.
+        if self._channels is not None:
+            store = self._channels
+            CSI = store.CSI_OFDMA
+            row = self.index
+            serving = store.cellIndex[self.cell]
+            power = store.cellPower()
+            # significant interferers individually, pruned ones as background power
+            interference = sinr.interferenceCovariance(CSI, [row], store.interfererWeight([row], [serving]), power)
+            background = store.backgroundInterference([row], power)
+        else:
+            links = [ (bs, cell) for bs in self.baseStations for cell in bs.cells ]
+            CSI = np.array([[ self.baseStations[bs]['cells'][cell]['CSI_OFDMA'] for bs, cell in links ]])
+            row = 0
+            serving = [ cell for bs, cell in links ].index(self.cell)
+            power = np.array([ cell.OFDMA_power for bs, cell in links ])
+            interference = None
+            background = None
+        covariance, EC, effSINR = sinr.ofdmaSINR(CSI, [row], [serving], power, [self.noisePower], interference, background)
+        self.setOFDMASINR(covariance[0], EC[0], effSINR[0])
+
+    def calculateCoarseSINR(self, systemNoisePower):
+        """ Coarse SINR for association. Selects the serving BS and cell. """
         # find the best link, that's the signal. all links - best link is interference.  
-        (signal, self.BS, self.cell) = max((self.baseStations[bs]['cells'][cell]['averagePRx'], bs, cell) for bs in self.baseStations for cell in bs.cells) # I do not know why this works, but it does
-        interference = sum ( self.baseStations[bs]['cells'][cell]['averagePRx'] for bs in self.baseStations for cell in bs.cells) - signal 
+        if self._channels is not None:
+            averagePRx = self._channels.averagePRx[self.index]
+            best = np.argmax(averagePRx)
+            signal = averagePRx[best]
+            self.cell = self._channels.cells[best]
+            self.BS = self._channels.baseStations[self._channels.cellBS[best]]
+            interference = np.sum(averagePRx) - signal
+        else:
+            (signal, self.BS, self.cell) = max((self.baseStations[bs]['cells'][cell]['averagePRx'], bs, cell) for bs in self.baseStations for cell in bs.cells) # I do not know why this works, but it does
+            interference = sum ( self.baseStations[bs]['cells'][cell]['averagePRx'] for bs in self.baseStations for cell in bs.cells) - signal 
         noise = systemNoisePower 
         SINR = signal / ( interference + noise)
         self.SINR = SINR
@@ -167,22 +254,12 @@ class Mobile(PhysicalEntity):
         self.noisePower = noise
         self.noiseIfPower = interference + noise
 
-        ## OFDMA interference 
-        # Each BS is transmitting at a certain power on each RB and MIMO channel
-        # Collect power from interfering BS as interference for each RB
-        # Here comes the beast
-        for ts in np.arange(self.PHY.numTimeslots):
-            for fc in np.arange(self.PHY.numFreqChunks):
-                # Build noise and interference covariance matrix Cn = N + sum(H P Hh)
-                interf = self.interference(fc, ts)
-                noisep = np.eye(self.antennas) * (self.noisePower / self.PHY.numFreqChunks) # real
-                self.OFDMA_interferenceCovar[:,:,fc,ts] = noisep + interf
-                # SINR is (H Covar_inv Hh)
-                self.OFDMA_EC[:,:,fc,ts] = np.dot(np.dot(self.OFDMA_CSI[:,:,fc,ts],linalg.inv(noisep+interf)),self.OFDMA_CSI[:,:,fc,ts].conj().T)
-                eigs = linalg.eig(self.OFDMA_EC[:,:,fc,ts])[0]
-                if np.imag(eigs.any()) > 1e10: # before omitting imag, make sure it is small
-                    raise ValueError('Error: Eigenvalues of Hermitian matrix should be real!')
-                self.OFDMA_effSINR[:,fc,ts] = np.real(eigs)
+    def setOFDMASINR(self, covariance, EC, effSINR):
+        """Store the noise and interference covariance Cn, the effective channel H Cn^-1 H^H and the unit power SINR on each RB."""
+        self.OFDMA_interferenceCovar[:] = covariance
+        self.OFDMA_EC[:] = EC
+        self.OFDMA_effSINR[:] = effSINR
+        self.sinrVersion += 1
 
     def interference(self, n, t):
         """Calculate the interference the mobile sees on one RB with index (n,t).
@@ -193,6 +270,13 @@ class Mobile(PhysicalEntity):
         #                        np.dot(self.baseStations[bs].cells[cell].CSI_OFDMA[:,:,fc,ts], np.diag(cell.OFDMA_power[:,fc,ts])),
         #                        self.baseStations[bs].cells[cell].CSI_OFDMA[:,:,fc,ts].conj().T) 
         #                        for bs in self.baseStations for cell in bs.cells if cell != self.cell), out=interf) # real on the diagonal. complex with opposing signs on the other entries.
+        if self._channels is not None:
+            store = self._channels
+            weight = store.interfererWeight([self.index], [store.cellIndex[self.cell]])[0] # no self-interference, no pruned cells
+            power = np.array([ cell.OFDMA_power[:,n,t] for cell in store.cells ]) # [cells, antennas]
+            H = store.CSI_OFDMA[self.index,:,:,:,n,t]
+            background = np.dot(store.backgroundGain[self.index], np.sum(power, axis=1)) # pruned cells
+            return np.einsum('cij,c,cj,clj->il', H, weight, power, H.conj()) + background * np.eye(self.antennas)
 
         interference = np.zeros_like(self.OFDMA_interferenceCovar[:,:,n,t], dtype=complex)
         result1 = np.empty_like(self.OFDMA_interferenceCovar[:,:,n,t], dtype=complex)
@@ -240,6 +324,13 @@ class Mobile(PhysicalEntity):
         self.baseStations[baseStation]['cells'][cell] = {'averagePRx':None, 'pathgain':None, 'all_FSF':None, 'SINR':None, 'CSI_OFDMA':None}
         Mobile.celltuple_id += 1
 
+def cell_bs(mob, cell):
+    """The base station of a cell as known to the mobile"""
+    for bs in mob.baseStations:
+        if cell in bs.cells:
+            return bs
+    raise KeyError(cell)
+
 if __name__ == '__main__':
     LNS = 3 
     distance = 100
@@ -37,6 +37,33 @@ def pathloss(mobile, baseStation, cell):
     #print "%.2f" % pathloss, '=', "%.2f" % distancepathloss, '+', "%.2f" % LNS, '-', "%.2f" % antennaG
     return utils.dBToW(-pathloss)
 
+def pathlossMaps(mobilePositions, bsPositions, cellBS, cellCenters, LNSMap):
+    """ Vectorized pathloss() for all mobile-cell pairs in one pass. 
+    Input: mobile positions array([M,2]), base station positions array([B,2]), index of each cell's base station array([C]), cell centers array([C,2]) and LNS values array([M,B]).
+    Returns: distance array([M,B]), antenna angle array([M,C]) in degrees, and pathgain array([M,C]) in linear format. """
+    distance = distanceMap(mobilePositions, bsPositions)
+    angle = angleMapUEBSHex(bsPositions[cellBS], cellCenters, mobilePositions)
+    distancepathloss = 128.1 + 37.6*log10(distance[:,cellBS]/1e3) # distance in meters
+    pathloss = distancepathloss + LNSMap[:,cellBS] - antennaGain(angle)
+    return distance, angle, utils.dBToW(-pathloss)
+
+def distanceMap(pointsA, pointsB):
+    """ Distances between all points in array([A,2]) and all points in array([B,2]). Returns array([A,B])"""
+    pointsA = array(pointsA, dtype=float).reshape(-1,2)
+    pointsB = array(pointsB, dtype=float).reshape(-1,2)
+    return sqrt(sum((pointsA[:,None,:] - pointsB[None,:,:])**2, axis=2))
+
+def angleMapUEBSHex(BSPositions, hexCenters, mobilePositions):
+    """ Vectorized getAngleUEBSHex(). BSPositions and hexCenters are array([C,2]), one row per cell. Returns the angles for all mobiles and cells as array([M,C]) in degrees. """
+    P12 = sqrt(sum((array(BSPositions, dtype=float) - array(hexCenters, dtype=float))**2, axis=1)) # [C]
+    P13 = distanceMap(mobilePositions, BSPositions) # [M,C]
+    P23 = distanceMap(mobilePositions, hexCenters) # [M,C]
+    with errstate(divide='ignore', invalid='ignore'):
+        cosine = (power(P12,2) + power(P13,2) - power(P23,2))/(2 * P12 * P13)
+    angle = arccos(clip(cosine, -1, 1))*180/pi # clip rounding errors
+    angle[:, P12 < 1e-5] = 0 # BS is in the hex center. This is omnidirectional case. 
+    return angle
+
 def getAngleUEBSHex(BSPosition, hexCenter, mobilePosition):
     """ Returns the angle of the vectors between BS and mobile as well as BS and hex"""
     #print BSPosition, hexCenter, mobilePosition
@@ -58,7 +85,7 @@ def antennaGain(UEBoresightAngle):
     angleSpread3dB = 70. # degrees
     antennaFront2BackRatio = 25. # dB
     boresightMaxGain = 14. # dBi #TODO: Is this true for omnidirectional?
-    azimuthloss = - min(12. * power((UEBoresightAngle / angleSpread3dB), 2) , antennaFront2BackRatio )
+    azimuthloss = - minimum(12. * power((UEBoresightAngle / angleSpread3dB), 2) , antennaFront2BackRatio ) # works on arrays of angles
     gain = boresightMaxGain + azimuthloss
     return gain
 
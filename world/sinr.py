@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+''' Batched OFDMA SINR kernel. Computes interference covariances, effective channels and spatial SINRs on all resource blocks of many mobiles at once.
+
+File: sinr.py
+'''
+
+__author__ = "Hauke Holtkamp"
+__credits__ = "Hauke Holtkamp"
+__license__ = "unknown"
+__version__ = "unknown"
+__maintainer__ = "Hauke Holtkamp"
+__email__ = "h.holtkamp@gmail.com"
+__status__ = "Development"
+
+import numpy as np
+from utils import mimo2x2
+
+def interferenceCovariance(CSI, rows, weight, power, cells=None):
+    """Interference covariance sum_c(w_c Hc Pc Hc^H) on each RB.
+    Input:
+        CSI: array([mobiles, cells, rx, tx, N, T])
+        rows: index of the considered mobiles into CSI
+        weight: array([len(rows), cells]). Zero for the serving cell.
+        power: array([cells, tx, N, T])
+        cells: optional subset of cell indices to sum over. Defaults to all.
+    Output: array([len(rows), rx, rx, N, T])"""
+    rx = CSI.shape[2]
+    covariance = np.zeros((len(rows), rx, rx) + CSI.shape[4:], dtype=CSI.dtype)
+    if cells is None:
+        cells = np.arange(CSI.shape[1])
+    rows = np.asarray(rows, dtype=int)
+    for c in cells: # one cell at a time keeps the temporaries small
+        selected = np.nonzero(weight[:,c])[0] # only mobiles for which this cell is a (significant) interferer
+        if not selected.size:
+            continue
+        if selected.size == len(rows):
+            H = CSI[rows, c]
+            covariance += np.einsum('mijnt,m,jnt,mljnt->milnt', H, weight[:,c], power[c], H.conj())
+        else:
+            H = CSI[rows[selected], c]
+            covariance[selected] += np.einsum('mijnt,m,jnt,mljnt->milnt', H, weight[selected,c], power[c], H.conj())
+    return covariance
+
+def effectiveChannel(servingCSI, covariance):
+    """Effective channel H Cn^-1 H^H on each RB.
+    Input: servingCSI array([M, rx, tx, N, T]), covariance array([M, rx, rx, N, T])
+    Output: array([M, rx, rx, N, T])"""
+    if covariance.shape[1:3] == (2,2):
+        inverse = mimo2x2.inv(covariance.transpose(0,3,4,1,2)).transpose(0,3,4,1,2)
+    else:
+        inverse = np.linalg.inv(covariance.transpose(0,3,4,1,2)).transpose(0,3,4,1,2) # stacked inverses
+    return np.einsum('mabnt,mbcnt,mdcnt->madnt', servingCSI, inverse, servingCSI.conj())
+
+def servingWeight(M, C, serving):
+    """Weight array([M, C]) of ones with zeros at the serving cells. There is no self-interference."""
+    weight = np.ones([M, C])
+    weight[np.arange(M), serving] = 0
+    return weight
+
+def ofdmaSINR(CSI, rows, serving, power, noisePower, interference=None, background=None):
+    """Interference covariance, effective channel and unit power SINR per spatial channel for mobiles on all RBs.
+    Input:
+        CSI: array([mobiles, cells, rx, tx, N, T])
+        rows: array([M]) index of the considered mobiles into CSI
+        serving: array([M]) index of each mobile's serving cell
+        power: array([cells, tx, N, T]) transmission power of all cells
+        noisePower: array([M]) noise power over the system bandwidth
+        interference: optional precomputed interference covariance array([M, rx, rx, N, T]) without noise. It is not modified.
+        background: optional array([M, N, T]) of interference power from pruned cells. It is added to the diagonal like noise.
+    Output: (covariance array([M, rx, rx, N, T]), EC array([M, rx, rx, N, T]), effSINR array([M, rx, N, T]))"""
+    rows = np.asarray(rows, dtype=int)
+    serving = np.asarray(serving, dtype=int)
+    M = len(rows)
+    rx = CSI.shape[2]
+    N = CSI.shape[4]
+
+    if interference is None:
+        covariance = interferenceCovariance(CSI, rows, servingWeight(M, CSI.shape[1], serving), power)
+    else:
+        covariance = interference.copy()
+    noise = np.asarray(noisePower, dtype=float) / N
+    covariance[:, np.arange(rx), np.arange(rx)] += noise[:, None, None, None] # noise on the diagonal
+    if background is not None:
+        covariance[:, np.arange(rx), np.arange(rx)] += background[:, None, :, :]
+
+    EC = effectiveChannel(CSI[rows, serving], covariance)
+    if rx == 2:
+        eigs = mimo2x2.eigvalsh(EC.transpose(0,3,4,1,2)).transpose(0,3,1,2) # EC is Hermitian. Descending order
+    else:
+        eigs = np.linalg.eigvals(EC.transpose(0,3,4,1,2)).transpose(0,3,1,2)
+        if (np.abs(np.imag(eigs)) > 1e10).any(): # before omitting imag, make sure it is small
+            raise ValueError('Error: Eigenvalues of Hermitian matrix should be real!')
+    return covariance, EC, np.real(eigs)
+
+class InterferenceTracker(object):
+    """Keeps the interference covariances of a set of mobiles together with the cell powers and the fading epoch they were computed for.
+    If only the power changed since the last call, only the power deltas of the changed cells are added. Otherwise everything is recomputed."""
+
+    def __init__(self):
+        self.key = None # (fading epoch, rows, interferer weights)
+        self.power = None # array([cells, tx, N, T]) at the last update
+        self.interference = None # array([M, rx, rx, N, T]) without noise
+        self.changedCells = None # cell indices updated incrementally in the last call. None after a full computation.
+
+    def update(self, CSI, rows, weight, power, epoch):
+        """Return the interference covariance array([M, rx, rx, N, T]) for the current power. weight array([M, cells]) selects the interferers of each mobile. The returned array is owned by the tracker."""
+        rows = np.asarray(rows, dtype=int)
+        key = (epoch, rows.tostring(), weight.tostring())
+        if key == self.key and self.power.shape == power.shape:
+            changed = np.nonzero((power != self.power).reshape(len(power), -1).any(axis=1))[0]
+            if changed.size:
+                self.interference += interferenceCovariance(CSI, rows, weight, power - self.power, cells=changed)
+            self.changedCells = changed
+        else:
+            self.interference = interferenceCovariance(CSI, rows, weight, power)
+            self.changedCells = None
+        self.key = key
+        self.power = power.copy()
+        return self.interference
+
+    def reset(self):
+        """Forget the cached state. The next update is a full computation."""
+        self.__init__()
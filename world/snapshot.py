@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+''' Versioned on-disk snapshot of a world.
+
+A snapshot is an npz archive of contiguous arrays: geometry, association, cell state, mobile SINRs and the channel store. A small JSON header holds the format version and the configuration. Loading rebuilds the World from these arrays without unpickling an object graph.
+Transient state is not stored: solver warm starts, capacity caches and the incremental interference tracker start fresh after loading.
+Snapshots are written uncompressed by default. Compression saves disk space at the cost of save and load time.
+
+File: snapshot.py
+'''
+
+__author__ = "Hauke Holtkamp"
+__credits__ = "Hauke Holtkamp"
+__license__ = "unknown"
+__version__ = "unknown"
+__maintainer__ = "Hauke Holtkamp"
+__email__ = "h.holtkamp@gmail.com"
+__status__ = "Development"
+
+import numpy as np
+import json
+import types
+import zipfile
+import struct
+import world
+import basestation
+import cell
+import mobile
+from configure import phy, wconfig
+
+FORMAT = 'raps-world'
+VERSION = 1
+
+# arrays that are not written after the association. These can be shared between processes.
+sharedArrays = ('store_all_FSF', 'store_fadingState', 'store_distance', 'store_LNS', 'store_angle', 'store_pathgain', 'store_averagePRx')
+
+def save(wrld, filename, compress=False):
+    """Store wrld in filename (or an open file). numpy appends .npz if the name has no such extension.
+    All mobiles must be associated (World.associatePathlosses)."""
+    store = wrld.channels
+    if [ mob for mob in wrld.mobiles if mob.channels is not store ]:
+        raise ValueError('Only worlds with associated pathlosses can be stored.')
+    mobiles = store.mobiles # all rows of the channel store, including removed mobiles
+    baseStations = wrld.baseStations
+    cells = wrld.cells
+
+    header = dict(format=FORMAT, version=VERSION, wconf=vars(wrld.wconf), PHY=vars(wrld.PHY),
+            lazyFading=store.lazyFading, fadingTimeslots=store.fadingTimeslots,
+            bsType=[ bs.typ for bs in baseStations ],
+            cellDirection=[ cl.direction for cl in cells ], cellSleepAlignment=[ cl.sleep_alignment for cl in cells ])
+    arrays = dict(('store_' + name, arr) for name, arr in store.arrays().items())
+    arrays.update(
+        header = np.array(json.dumps(header)),
+        # base stations
+        bsPosition = np.array([ bs.position for bs in baseStations ], dtype=float).reshape(-1,2),
+        bsID = np.array([ bs.id_ for bs in baseStations ], dtype=int),
+        bsPower = np.array([ [bs.p0, bs.m, bs.pS] for bs in baseStations ], dtype=float).reshape(-1,3),
+        # cells in world order
+        cellCenter = np.array([ cl.center for cl in cells ], dtype=float).reshape(-1,2),
+        cellBS = store.cellBS,
+        cellID = np.array([ cl.cellid for cl in cells ], dtype=int),
+        cellAntennas = np.array([ cl.antennas for cl in cells ], dtype=int),
+        cellPMax = store.pMax,
+        cellPower = store.cellPower(),
+        cellOutmap = np.array([ cl.outmap for cl in cells ], dtype=float),
+        # mobiles in channel store order
+        mobPosition = np.array([ mob.position for mob in mobiles ], dtype=float).reshape(-1,2),
+        mobID = np.array([ mob.id_ for mob in mobiles ], dtype=int),
+        mobAntennas = np.array([ mob.antennas for mob in mobiles ], dtype=int),
+        mobCell = np.array([ store.cellIndex[mob.cell] if mob.cell is not None else -1 for mob in mobiles ], dtype=int),
+        mobPower = np.array([ [ np.nan if p is None else p for p in (mob.SINR, mob.interferencePower, mob.noisePower, mob.noiseIfPower) ] for mob in mobiles ], dtype=float).reshape(-1,4),
+        mobCovariance = np.array([ mob.OFDMA_interferenceCovar for mob in mobiles ]),
+        mobEC = np.array([ mob.OFDMA_EC for mob in mobiles ]),
+        mobEffSINR = np.array([ mob.OFDMA_effSINR for mob in mobiles ]),
+        worldMobiles = np.array([ mob.index for mob in wrld.mobiles ], dtype=int),
+        LNSMap = wrld.LNSMap)
+
+    if compress:
+        np.savez_compressed(filename, **arrays)
+    else:
+        np.savez(filename, **arrays)
+
+def load(filename, mmap=False):
+    """Rebuild a World from a snapshot file. 
+    With mmap, the fading and pathloss arrays of the channel store are read-only memory maps of the file. Processes that load the same snapshot then share one copy in the page cache. Only uncompressed members can be mapped. Compressed ones are read into memory."""
+    data = np.load(filename)
+    try:
+        mapped = dict((name, mapMember(filename, name)) for name in sharedArrays if mmap and name in data.files)
+        arrays = dict((name, data[name] if mapped.get(name) is None else mapped[name]) for name in data.files) # each access of an npz member reads it again
+    finally:
+        data.close()
+    return fromArrays(arrays)
+
+def mapMember(filename, name):
+    """Read-only np.memmap of the array name in the npz file. None if the member is compressed or empty."""
+    with zipfile.ZipFile(filename) as archive:
+        info = archive.getinfo(name + '.npy')
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(filename, 'rb') as f:
+        f.seek(info.header_offset)
+        localHeader = f.read(30) # the local file header precedes the member data
+        nameLength, extraLength = struct.unpack('<2H', localHeader[26:30])
+        f.seek(info.header_offset + 30 + nameLength + extraLength)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype.hasobject or not np.prod(shape):
+        return None
+    return np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=shape, order='F' if fortran else 'C')
+
+def readHeader(data):
+    """The header of the snapshot arrays data (dict). Raises ValueError for other files and versions."""
+    if 'header' not in data:
+        raise ValueError('Not a world snapshot.')
+    header = json.loads(str(data['header']), object_hook=_strings)
+    if header.get('format') != FORMAT:
+        raise ValueError('Not a world snapshot.')
+    if header['version'] != VERSION:
+        raise ValueError('Unsupported world snapshot version ' + str(header['version']))
+    return header
+
+def fromArrays(data):
+    """Rebuild a World from the arrays of a snapshot by name (dict)."""
+    header = readHeader(data)
+    wconf = _settings(wconfig.Wconfig, header['wconf'])
+    PHY = _settings(phy.PHY, header['PHY'])
+
+    baseStations = []
+    for indexbs, position in enumerate(data['bsPosition']):
+        p0, m, pS = data['bsPower'][indexbs]
+        bs = basestation.BaseStation(position, typ=header['bsType'][indexbs], p0=p0, m=m, pS=pS)
+        bs.id_ = int(data['bsID'][indexbs])
+        baseStations.append(bs)
+
+    cells = []
+    cellPower = data['cellPower']
+    cellOutmap = data['cellOutmap']
+    for indexcell, center in enumerate(data['cellCenter']):
+        cl = cell.Cell(center, PHY, direction=header['cellDirection'][indexcell], antennas=int(data['cellAntennas'][indexcell]),
+                initial_power=wconf.initial_power, sleep_alignment=header['cellSleepAlignment'][indexcell])
+        cl.cellid = int(data['cellID'][indexcell])
+        cl.pMax = float(data['cellPMax'][indexcell])
+        cl.OFDMA_power = cellPower[indexcell].copy()
+        cl.outmap = cellOutmap[indexcell].copy()
+        baseStations[data['cellBS'][indexcell]].cells.append(cl)
+        cells.append(cl)
+
+    mobiles = []
+    mobVelocity = data['store_velocity']
+    for row, position in enumerate(data['mobPosition']):
+        mob = mobile.Mobile(position, PHY, velocity=mobVelocity[row], antennas=int(data['mobAntennas'][row]))
+        mob.id_ = int(data['mobID'][row])
+        mobiles.append(mob)
+
+    wrld = world.World(wconf, PHY, baseStations=baseStations, mobiles=[ mobiles[row] for row in data['worldMobiles'] ], LNSMap=data['LNSMap'])
+    wrld.hexagons # marks the considered hexagons
+    store = wrld.channels
+    if (store.lazyFading, store.fadingTimeslots) != (header['lazyFading'], header['fadingTimeslots']):
+        raise ValueError('The fading of the snapshot does not match its configuration.')
+    store.addMobiles(mobiles)
+    store.setArrays(dict((name, data['store_' + name]) for name in store.arrays()))
+
+    # association and SINR of the last calculation
+    covariance = data['mobCovariance']
+    EC = data['mobEC']
+    effSINR = data['mobEffSINR']
+    for row, (mob, indexcell) in enumerate(zip(mobiles, data['mobCell'])):
+        if indexcell < 0:
+            continue
+        mob.cell = cells[indexcell]
+        mob.BS = baseStations[store.cellBS[indexcell]]
+        mob.SINR, mob.interferencePower, mob.noisePower, mob.noiseIfPower = [ float(p) for p in data['mobPower'][row] ]
+        mob.setOFDMASINR(covariance[row], EC[row], effSINR[row])
+    for mob in set(mobiles) - set(wrld.mobiles): # removed from the world, but still in the channel store
+        if mob.cell is not None:
+            mob.cell.mobiles.discard(mob)
+
+    # new objects continue the counting of the stored world
+    cell.Cell.idcounter = max([ cl.cellid for cl in cells ] + [-1]) + 1
+    mobile.Mobile.id_ = max([ mob.id_ for mob in mobiles ] + [-1]) + 1
+    basestation.BaseStation.id_ = max([ bs.id_ for bs in baseStations ] + [-1]) + 1
+    return wrld
+
+def _settings(cls, attributes):
+    """Instance of the configuration class cls with the given attributes, without reading a config file."""
+    if isinstance(cls, types.ClassType):
+        settings = types.InstanceType(cls) # old-style class
+    else:
+        settings = cls.__new__(cls)
+    settings.__dict__.update(attributes)
+    return settings
+
+def _strings(obj):
+    """json object hook. Byte strings instead of unicode, as read from the config files."""
+    return dict((str(key), str(value) if isinstance(value, unicode) else
+        [ str(v) if isinstance(v, unicode) else v for v in value ] if isinstance(value, list) else value) for key, value in obj.items())
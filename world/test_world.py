@@ -121,6 +121,166 @@ class TestSequenceFunctions(unittest.TestCase):
         # test cell access
         world1.cells
 
+    def test_mobilePlacement(self):
+        """Mobiles lie inside the hexagons and outside the forbidden distance"""
+        wconf = copy.copy(self.wconf)
+        wconf.hexTiers = 2
+        wconf.usersPerCell = 5
+        wconf.sectorsPerBS = 3
+        world1 = world.World(wconf, self.phy)
+        self.assertEqual(len(world1.mobiles), 5*19)
+        for mob in world1.mobiles:
+            self.assertTrue(any(hexfuns.pointInHex(mob.position, hexa) for hexa in world1.hexagons))
+            for bs in world1.baseStations:
+                self.assertTrue(hexfuns.distance(mob.position, bs.position) >= wconf.forbiddenDistance)
+
+    def test_pointsInHex(self):
+        """Vectorized hexagon tests agree with pointInHex"""
+        wconf = copy.copy(self.wconf)
+        wconf.hexTiers = 2
+        wconf.usersPerCell = 0
+        world1 = world.World(wconf, self.phy)
+        points = 800 * (np.random.rand(500, 2) - 0.5)
+        inside = hexfuns.points_in_hex(points, world1.hexagons)
+        index = world1.hexLattice.locate(points)
+        for p, point in enumerate(points):
+            answer = [ hexfuns.pointInHex(point, hexa) for hexa in world1.hexagons ]
+            np.testing.assert_array_equal(inside[p], answer)
+            if index[p] >= 0:
+                self.assertTrue(answer[index[p]])
+            else:
+                self.assertFalse(any(answer))
+
+    def test_channelStore(self):
+        """The dict interface is a view of the channel store"""
+        import cPickle
+        wconf = copy.copy(self.wconf)
+        wconf.hexTiers = 1
+        wconf.usersPerCell = 1
+        wconf.sectorsPerBS = 3
+        world1 = world.World(wconf, self.phy)
+        world1.associatePathlosses()
+        store = world1.channels
+        self.assertEqual(store.CSI_OFDMA.shape, (len(world1.mobiles), len(world1.cells), 2, 2, self.phy.numFreqChunks, self.phy.numTimeslots))
+        mob = world1.mobiles[2]
+        self.assertEqual(len(mob.baseStations), len(world1.baseStations))
+        for bs in mob.baseStations:
+            self.assertTrue(mob.baseStations.has_key(bs))
+            self.assertEqual(mob.baseStations[bs]['LNS'], world1.LNSMap[2, store.bsIndex[bs]])
+            for cell in mob.baseStations[bs]['cells']:
+                link = mob.baseStations[bs]['cells'][cell]
+                np.testing.assert_array_equal(link['CSI_OFDMA'], store.CSI_OFDMA[mob.index, store.cellIndex[cell]])
+                self.assertEqual(link['averagePRx'], cell.pMax * link['pathgain'])
+        # writes go through to the store
+        cell = world1.cells[0]
+        mob.baseStations[store.baseStations[0]]['cells'][cell]['CSI_OFDMA'][:] = 0
+        self.assertTrue((mob.cellCSI(cell) == 0).all())
+        # fading update for all links at once
+        world1.updateMobileFSF(1)
+        T = self.phy.numTimeslots
+        np.testing.assert_allclose(mob.cellCSI(cell), np.sqrt(mob.pathgains[0]) * store.all_FSF[mob.index, 0, :, :, :, T:2*T])
+        # pickled worlds keep mobiles attached to one store
+        world2 = cPickle.loads(cPickle.dumps(world1, 2))
+        self.assertTrue(world2.mobiles[0].channels is world2.channels)
+        # mobiles added one at a time keep the rows before them. The fading is reallocated a few times only.
+        import mobile
+        CSI = store.CSI_OFDMA.copy()
+        buffers = set()
+        for k in range(40):
+            store.addMobiles([ mobile.Mobile(np.zeros(2), self.phy, velocity=k) ])
+            buffers.add(id(store._buffers['fadingState' if store.lazyFading else '_all_FSF']))
+        self.assertTrue(len(buffers) < 10)
+        self.assertEqual(len(store.CSI_OFDMA), len(CSI) + 40)
+        np.testing.assert_array_equal(store.CSI_OFDMA[:len(CSI)], CSI)
+        np.testing.assert_array_equal(store.velocity[-40:], np.arange(40))
+        self.assertTrue(store.significant[-40:].all() and not store.pruned[-40:].any())
+        world3 = cPickle.loads(cPickle.dumps(world1, 2))
+        self.assertEqual(len(world3.channels.CSI_OFDMA), len(store.mobiles))
+
+    def test_lazyFading(self):
+        """Fading generated per iteration from the random state must equal the precomputed fading."""
+        CSI = {}
+        for lazy in [True, False]:
+            wconf = copy.copy(self.wconf)
+            wconf.hexTiers = 0
+            wconf.usersPerCell = 2
+            wconf.sectorsPerBS = 3
+            wconf.lazy_fading = lazy
+            np.random.seed(7)
+            world1 = world.World(wconf, self.phy)
+            world1.associatePathlosses()
+            self.assertEqual(world1.channels.lazyFading, lazy)
+            world1.updateMobileFSF(1)
+            CSI[lazy] = (world1.channels.CSI_OFDMA.copy(), world1.channels.all_FSF)
+        np.testing.assert_array_equal(CSI[True][0], CSI[False][0])
+        np.testing.assert_array_equal(CSI[True][1], CSI[False][1])
+        store = world1.channels
+        self.assertRaises(ValueError, store.updateFSF, self.phy.iterations)
+
+    def test_snapshot(self):
+        """A stored and loaded world gives the same SINRs as the original, also with memory-mapped link data"""
+        import snapshot, tempfile, os
+        wconf = copy.copy(self.wconf)
+        wconf.hexTiers = 1
+        wconf.usersPerCell = 2
+        world1 = world.World(wconf, self.phy)
+        world1.associatePathlosses()
+        world1.calculateSINRs()
+        world1.cells[0].OFDMA_power[:] = 0
+        fd, filename = tempfile.mkstemp(suffix='.npz')
+        os.close(fd)
+        try:
+            snapshot.save(world1, filename)
+            world2 = snapshot.load(filename)
+            world3 = snapshot.load(filename, mmap=True)
+        finally:
+            os.remove(filename)
+        # shared read-only link data, private CSI
+        self.assertTrue(isinstance(world3.channels.pathgain, np.memmap))
+        self.assertFalse(world3.channels.pathgain.flags.writeable)
+        self.assertTrue(world3.channels.CSI_OFDMA.flags.writeable)
+        self.assertEqual([ mob.id_ for mob in world1.mobiles ], [ mob.id_ for mob in world2.mobiles ])
+        self.assertEqual([ mob.cell.cellid for mob in world1.mobiles ], [ mob.cell.cellid for mob in world2.mobiles ])
+        np.testing.assert_array_equal(world2.cells[0].OFDMA_power, 0)
+        world1.interferenceTracker.reset() # a full computation as in the loaded worlds
+        for world_ in (world1, world2, world3):
+            world_.updateMobileFSF(1)
+            world_.calculateSINRs()
+        for mob1, mob2, mob3 in zip(world1.mobiles, world2.mobiles, world3.mobiles):
+            np.testing.assert_array_equal(mob1.OFDMA_effSINR, mob2.OFDMA_effSINR)
+            np.testing.assert_array_equal(mob1.OFDMA_effSINR, mob3.OFDMA_effSINR)
+
+    def test_worldCache(self):
+        """A cached world equals the generated one. The seed is part of the key and the least recently used worlds are evicted."""
+        import worldcache, tempfile, shutil, os
+        wconf = copy.copy(self.wconf)
+        wconf.hexTiers = 1
+        wconf.usersPerCell = 2
+        directory = tempfile.mkdtemp()
+        try:
+            cache = worldcache.WorldCache(directory)
+            state = np.random.get_state()
+            world1 = cache.get(wconf, self.phy, 1) # miss
+            self.assertEqual(state[1].tolist(), np.random.get_state()[1].tolist()) # generation does not consume the global random numbers
+            world2 = cache.get(wconf, self.phy, 1) # hit
+            self.assertTrue(world2.wconf is wconf)
+            self.assertTrue(isinstance(world2.channels.pathgain, np.memmap))
+            for mob1, mob2 in zip(world1.mobiles, world2.mobiles):
+                np.testing.assert_array_equal(mob1.position, mob2.position)
+                np.testing.assert_array_equal(mob1.OFDMA_effSINR, mob2.OFDMA_effSINR)
+            self.assertNotEqual(cache.key(wconf, self.phy, 1), cache.key(wconf, self.phy, 2))
+            self.assertNotEqual(cache.key(wconf, self.phy, 1), cache.key(wconf, self.phy, 1, fixCenterUsers=False))
+            key = cache.key(wconf, self.phy, 1)
+            wconf.sleep_alignment = 'none' # operating parameters do not change the key
+            self.assertEqual(key, cache.key(wconf, self.phy, 1))
+
+            # room for one world only: the newest one stays
+            cache.maxBytes = os.path.getsize(cache.path(cache.key(wconf, self.phy, 1)))
+            cache.get(wconf, self.phy, 2)
+            self.assertEqual(os.listdir(directory), [ cache.key(wconf, self.phy, 2) + '.npz' ])
+        finally:
+            shutil.rmtree(directory)
+
     def test_baseStationUnique(self):
         """Are any BS in the same location?"""
         world1 = world.World(self.wconf, self.phy)
@@ -203,33 +363,119 @@ class TestSequenceFunctions(unittest.TestCase):
         cell = cell.Cell(position, self.phy)
         self.assertEqual(cell.OFDMA_power.shape, (2, 50,10)) # TODO: more detail
 
+    def test_timeslotRanking(self):
+        """Time slot rankings agree with the per mobile and per RB sums"""
+        from raps import ba
+        wconf = copy.copy(self.wconf)
+        wconf.hexTiers = 0
+        wconf.usersPerCell = 3
+        world1 = world.World(wconf, self.phy)
+        world1.associatePathlosses()
+        world1.calculateSINRs()
+        cell = world1.cells[0]
+        N, T = self.phy.numFreqChunks, self.phy.numTimeslots
+        sinr = np.mean([ np.mean(np.mean(mob.OFDMA_effSINR, 0), 0) for mob in cell.mobiles ], 0)
+        np.testing.assert_array_equal(cell.get_timeslots_by_sinr(randomize=False), sinr.argsort()[::-1])
+        bw, time = self.phy.systemBandwidth / N, self.phy.simulationTime / T
+        cap = [ sum(ba.RB_bit_capacity(mob, n, t, bw, time, cell.pMax/N) for mob in cell.mobiles for n in range(N)) for t in range(T) ]
+        np.testing.assert_array_equal(cell.get_timeslots_by_capacity(randomize=False), np.argsort(cap)[::-1])
+
     def test_OFDMA_SINR(self):
-        """Test OFDMA_SINR in mobiles"""
-        # build simple network with known channels
-#        wconf = copy.copy(self.wconf)
-#        wconf.hexTiers = 1
-#        wconf.usersPerCell = 1
-#        wconf.consideredTiers = 0
-#        wconf.sectorsPerBS = 1
-#        wconf.enableFrequencySelectiveFading = False 
-#        world2 = world.World(wconf, self.phy)
-#        world2.associatePathlosses()
-#        for cell in world2.cells:
-#            if cell.cellid not in [0,1]: # keep only two
-#                cell.OFDMA_power[:] = 0
-#
-#        for mob in world2.mobiles:
-#            mob.OFDMA_interferenceCovar[:] = 0
-#            mob.OFDMA_EC[:] = 1
-#            mob.OFDMA_SINR[:] = 1
-#
-#
-#        import pdb; pdb.set_trace()
-#        
-
-        # test correct allocation
+        """Batched OFDMA SINR agrees with the per RB calculation"""
+        from scipy import linalg
+        wconf = copy.copy(self.wconf)
+        wconf.hexTiers = 1
+        wconf.usersPerCell = 1
+        wconf.sectorsPerBS = 3
+        world1 = world.World(wconf, self.phy)
+        world1.associatePathlosses()
+        world1.calculateSINRs()
+        for mob in world1.mobiles:
+            for n, t in [(0,0), (7,3), (self.phy.numFreqChunks-1, self.phy.numTimeslots-1)]:
+                interf = mob.interference(n, t)
+                noisep = np.eye(mob.antennas) * (mob.noisePower / self.phy.numFreqChunks) 
+                np.testing.assert_allclose(mob.OFDMA_interferenceCovar[:,:,n,t], noisep + interf)
+                EC = np.dot(np.dot(mob.OFDMA_CSI[:,:,n,t], linalg.inv(noisep + interf)), mob.OFDMA_CSI[:,:,n,t].conj().T)
+                np.testing.assert_allclose(mob.OFDMA_EC[:,:,n,t], EC)
+                np.testing.assert_allclose(np.sort(mob.OFDMA_effSINR[:,n,t]), np.sort(np.real(linalg.eig(EC)[0])))
 
-        pass
+    def test_incrementalInterference(self):
+        """Interference updates from power deltas agree with a full computation"""
+        wconf = copy.copy(self.wconf)
+        wconf.hexTiers = 1
+        wconf.usersPerCell = 1
+        wconf.sectorsPerBS = 3
+        world1 = world.World(wconf, self.phy)
+        world1.associatePathlosses()
+        world1.calculateSINRs()
+        world1.cells[1].OFDMA_power[:,:5,:] = 0
+        world1.cells[4].OFDMA_power[0,:,2] *= 3
+        world1.calculateSINRs()
+        np.testing.assert_array_equal(world1.interferenceTracker.changedCells, [1,4])
+        incremental = [ mob.OFDMA_EC.copy() for mob in world1.mobiles ]
+        world1.interferenceTracker.reset()
+        world1.calculateSINRs()
+        self.assertTrue(world1.interferenceTracker.changedCells is None)
+        for mob, EC in zip(world1.mobiles, incremental):
+            np.testing.assert_allclose(EC, mob.OFDMA_EC, rtol=1e-10, atol=1e-10*np.abs(EC).max())
+        # without Doppler, the fading of the next iteration is the same
+        world1.updateMobileFSF(1)
+        world1.calculateSINRs()
+        np.testing.assert_array_equal(world1.interferenceTracker.changedCells, [])
+        # CSI written through the dictionary views is used
+        mob = world1.mobiles[0]
+        link = mob.baseStations[world1.baseStations[0]]['cells'][world1.baseStations[0].cells[0]]
+        link['CSI_OFDMA'] = link['CSI_OFDMA'] * 2
+        world1.calculateSINRs()
+        self.assertTrue(world1.interferenceTracker.changedCells is None)
+        effSINR = mob.OFDMA_effSINR.copy()
+        world1.interferenceTracker.reset()
+        world1.calculateSINRs()
+        np.testing.assert_array_equal(mob.OFDMA_effSINR, effSINR)
+        # new fading means a full computation
+        wconf.mobileVelocity = 30
+        world2 = world.World(wconf, self.phy)
+        world2.associatePathlosses()
+        world2.calculateSINRs()
+        world2.updateMobileFSF(1)
+        world2.calculateSINRs()
+        self.assertTrue(world2.interferenceTracker.changedCells is None)
+
+    def test_interfererPruning(self):
+        """Pruned interferers become background power"""
+        wconf = copy.copy(self.wconf)
+        wconf.hexTiers = 1
+        wconf.usersPerCell = 2
+        wconf.sectorsPerBS = 3
+        world1 = world.World(wconf, self.phy)
+        world1.associatePathlosses()
+        world1.calculateSINRs()
+        store = world1.channels
+        rows = [ mob.index for mob in world1.mobiles ]
+        serving = [ store.cellIndex[mob.cell] for mob in world1.mobiles ]
+        noise = [ mob.noisePower for mob in world1.mobiles ]
+        # a huge margin keeps everything
+        error = store.pruneInterferers(rows, serving, noise, 300)
+        self.assertTrue(store.significant.all())
+        np.testing.assert_array_equal(error, 0)
+        # a small margin prunes most cells
+        error = store.pruneInterferers(rows, serving, noise, 3)
+        self.assertTrue(store.significant.sum() < store.significant.size)
+        self.assertTrue(((error >= 0) & (error < 1)).all())
+        self.assertTrue((store.backgroundGain[~store.significant] > 0).all())
+        selected = np.nonzero(~store.significant)
+        np.testing.assert_allclose(store.backgroundGain[selected], [ store.pathgain[row, c] * np.mean(np.abs(store.fading(row, c))**2) for row, c in zip(*selected) ], rtol=1e-12)
+        world1.calculateSINRs()
+        for mob in world1.mobiles:
+            self.assertTrue(np.isfinite(mob.OFDMA_effSINR).all() and (mob.OFDMA_effSINR[0] > 0).all())
+            # the single RB interference agrees with the batched one
+            np.testing.assert_allclose(mob.OFDMA_interferenceCovar[:,:,3,2], mob.interference(3,2) + np.eye(2)*mob.noisePower/self.phy.numFreqChunks)
+        # a new pathgain forgets the pruning of the mobile
+        mob = world1.mobiles[0]
+        world1.associatePathloss(mob, 0)
+        self.assertFalse(store.pruned[mob.index])
+        self.assertTrue(store.significant[mob.index].all())
+        np.testing.assert_array_equal(store.backgroundGain[mob.index], 0)
 
     def test_hexagons(self):
         """Hexagon shape, contents"""
@@ -240,8 +486,23 @@ class TestSequenceFunctions(unittest.TestCase):
         pass
 
     def test_pathlosses(self):
-        """Somehow test pathlosses. Shape, value, statistics"""
-        pass
+        """Pathloss maps agree with the per link pathloss calculation"""
+        import pathloss
+        wconf = copy.copy(self.wconf)
+        wconf.hexTiers = 1
+        wconf.usersPerCell = 2
+        wconf.sectorsPerBS = 3
+        world1 = world.World(wconf, self.phy)
+        world1.associatePathlosses()
+        self.assertEqual(world1.pathgainMap.shape, (len(world1.mobiles), len(world1.cells)))
+        self.assertEqual(world1.distanceMap.shape, (len(world1.mobiles), len(world1.baseStations)))
+        for indexmob, mob in enumerate(world1.mobiles):
+            indexcell = 0
+            for bs in world1.baseStations:
+                for cell in bs.cells:
+                    np.testing.assert_allclose(mob.pathgains[indexcell], pathloss.pathloss(mob, bs, cell))
+                    np.testing.assert_allclose(mob.baseStations[bs]['cells'][cell]['pathgain'], world1.pathgainMap[indexmob, indexcell])
+                    indexcell += 1
 
     def test_calculateSINRs(self):
         """ """
@@ -16,6 +16,7 @@ __status__ = "Development"
 
 # import system
 from numpy import *
+import numpy as np
 import math
 import random
 
@@ -26,6 +27,8 @@ import mobile
 import hexagon
 import pathloss
 import cell
+import channelstore
+import sinr
 from configure import phy, wconfig
 import logging
 logger = logging.getLogger('RAPS_script')
@@ -36,7 +39,8 @@ start = time.time()
 class World(object):
     """ World class holds physical object."""
 
-    def __init__(self, wconf, PHY):
+    def __init__(self, wconf, PHY, baseStations=None, mobiles=None, LNSMap=None):
+        """baseStations, mobiles and LNSMap may be given to rebuild a stored world. Otherwise they are generated from wconf on first access."""
         self.wconf = wconf
         self.tiers = self.wconf.hexTiers 
         self.consideredTiers = self.wconf.consideredTiers
@@ -49,14 +53,17 @@ class World(object):
         self.interHexDistance = self.getInterHexDistance()
         self.PHY = PHY
         
-        self._baseStations = None 
-        self._mobiles = None 
+        self._baseStations = baseStations 
+        self._mobiles = mobiles 
         self._consideredMobiles= None 
         self._cells = None # cells are not always identical to hexagons
         self._consideredCells = None 
         self._hexagons = None # spatial entity 
         self._consideredHexagons =  None # only the mobiles inside these are considered for data
-        self._LNSMap = None 
+        self._hexLattice = None 
+        self._channels = None # channel store. Holds all link data
+        self.interferenceTracker = sinr.InterferenceTracker() # interference of the last SINR calculation for incremental updates
+        self._LNSMap = LNSMap 
         
         # new world, new counting
         cell.Cell.idcounter = 0 
@@ -134,16 +141,18 @@ class World(object):
             # remove BS that are too far out overall
             inclusionDistance =  (( self.tiers * 2 + 2) * centerHex.innerRadius)
             origin = [0,0]
-            for baseStation in listOfBaseStations[:]:
-                if not(hexfuns.pointInHex(baseStation.position, hexagon.EWHexagon(origin, inclusionDistance))):
-                    listOfBaseStations.remove(baseStation)
-
-            for baseStation in listOfBaseStations:
-                for hexa in self.hexagons:
-                    if hexfuns.distance(hexa.center, baseStation.position)<hexa.outerRadius+1:
-                        baseStation.cells.append(cell.Cell(hexa.center, self.PHY, 
-                            initial_power=self.wconf.initial_power, 
-                            sleep_alignment=self.wconf.sleep_alignment)) # This is the place where cells are filled TODO: fill direction
+            inside = hexfuns.points_in_hex([ bs.position for bs in listOfBaseStations ], [hexagon.EWHexagon(origin, inclusionDistance)])[:,0]
+            listOfBaseStations = [ bs for bs, keep in zip(listOfBaseStations, inside) if keep ]
+
+            bsPositions = array([ bs.position for bs in listOfBaseStations ], dtype=float)
+            hexCenters = array([ hexa.center for hexa in self.hexagons ], dtype=float)
+            outerRadii = array([ hexa.outerRadius for hexa in self.hexagons ])
+            covers = sqrt(sum((bsPositions[:,None,:] - hexCenters[None,:,:])**2, axis=2)) < outerRadii + 1 # [BS, hexagons]
+            for baseStation, coveredHexagons in zip(listOfBaseStations, covers):
+                for hexa in [ hexa for hexa, covered in zip(self.hexagons, coveredHexagons) if covered ]:
+                    baseStation.cells.append(cell.Cell(hexa.center, self.PHY, 
+                        initial_power=self.wconf.initial_power, 
+                        sleep_alignment=self.wconf.sleep_alignment)) # This is the place where cells are filled TODO: fill direction
 
         
         return listOfBaseStations
@@ -175,6 +184,13 @@ class World(object):
 
         return coordList
 
+    @property
+    def hexLattice(self):
+        """Constant time lookup of the hexagon containing a point."""
+        if self._hexLattice is None:
+            self._hexLattice = hexfuns.HexLattice(self.hexagons)
+        return self._hexLattice
+
     def placeHexagons(self):
         """Place the basic hexagons on the map"""
         outerRadius = self.interHexDistance / math.sqrt(3)
@@ -216,7 +232,8 @@ class World(object):
     def consideredCells(self):
         """Cells that are considered for data collection"""
         if self._consideredCells is None:
-            self._consideredCells = [ cell for cell in self.cells for hexa in self._consideredHexagons if hexfuns.pointInHex(cell.center, hexa) ]
+            inside = hexfuns.points_in_hex([ cell.center for cell in self.cells ], self._consideredHexagons).any(axis=1)
+            self._consideredCells = [ cell for cell, keep in zip(self.cells, inside) if keep ]
         return self._consideredCells
 
     # Mobiles
@@ -231,34 +248,45 @@ class World(object):
     def consideredMobiles(self):
         """For interference consideration, we only care about some mobiles in the center."""
         if self._consideredMobiles is None:
-            self._consideredMobiles = [ mob for mob in self.mobiles for hexa in self._consideredHexagons if hexfuns.pointInHex(mob.position, hexa) ]
+            inside = hexfuns.points_in_hex([ mob.position for mob in self.mobiles ], self._consideredHexagons).any(axis=1)
+            self._consideredMobiles = [ mob for mob, keep in zip(self.mobiles, inside) if keep ]
         return self._consideredMobiles
 
     def placeMobilesOnWorld(self):
         """Place mobiles on the available world according to some rules."""
-        listOfMobiles = []
         totalUsers = self.usersPerCell * hexfuns.cellsFromTiers(self.tiers) 
-        for user in range(0,totalUsers):
-            position = self.uniformMobilePosition(self.tiers)
-            listOfMobiles.append(mobile.Mobile(position, self.PHY, velocity=self.wconf.mobileVelocity))
-        return listOfMobiles
+        positions = self.uniformMobilePositions(self.tiers, totalUsers)
+        return [ mobile.Mobile(position, self.PHY, velocity=self.wconf.mobileVelocity) for position in positions ]
 
     def uniformMobilePosition(self, tiers):
         """Find mobile position via uniform distribution obeying hexagon borders and minimum distance."""
+        return list(self.uniformMobilePositions(tiers, 1)[0])
+
+    def uniformMobilePositions(self, tiers, count):
+        """Find count mobile positions via uniform distribution obeying hexagon borders and minimum distance.
+        Candidates are drawn as one array over the bounding box and rejected in bulk. Only the rejected slots are redrawn, so the accepted positions stay uniformly distributed. Returns: array([count, 2])"""
         outerRadius = self.interHexDistance / math.sqrt(3) # TODO: ISD should not be here
         innerRadius = hexfuns.outer2InnerRadius(outerRadius)
-        while True: 
-            xmin = -innerRadius*(2*tiers + 1)
-            ymin = -outerRadius*(1.5*tiers + 1)
-            xmax = innerRadius*(2*tiers + 1)
-            ymax = outerRadius*(1.5*tiers + 1)
-            position = [ xmin + (xmax-xmin)*random.random(), ymin + (ymax-ymin)*random.random() ]
-            # If the mobile is too close to a BS, we reroll. If it isn't and is contained in a hex, we break (success).
-            if ([ bs for bs in self.baseStations if hexfuns.distance(position, bs.position)<self.forbiddenDistance]):
-                continue # mobile too close to a BS
-            if ([ hexa for hexa in self.hexagons if hexfuns.pointInHex(position, hexa) ]): # implicit booleanness
-                break # at least one hexagon contains the point
-        return position
+        xmin = -innerRadius*(2*tiers + 1)
+        ymin = -outerRadius*(1.5*tiers + 1)
+        xmax = innerRadius*(2*tiers + 1)
+        ymax = outerRadius*(1.5*tiers + 1)
+        bsPositions = array([ bs.position for bs in self.baseStations ], dtype=float).reshape(-1,2)
+
+        positions = empty([count, 2])
+        pending = arange(count) # slots that still need a valid position
+        while pending.size:
+            candidates = column_stack(( xmin + (xmax-xmin)*np.random.random(pending.size), ymin + (ymax-ymin)*np.random.random(pending.size) ))
+            # If the mobile is too close to a BS, we reroll. If it isn't and is contained in a hex, it is accepted.
+            sqdist = sum((candidates[:,None,:] - bsPositions[None,:,:])**2, axis=2)
+            valid = ~(sqdist < self.forbiddenDistance**2).any(axis=1) & self._inHexagonUnion(candidates)
+            positions[pending[valid]] = candidates[valid]
+            pending = pending[~valid]
+        return positions
+
+    def _inHexagonUnion(self, points):
+        """Boolean array telling for each point in array([M,2]) whether at least one hexagon contains it."""
+        return self.hexLattice.locate(points) >= 0
 
     @property
     def mobileCoordinates(self):
@@ -277,24 +305,62 @@ class World(object):
             self._LNSMap = pathloss.correlatedLNSMap(len(self.mobiles), len(self.baseStations), self.LNSSD) 
         return self._LNSMap
 
+    @property
+    def channels(self):
+        """Channel store holding the link data between all mobiles and cells."""
+        if self._channels is None:
+            if self.wconf.enableFrequencySelectiveFading:
+                fadingTimeslots = self.PHY.numTimeslots*self.PHY.iterations
+            else:
+                fadingTimeslots = self.PHY.numTimeslots # the same channel is used in all iterations
+            mobileAntennas = self.mobiles[0].antennas if self.mobiles else 2
+            lazyFading = self.wconf.enableFrequencySelectiveFading and getattr(self.wconf, 'lazy_fading', False)
+            self._channels = channelstore.ChannelStore(self.baseStations, self.PHY, fadingTimeslots, mobileAntennas, lazyFading=lazyFading)
+        return self._channels
+
+    @property
+    def distanceMap(self):
+        """array([mobiles, BS]) of distances. Rows are indexed by mob.index."""
+        return self.channels.distance
+
+    @property
+    def angleMap(self):
+        """array([mobiles, cells]) angle between antenna boresight and mobile in degrees. Rows are indexed by mob.index."""
+        return self.channels.angle
+
+    @property
+    def pathgainMap(self):
+        """array([mobiles, cells]) linear pathgain. Rows are indexed by mob.index."""
+        return self.channels.pathgain
+
     def associatePathlosses(self):
-        """Associate mobiles and base stations, i.e. find the pathloss between each BS cell and each mobile. Store the pathgains in the mobile objects. Not sure whether this is a smart architecture and whether world.py should contain this."""
-        for indexmob, mob in enumerate(self.mobiles): 
-            self.associatePathloss(mob, indexmob)
+        """Associate mobiles and base stations, i.e. find the pathloss between each BS cell and each mobile. Store the pathgains in the mobile objects. Not sure whether this is a smart architecture and whether world.py should contain this.
+        The distance, antenna angle and pathgain maps are computed for all mobiles and cells at once and stored in the channel store."""
+        self.storePathlosses(self.mobiles, arange(len(self.mobiles)))
 
     def associatePathloss(self, mob, indexmob):
         """Associate pathloss for one mobile"""
-        for indexbs, bs in enumerate(self.baseStations):
-            # 1. store LNS value, so it's safe... 
-            LNS = self.LNSMap[indexmob, indexbs]
-            mob.setLNS(LNS, bs)
-            # 2. store distance value
-            distance = hexfuns.distance(mob.position, bs.position)
-            mob.setDistance(distance, bs)
-            # 3. from distance, LNS calc fading 
-            # The mobile has one LNS per BS, but one pathgain per cell 
-            for cell in bs.cells:
-                mob.setPathloss(pathloss.pathloss(mob, bs, cell), bs, cell, enablefsf=self.wconf.enableFrequencySelectiveFading)
+        self.storePathlosses([mob], [indexmob])
+
+    def pathlossMaps(self, mobiles, LNSIndices):
+        """Distance array([mobiles, BS]), antenna angle and pathgain array([mobiles, cells]) for a list of mobiles. LNSIndices are their rows in the LNSMap. Cells are in the order of self.cells."""
+        return pathloss.pathlossMaps(array([ mob.position for mob in mobiles ], dtype=float).reshape(-1,2), 
+                array([ bs.position for bs in self.baseStations ], dtype=float), self.channels.cellBS, 
+                array([ cell.center for cell in self.cells ], dtype=float), self.LNSMap[LNSIndices])
+
+    def storePathlosses(self, mobiles, LNSIndices):
+        """Attach the mobiles to the channel store, fill in their rows and generate the fading of each link."""
+        store = self.channels
+        store.addMobiles([ mob for mob in mobiles if mob.channels is not store ])
+        rows = array([ mob.index for mob in mobiles ], dtype=int)
+        distance, angle, pathgain = self.pathlossMaps(mobiles, LNSIndices)
+        store.LNS[rows] = self.LNSMap[LNSIndices]
+        store.distance[rows] = distance
+        store.angle[rows] = angle
+        for indexrow, mob in enumerate(mobiles): 
+            # The mobile has one LNS per BS, but one pathgain per cell. The fading of all its links is generated at once.
+            mob.setPathlosses(pathgain[indexrow], enablefsf=self.wconf.enableFrequencySelectiveFading)
+        store.invalidate()
     
 
     # Once all pathlosses are set, we can calculate the SINRs
@@ -305,12 +371,49 @@ class World(object):
         if not len([ mob.baseStations[bs] for mob in self.mobiles for bs in self.baseStations])==len(self.mobiles) * len(self.baseStations):
             logger.warning('Not all pathgains considered!')
     
-        [ mob.calculateSINR(self.wconf.systemNoisePower) for mob in self.mobiles ] 
+        attached = [ mob for mob in self.mobiles if mob.channels is self.channels ]
+        [ mob.calculateSINR(self.wconf.systemNoisePower) for mob in self.mobiles if mob.channels is not self.channels ] 
+        [ mob.calculateCoarseSINR(self.wconf.systemNoisePower) for mob in attached ] 
+        if attached:
+            # OFDMA SINR for all attached mobiles and RBs at once
+            # If the CSI is unchanged since the last call, only cells that changed their power are added to the interference
+            store = self.channels
+            self.pruneInterferers([ mob for mob in attached if not store.pruned[mob.index] ])
+            rows = [ mob.index for mob in attached ]
+            serving = [ store.cellIndex[mob.cell] for mob in attached ]
+            power = store.cellPower()
+            interference = self.interferenceTracker.update(store.CSI_OFDMA, rows, store.interfererWeight(rows, serving), power, store.epoch)
+            if self.interferenceTracker.changedCells is not None:
+                logger.info( 'Incremental interference update for %d of %d cells' % (len(self.interferenceTracker.changedCells), len(store.cells)) )
+            covariance, EC, effSINR = sinr.ofdmaSINR(store.CSI_OFDMA, rows, serving, power, [ mob.noisePower for mob in attached ], 
+                    interference, store.backgroundInterference(rows, power))
+            for indexmob, mob in enumerate(attached):
+                mob.setOFDMASINR(covariance[indexmob], EC[indexmob], effSINR[indexmob])
         logger.info( 'Time after SINR calculation %.0f seconds' % (time.time() - start) )
 
+    def pruneInterferers(self, mobiles):
+        """Build the significant interferer lists of associated mobiles if the interferer_margin option is set. Far away cells are handled as background power. Logs the approximation error."""
+        margin = getattr(self.wconf, 'interferer_margin', None)
+        if margin is None or not mobiles:
+            return
+        store = self.channels
+        error = store.pruneInterferers([ mob.index for mob in mobiles ], [ store.cellIndex[mob.cell] for mob in mobiles ], 
+                [ mob.noisePower for mob in mobiles ], margin)
+        kept = np.sum(store.significant[[ mob.index for mob in mobiles ]], axis=1) - 1 # without the serving cell
+        logger.info( 'Interferer pruning at %.1f dB margin keeps %.1f of %d interferers per mobile on average (max %d)' % (margin, np.mean(kept), len(store.cells)-1, np.max(kept)) )
+        logger.info( 'Pruned share of interference plus noise: mean %.2e, max %.2e' % (np.mean(error), np.max(error)) )
+        return error
+
     def updateMobileFSF(self, iteration):
-        """Update the fsf data for all mobiles. The default iteration is 0."""
-        [ mob.updateFSF(iteration) for mob in self.mobiles ]
+        """Update the fsf data for all mobiles. The default iteration is 0. 
+        With the freeze_fading option, the fading stays as it is, so the next SINR calculation only updates the interference of cells that changed their power."""
+        if getattr(self.wconf, 'freeze_fading', False):
+            logger.info('Fading frozen. Skipping fading update for iteration ' + str(iteration))
+            return
+        if not [ mob for mob in self.mobiles if mob.channels is not self.channels ]:
+            self.channels.updateFSF(iteration) # all links at once
+        else:
+            [ mob.updateFSF(iteration) for mob in self.mobiles ]
 
     def fix_center_cell_users(self):
         """Fix the number of users in the center cell. Needed for some simulations."""
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+''' Content-addressed cache of generated worlds.
+
+A world is determined by the layout fields of the configuration and the seed of the random generators. Their sha1 hash names a snapshot file (see snapshot.py) in the cache directory. On a hit, the world is loaded from there with memory-mapped link data. On a miss, it is generated with the seed and stored.
+The least recently used snapshots are removed once the directory exceeds its size limit. Operating parameters (power model, sleep alignment, rates, solvers) are not part of the key. Apply them with World.update_operating_parameters().
+
+File: worldcache.py
+'''
+
+__author__ = "Hauke Holtkamp"
+__credits__ = "Hauke Holtkamp"
+__license__ = "unknown"
+__version__ = "unknown"
+__maintainer__ = "Hauke Holtkamp"
+__email__ = "h.holtkamp@gmail.com"
+__status__ = "Development"
+
+import numpy as np
+import random
+import hashlib
+import json
+import glob
+import os
+import world
+import snapshot
+import logging
+logger = logging.getLogger('RAPS_script')
+
+# Wconfig fields that change the generated world. All PHY fields do.
+layoutFields = ('hexTiers', 'consideredTiers', 'sectorsPerBS', 'LNSSD', 'interSiteDistance', 'forbiddenDistance', 'mobileVelocity',
+        'enableFrequencySelectiveFading', 'usersPerCell', 'numcenterusers', 'systemNoisePower', 'initial_power', 'interferer_margin', 'lazy_fading')
+
+def generateWorld(wconf, PHY, seed=None, fixCenterUsers=True):
+    """Generate, associate and calculate the SINRs of a world. With fixCenterUsers, the center cell gets wconf.numcenterusers mobiles. With a seed, the random generators are seeded for the generation and restored afterwards."""
+    if seed is not None:
+        states = np.random.get_state(), random.getstate()
+        np.random.seed(seed)
+        random.seed(seed)
+    try:
+        wrld = world.World(wconf, PHY)
+        wrld.associatePathlosses()
+        wrld.calculateSINRs()
+        if fixCenterUsers:
+            wrld.fix_center_cell_users() # set 0 in settings file to disable
+    finally:
+        if seed is not None:
+            np.random.set_state(states[0])
+            random.setstate(states[1])
+    return wrld
+
+def cachedWorld(wconf, PHY, seed, fixCenterUsers=True):
+    """The world of generateWorld for wconf, PHY and seed from the cache configured in wconf (world_cache, world_cache_size)."""
+    return WorldCache(wconf.world_cache, wconf.world_cache_size * 1e9).get(wconf, PHY, seed, fixCenterUsers)
+
+class WorldCache(object):
+    """Directory of world snapshots named by the hash of their layout and seed. Holds at most maxBytes. Several processes may share a directory."""
+
+    def __init__(self, directory=os.path.join('out', 'worldcache'), maxBytes=10e9):
+        self.directory = directory
+        self.maxBytes = maxBytes
+
+    def key(self, wconf, PHY, seed, fixCenterUsers=True):
+        """Hash of the layout fields of wconf, all PHY fields, the snapshot version, seed and fixCenterUsers."""
+        layout = dict((field, getattr(wconf, field, None)) for field in layoutFields)
+        content = json.dumps(dict(version=snapshot.VERSION, seed=seed, fixCenterUsers=fixCenterUsers, wconf=layout, PHY=vars(PHY)), sort_keys=True)
+        return hashlib.sha1(content).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, wconf, PHY, seed, fixCenterUsers=True):
+        """Load the world from the cache or generate (generateWorld) and store it."""
+        path = self.path(self.key(wconf, PHY, seed, fixCenterUsers))
+        if os.path.exists(path):
+            try:
+                wrld = snapshot.load(path, mmap=True)
+            except (IOError, OSError): # evicted by another process
+                pass
+            else:
+                wrld.wconf = wconf # same layout, current options
+                os.utime(path, None) # recently used
+                logger.info('World cache hit: ' + path)
+                return wrld
+
+        logger.info('World cache miss: ' + path)
+        wrld = generateWorld(wconf, PHY, seed, fixCenterUsers)
+        self.store(wrld, path)
+        return wrld
+
+    def store(self, wrld, path):
+        """Write the snapshot under a temporary name and move it into place, so that other processes never see a partial file. Then evict."""
+        if not os.path.exists(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError: # created concurrently
+                pass
+        temp = path + '.' + str(os.getpid()) + '.tmp'
+        with open(temp, 'wb') as f:
+            snapshot.save(wrld, f)
+        os.rename(temp, path)
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Remove the least recently used snapshots until the cache holds at most maxBytes. keep is never removed."""
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*.npz')):
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+        entries.sort()
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                logger.info('World cache evicted: ' + path)
+            except OSError:
+                pass
+            total -= size